@@ -1,17 +1,11 @@
-import os
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import AsyncIterator
 
-load_dotenv()
+from agents.llm import get_gateway
 
+TEMPERATURE = 0.3
 
-def action_agent(user_query: str, context: str) -> str:
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-2.5-flash",
-        google_api_key=os.getenv("GEMINI_API_KEY"),
-        temperature=0.3
-    )
 
+def build_action_prompt(user_query: str, context: str) -> str:
     prompt = f"""
 You are an enterprise action agent.
 
@@ -32,4 +26,17 @@ Rules:
 Return the deliverable.
 """
 
-    return llm.invoke(prompt).content.strip()
\ No newline at end of file
+    return prompt
+
+
+def action_agent(user_query: str, context: str) -> str:
+    return get_gateway().invoke(build_action_prompt(user_query, context), temperature=TEMPERATURE)
+
+
+async def action_agent_async(user_query: str, context: str) -> str:
+    return await get_gateway().ainvoke(build_action_prompt(user_query, context), temperature=TEMPERATURE)
+
+
+async def action_agent_astream(user_query: str, context: str) -> AsyncIterator[str]:
+    async for token in get_gateway().astream(build_action_prompt(user_query, context), temperature=TEMPERATURE):
+        yield token
\ No newline at end of file
@@ -1,29 +1,21 @@
-import os
-from typing import List, Optional
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import AsyncIterator, List, Optional
 from langchain_core.documents import Document
 
-load_dotenv()
+from agents.llm import get_gateway
 
 
-def answer_agent(
+NOT_FOUND = "Not found in handbook documents."
+
+
+TEMPERATURE = 0.2
+
+
+def build_answer_prompt(
     user_query: str,
     compressed_context: str,
     docs: List[Document],
     chat_history: Optional[list] = None
 ) -> str:
-
-    # safety: if no docs or no context
-    if not docs or not compressed_context.strip():
-        return "Not found in handbook documents."
-
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-2.5-flash",
-        google_api_key=os.getenv("GEMINI_API_KEY"),
-        temperature=0.2
-    )
-
     # primary handbook = handbook of first doc
     primary_handbook = docs[0].metadata.get("handbook_name", "unknown")
 
@@ -33,7 +25,14 @@ def answer_agent(
         handbook = d.metadata.get("handbook_name", "unknown")
         page = d.metadata.get("page", "N/A")
         chunk = d.metadata.get("chunk_id", "N/A")
-        citations.append(f"[{i}] {handbook} (page {page}, chunk {chunk})")
+        citation = f"[{i}] {handbook} (page {page}, chunk {chunk})"
+        # same text deduplicated out of other handbooks at ingestion
+        aliases = d.metadata.get("aliases") or []
+        if aliases:
+            citation += "; also in: " + ", ".join(
+                f"{a['handbook_name']} (page {a['page']}, chunk {a['chunk_id']})" for a in aliases
+            )
+        citations.append(citation)
 
     citations_text = "\n".join(citations)
 
@@ -76,4 +75,53 @@ Rules:
 Now write the final answer.
 """
 
-    return llm.invoke(prompt).content.strip()
\ No newline at end of file
+    return prompt
+
+
+def answer_agent(
+    user_query: str,
+    compressed_context: str,
+    docs: List[Document],
+    chat_history: Optional[list] = None
+) -> str:
+
+    # safety: if no docs or no context
+    if not docs or not compressed_context.strip():
+        return NOT_FOUND
+
+    prompt = build_answer_prompt(user_query, compressed_context, docs, chat_history)
+    return get_gateway().invoke(prompt, temperature=TEMPERATURE)
+
+
+async def answer_agent_async(
+    user_query: str,
+    compressed_context: str,
+    docs: List[Document],
+    chat_history: Optional[list] = None
+) -> str:
+    """
+    Same as answer_agent, using the async client.
+    """
+    if not docs or not compressed_context.strip():
+        return NOT_FOUND
+
+    prompt = build_answer_prompt(user_query, compressed_context, docs, chat_history)
+    return await get_gateway().ainvoke(prompt, temperature=TEMPERATURE)
+
+
+async def answer_agent_astream(
+    user_query: str,
+    compressed_context: str,
+    docs: List[Document],
+    chat_history: Optional[list] = None
+) -> AsyncIterator[str]:
+    """
+    Streams the answer token by token (async client).
+    """
+    if not docs or not compressed_context.strip():
+        yield NOT_FOUND
+        return
+
+    prompt = build_answer_prompt(user_query, compressed_context, docs, chat_history)
+    async for token in get_gateway().astream(prompt, temperature=TEMPERATURE):
+        yield token
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from agents.settings import get_setting
+from ingestion.corpus_version import CORPUS_VERSION_PATH, read_corpus_version
+
+
+class SemanticAnswerCache:
+    """
+    End-to-end answer cache keyed by query embedding.
+
+    - lookup: cosine similarity against every cached query (one matrix-vector
+      product); a hit needs similarity >= threshold
+    - bounded: least recently used entry is evicted when full
+    - invalidated when the corpus version stamp written by ingestion changes
+    - scope (e.g. the requested handbook): entries only match lookups with the same scope
+    """
+
+    def __init__(self, max_size: int = 5000, threshold: float = 0.95):
+        self.max_size = max_size
+        self.threshold = threshold
+
+        self._vectors: Optional[np.ndarray] = None  # [max_size, dim], normalized
+        self._payloads: List[Optional[Dict[str, Any]]] = [None] * max_size
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._valid = np.zeros(max_size, dtype=bool)
+        # scope id per slot (see _scope_ids)
+        self._scope_of = np.zeros(max_size, dtype=np.int32)
+        self._scope_ids: Dict[Optional[str], int] = {None: 0}
+        self._clock = 0.0
+        self._lock = threading.Lock()
+
+        self._version = read_corpus_version()
+        self._version_mtime = self._stamp_mtime()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _stamp_mtime() -> float:
+        try:
+            return os.stat(CORPUS_VERSION_PATH).st_mtime
+        except OSError:
+            return 0.0
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def _check_version(self) -> None:
+        # cheap stat per call; the file is only re-read when it changed
+        mtime = self._stamp_mtime()
+        if mtime == self._version_mtime:
+            return
+        self._version_mtime = mtime
+
+        version = read_corpus_version()
+        if version != self._version:
+            self._version = version
+            self._valid[:] = False
+            self._payloads = [None] * self.max_size
+            self.invalidations += 1
+
+    def _tick(self) -> float:
+        self._clock += 1.0
+        return self._clock
+
+    def lookup(self, query_embedding, scope: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        q = self._normalize(query_embedding)
+
+        with self._lock:
+            self._check_version()
+
+            scope_id = self._scope_ids.get(scope)
+            if self._vectors is None or scope_id is None or not self._valid.any():
+                self.misses += 1
+                return None
+
+            sims = self._vectors @ q
+            sims[~self._valid | (self._scope_of != scope_id)] = -1.0
+            best = int(np.argmax(sims))
+
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._last_used[best] = self._tick()
+            return {**self._payloads[best], "similarity": float(sims[best])}
+
+    def store(self, query_embedding, payload: Dict[str, Any], scope: Optional[str] = None) -> None:
+        q = self._normalize(query_embedding)
+
+        with self._lock:
+            self._check_version()
+
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(q)), dtype=np.float32)
+
+            free = np.flatnonzero(~self._valid)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._vectors[slot] = q
+            self._scope_of[slot] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+            self._payloads[slot] = payload
+            self._valid[slot] = True
+            self._last_used[slot] = self._tick()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._valid[:] = False
+            self._payloads = [None] * self.max_size
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": True,
+            "size": int(self._valid.sum()),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "corpus_version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """
+    Process-wide cache, or None when disabled in configs/settings.yaml.
+    """
+    global _answer_cache
+
+    if not get_setting("answer_cache", "enabled", True):
+        return None
+
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache(
+            max_size=get_setting("answer_cache", "max_size", 5000),
+            threshold=get_setting("answer_cache", "similarity_threshold", 0.95),
+        )
+    return _answer_cache
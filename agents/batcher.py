@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Sequence
+
+from agents.settings import get_setting
+
+
+# model calls that go through a scheduler, each on its own thread ("lane")
+BATCHED_MODELS = ("encode", "rerank", "generate")
+
+_DEFAULTS = {
+    "encode": {"max_batch": 64, "max_wait_ms": 3},
+    "rerank": {"max_batch": 64, "max_wait_ms": 5},
+    "generate": {"max_batch": 16, "max_wait_ms": 10},
+}
+
+
+class _Call:
+    __slots__ = ("items", "key", "arrived", "done", "result", "error")
+
+    def __init__(self, items: Sequence[Any], key: Hashable):
+        self.items = items
+        self.key = key
+        self.arrived = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """
+    Merges small model calls from concurrent requests into one forward pass.
+    - submit(items, key): blocks until this caller's slice of the batch is ready
+    - a batch is flushed once it holds max_batch items or its oldest call
+      has waited max_wait_ms (the latency a lone request pays at most)
+    - only calls with the same key share a batch (e.g. generation settings)
+    - calls of max_batch items or more skip the queue and run directly
+    fn(items, key) must return one result per item (list or array rows).
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Any], Hashable], Any], max_batch: int = 64,
+                 max_wait_ms: float = 5.0):
+        self.name = name
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000.0
+
+        self._pending: Deque[_Call] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        self.batches = 0
+        self.items = 0
+        self.calls = 0
+        self.wait_s = 0.0
+
+    def submit(self, items: Sequence[Any], key: Hashable = None) -> Any:
+        if not items:
+            return []
+        if len(items) >= self.max_batch:
+            return self.fn(list(items), key)
+
+        call = _Call(items, key)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"batch-{self.name}", daemon=True)
+                self._thread.start()
+            self._pending.append(call)
+            self._cond.notify()
+
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _size(self, key: Hashable) -> int:
+        return sum(len(c.items) for c in self._pending if c.key == key)
+
+    def _next_batch(self) -> List[_Call]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            first = self._pending[0]
+            deadline = first.arrived + self.max_wait_s
+            while self._size(first.key) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch: List[_Call] = []
+            size = 0
+            for c in list(self._pending):
+                if c.key != first.key:
+                    continue
+                if batch and size + len(c.items) > self.max_batch:
+                    break
+                batch.append(c)
+                size += len(c.items)
+            for c in batch:
+                self._pending.remove(c)
+            return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            items = [item for c in batch for item in c.items]
+            try:
+                results = self.fn(items, batch[0].key)
+            except BaseException as e:
+                for c in batch:
+                    c.error = e
+                    c.done.set()
+                continue
+
+            offset = 0
+            for c in batch:
+                c.result = results[offset:offset + len(c.items)]
+                offset += len(c.items)
+                c.done.set()
+
+            self.batches += 1
+            self.items += len(items)
+            self.calls += len(batch)
+            self.wait_s += sum(started - c.arrived for c in batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "calls": self.calls,
+            "mean_batch_items": round(self.items / self.batches, 2) if self.batches else None,
+            "mean_wait_ms": round(1000 * self.wait_s / self.calls, 2) if self.calls else None,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(1000 * self.max_wait_s, 2),
+        }
+
+
+_batchers: Dict[str, MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def batching_enabled() -> bool:
+    return bool(get_setting("batching", "enabled", False))
+
+
+def get_batcher(name: str, fn: Callable[[List[Any], Hashable], Any]) -> Optional[MicroBatcher]:
+    """
+    Process-wide scheduler for one model call (batching.<name> in
+    configs/settings.yaml), or None when batching is off.
+    """
+    if not batching_enabled():
+        return None
+    batcher = _batchers.get(name)
+    if batcher is not None:
+        return batcher
+
+    with _batchers_lock:
+        if name not in _batchers:
+            cfg = {**_DEFAULTS.get(name, {}), **(get_setting("batching", name, None) or {})}
+            _batchers[name] = MicroBatcher(name, fn, max_batch=cfg["max_batch"], max_wait_ms=cfg["max_wait_ms"])
+        return _batchers[name]
+
+
+def batcher_stats() -> Dict[str, Any]:
+    return {"enabled": batching_enabled(), **{name: b.stats() for name, b in _batchers.items()}}
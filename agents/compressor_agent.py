@@ -1,46 +1,90 @@
-from typing import List
-import re
+import threading
+from typing import Dict, List, Optional
+import numpy as np
 from langchain_core.documents import Document
-from sentence_transformers import SentenceTransformer, util
 
-_embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+from agents.embedding_service import encode_query, encode_texts
+from ingestion.corpus_version import read_corpus_version
+from ingestion.sentence_index import SENTENCE_DIR, SentenceIndex, load_sentence_index, split_sentences
 
+# prebuilt by ingestion/build_vectorstore.py (None -> encode sentences on the fly),
+# swapped as a whole when ingestion stamps a new corpus version
+_sentence_data: Dict[str, object] = {"version": None, "index": None}
+_sentence_lock = threading.Lock()
 
-def _split_sentences(text: str) -> List[str]:
-    text = re.sub(r"\s+", " ", text).strip()
-    sentences = re.split(r"(?<=[.!?])\s+", text)
-    return [s.strip() for s in sentences if len(s.strip()) > 25]
 
+def _current_sentence_index() -> Optional[SentenceIndex]:
+    global _sentence_data
+    version = read_corpus_version()
+    data = _sentence_data
+    if data["version"] == version:
+        return data["index"]
+    with _sentence_lock:
+        if _sentence_data["version"] != version:
+            _sentence_data = {"version": version, "index": load_sentence_index(SENTENCE_DIR)}
+        return _sentence_data["index"]
 
-def compressor_agent(query: str, docs: List[Document]) -> str:
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def compressor_agent(
+    query: str,
+    docs: List[Document],
+    query_embedding: Optional[List[float]] = None
+) -> str:
     """
     Compress context locally:
     - Split docs into sentences
     - Rank sentences by similarity to query
+      (precomputed sentence vectors; only unknown chunks are encoded)
     - Keep top sentences
     """
 
     if not docs:
         return ""
 
+    sentence_index = _current_sentence_index()
     sentences = []
+    vectors = []
+    to_encode = []  # (position in sentences, sentence)
+
     for d in docs[:6]:
-        sents = _split_sentences(d.page_content)
-        for s in sents:
+        sents = split_sentences(d.page_content)
+        if not sents:
+            continue
+
+        pre = None
+        if sentence_index is not None:
+            pre = sentence_index.lookup(d.metadata.get("doc_id") or d.id or "", len(sents))
+
+        for j, s in enumerate(sents):
+            if pre is not None:
+                vectors.append(pre[j])
+            else:
+                to_encode.append((len(sentences), s))
+                vectors.append(None)
             sentences.append(s)
 
     if not sentences:
         return "\n\n".join([d.page_content[:600] for d in docs[:3]])
 
-    q_emb = _embedder.encode(query, convert_to_tensor=True)
-    s_emb = _embedder.encode(sentences, convert_to_tensor=True)
+    if to_encode:
+        encoded = _normalize(encode_texts([s for _, s in to_encode]))
+        for (pos, _), vec in zip(to_encode, encoded):
+            vectors[pos] = vec
+
+    q_emb = encode_query(query) if query_embedding is None else query_embedding
+    s_emb = np.stack(vectors).astype(np.float32)
 
-    scores = util.cos_sim(q_emb, s_emb)[0].cpu().tolist()
+    scores = s_emb @ _normalize(q_emb)
 
-    ranked = sorted(zip(sentences, scores), key=lambda x: x[1], reverse=True)
+    # stable, like sorted(..., reverse=True)
+    order = np.argsort(-scores, kind="stable")[:18]
 
-    top_sentences = []
-    for sent, sc in ranked[:18]:
-        top_sentences.append(sent)
+    top_sentences = [sentences[i] for i in order]
 
-    return "\n".join(top_sentences)
\ No newline at end of file
+    return "\n".join(top_sentences)
@@ -0,0 +1,58 @@
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from ingestion.vector_index import VectorIndex
+from agents.handbook_router import chroma_filter, handbook_ranges
+
+
+class ChromaBackend:
+    """
+    Dense search through the Chroma collection (float32 HNSW).
+    """
+
+    name = "chroma"
+
+    def __init__(self, vectordb):
+        self.vectordb = vectordb
+
+    def search(self, query_embedding, k: int, handbook: Optional[str] = None) -> List[Tuple[Document, float]]:
+        # higher is better: negated Chroma distance
+        hits = self.vectordb.similarity_search_by_vector_with_relevance_scores(
+            list(map(float, query_embedding)),
+            k=k,
+            filter=chroma_filter(handbook) if handbook else None,
+        )
+        return [(d, -dist) for d, dist in hits]
+
+
+class LocalIndexBackend:
+    """
+    Dense search on the in-process quantized index (ingestion/vector_index.py).
+    Only the top-k chunk texts are fetched, by id. With a handbook, only
+    its row ranges are scanned.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        index: VectorIndex,
+        fetch_docs: Callable[[List[str]], List[Document]],
+        nprobe: int = 8,
+        exact: bool = False,
+        version: str = "unversioned",
+    ):
+        self.index = index
+        self.version = version
+        self.fetch_docs = fetch_docs
+        self.nprobe = nprobe
+        self.exact = exact
+
+    def search(self, query_embedding, k: int, handbook: Optional[str] = None) -> List[Tuple[Document, float]]:
+        ranges = None
+        if handbook:
+            ranges = handbook_ranges(self.index.doc_ids, self.index.row_of.get, handbook, f"vectors@{self.version}")
+        hits = self.index.search(query_embedding, k=k, nprobe=self.nprobe, exact=self.exact, ranges=ranges)
+        docs = {d.id: d for d in self.fetch_docs([doc_id for doc_id, _ in hits])}
+        return [(docs[doc_id], score) for doc_id, score in hits if doc_id in docs]
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from agents.batcher import get_batcher
+from agents.inference_backend import load_sentence_encoder
+from agents.model_registry import get_model, register_model
+from agents.tracing import count_forward
+
+
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _load_embedder():
+    # SentenceTransformer or its ONNX Runtime twin (inference.backend)
+    return load_sentence_encoder(EMBED_MODEL_NAME)
+
+
+# one bi-encoder per process, shared by every agent + the Chroma client (loaded on first use)
+register_model("embedder", _load_embedder, warm=lambda m: m.encode(["warm up"]))
+
+_QUERY_CACHE_SIZE = 1024
+_query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_embedder():
+    return get_model("embedder")
+
+
+def _encode_batch(texts: List[str], _key=None) -> np.ndarray:
+    # one forward pass over texts merged from concurrent callers
+    return get_embedder().encode(texts, batch_size=len(texts), convert_to_numpy=True).astype(np.float32)
+
+
+def encode_texts(texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Encodes a batch of texts -> float32 array [n, dim].
+    Small calls share forward passes with concurrent requests when
+    batching is on (see agents/batcher.py).
+    """
+    model = get_embedder()
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    count_forward("embed", len(texts), batch_size)
+    batcher = get_batcher("encode", _encode_batch)
+    if batcher is not None and len(texts) < batch_size:
+        return batcher.submit(texts)
+    return model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+
+
+def encode_query(text: str) -> np.ndarray:
+    """
+    Encodes one query -> float32 array [dim].
+    Memoized (bounded LRU), so the same text is never encoded twice
+    while it is hot (e.g. classifier, retrieval and compressor in one request).
+    """
+    with _cache_lock:
+        vec = _query_cache.get(text)
+        if vec is not None:
+            _query_cache.move_to_end(text)
+            return vec
+
+    vec = encode_texts([text])[0]
+    vec.setflags(write=False)
+
+    with _cache_lock:
+        _query_cache[text] = vec
+        if len(_query_cache) > _QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+
+    return vec
+
+
+def prime_query_cache(texts: List[str], vectors: np.ndarray) -> None:
+    """
+    Seeds the encode_query memo with vectors computed in one batched call
+    (bulk answering: every query of a window is encoded up front).
+    """
+    with _cache_lock:
+        for text, vec in zip(texts, vectors):
+            vec = np.array(vec, dtype=np.float32)
+            vec.setflags(write=False)
+            _query_cache[text] = vec
+            _query_cache.move_to_end(text)
+        while len(_query_cache) > _QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+
+
+class SharedEmbeddings(Embeddings):
+    """
+    LangChain embeddings adapter over the shared model
+    (replaces a separate HuggingFaceEmbeddings instance).
+    """
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return encode_texts(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return encode_query(text).tolist()
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+from agents.settings import get_setting
+from agents.tracing import add_cpu
+
+
+# bounded pool for CPU-bound model steps (encoders, reranker, FLAN-T5),
+# so the event loop never runs them and they can't oversubscribe the cores
+CPU_WORKERS = get_setting("runtime", "cpu_workers", min(4, os.cpu_count() or 1))
+
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="rag-cpu")
+
+# separate pool for fan-out inside a node (dense ‖ BM25), so a node already
+# running on the CPU pool never waits on a task queued behind itself
+SEARCH_WORKERS = get_setting("runtime", "search_workers", 4)
+
+_search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="rag-search")
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    return _cpu_executor
+
+
+def _cpu_timed(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    # worker-thread CPU time is charged to the calling node's trace
+    t0 = time.thread_time()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        add_cpu(time.thread_time() - t0)
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs fn(*args, **kwargs) on the CPU pool without blocking the event loop.
+    Context variables are carried over to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, _cpu_timed, fn, *args, **kwargs)
+    return await loop.run_in_executor(_cpu_executor, call)
+
+
+def run_parallel(*calls: Callable[[], Any]) -> List[Any]:
+    """
+    Runs zero-argument callables concurrently and returns their results in order.
+    - the first runs in the calling thread, the rest on the search pool
+    - context variables are carried over
+    """
+    if len(calls) <= 1:
+        return [c() for c in calls]
+
+    futures = [
+        _search_executor.submit(contextvars.copy_context().run, _cpu_timed, c)
+        for c in calls[1:]
+    ]
+    first = calls[0]()
+    return [first] + [f.result() for f in futures]
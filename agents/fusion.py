@@ -0,0 +1,97 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+FUSION_METHODS = ("rrf", "weighted")
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+    argpartition is O(N); only the k winners get sorted.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    if not len(scores):
+        return scores
+    lo, hi = scores.min(), scores.max()
+    if hi - lo < 1e-12:
+        return np.ones_like(scores)
+    return (scores - lo) / (hi - lo)
+
+
+def _accumulate(ids: List[np.ndarray], contributions: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    all_ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+    all_scores = np.concatenate(contributions) if contributions else np.empty(0, dtype=np.float32)
+    if not len(all_ids):
+        return all_ids, all_scores.astype(np.float32)
+
+    uniq, inverse = np.unique(all_ids, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=all_scores).astype(np.float32)
+
+
+def reciprocal_rank_fusion(
+    ranked_ids: List[np.ndarray],
+    weights: Optional[List[float]] = None,
+    k: int = 60,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    RRF: score(d) = sum_i w_i / (k + rank_i(d)), rank starting at 1.
+    Each array in ranked_ids must be ordered best first.
+    """
+    weights = weights or [1.0] * len(ranked_ids)
+    contributions = [
+        w / (k + np.arange(1, len(ids) + 1, dtype=np.float32))
+        for ids, w in zip(ranked_ids, weights)
+    ]
+    return _accumulate(ranked_ids, contributions)
+
+
+def weighted_score_fusion(
+    ids: List[np.ndarray],
+    scores: List[np.ndarray],
+    weights: Optional[List[float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Min-max normalizes each result list to [0, 1], then sums weighted scores.
+    Scores must be "higher is better".
+    """
+    weights = weights or [1.0] * len(ids)
+    contributions = [
+        w * _min_max(np.asarray(s, dtype=np.float32))
+        for s, w in zip(scores, weights)
+    ]
+    return _accumulate(ids, contributions)
+
+
+def fuse(
+    ids: List[np.ndarray],
+    scores: List[np.ndarray],
+    method: str = "rrf",
+    weights: Optional[List[float]] = None,
+    rrf_k: int = 60,
+    top_n: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuses several (ids, scores) result lists into one ranked list.
+    Returns (ids, fused_scores), best first.
+    """
+    if method == "rrf":
+        fused_ids, fused_scores = reciprocal_rank_fusion(ids, weights=weights, k=rrf_k)
+    elif method == "weighted":
+        fused_ids, fused_scores = weighted_score_fusion(ids, scores, weights=weights)
+    else:
+        raise ValueError(f"Unknown fusion method: {method} (expected one of {FUSION_METHODS})")
+
+    order = top_k_indices(fused_scores, top_n if top_n is not None else len(fused_scores))
+    return fused_ids[order], fused_scores[order]
@@ -0,0 +1,145 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agents.settings import get_setting
+from ingestion.corpus_version import read_corpus_version
+from ingestion.dedup import load_aliases
+from ingestion.handbook_centroids import load_centroids
+
+
+# centroids this close are copies of the same handbook (e.g. "X.pdf" and "X (1).pdf")
+DUPLICATE_SIMILARITY = 0.99
+
+# routing data of one corpus version, swapped as a whole after re-ingestion
+_data: Dict[str, object] = {"version": None}
+_data_lock = threading.Lock()
+
+# (index version, handbook) -> row ranges
+_ranges_cache: Dict[Tuple[str, str], np.ndarray] = {}
+_ranges_lock = threading.Lock()
+
+
+def _load(version: str) -> Dict[str, object]:
+    centroids = load_centroids()
+    names = sorted(centroids)
+    # handbook -> canonical chunk ids holding its deduplicated text (ingestion dedup)
+    alias_of_handbook: Dict[str, List[str]] = {}
+    for canonical, entries in load_aliases().items():
+        for entry in entries:
+            alias_of_handbook.setdefault(entry["handbook_name"], []).append(canonical)
+    return {
+        "version": version,
+        "names": names,
+        "matrix": np.stack([centroids[n] for n in names]) if names else None,
+        "alias_ids": alias_of_handbook,
+    }
+
+
+def _current() -> Dict[str, object]:
+    """
+    Centroids + aliases of the current corpus version, reloaded when
+    ingestion stamps a new one.
+    """
+    global _data
+    version = read_corpus_version()
+    data = _data
+    if data["version"] == version:
+        return data
+    with _data_lock:
+        if _data["version"] != version:
+            _data = _load(version)
+            with _ranges_lock:
+                _ranges_cache.clear()
+        return _data
+
+
+def list_handbooks() -> List[str]:
+    """
+    Handbooks known to the router (empty before the first ingestion).
+    """
+    return list(_current()["names"])
+
+
+def route_handbook(query_embedding) -> Optional[str]:
+    """
+    Cheap first-stage router: picks the handbook whose embedding centroid is
+    closest to the query, or None when it is not clearly ahead of the next
+    distinct handbook (then every handbook is searched).
+    """
+    data = _current()
+    names, matrix = data["names"], data["matrix"]
+    if matrix is None or len(names) < 2 or not get_setting("handbook_router", "enabled", True):
+        return None
+
+    q = np.asarray(query_embedding, dtype=np.float32)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    sims = matrix @ q
+    order = np.argsort(-sims)
+    best = int(order[0])
+
+    for other in order[1:].tolist():
+        if float(matrix[other] @ matrix[best]) >= DUPLICATE_SIMILARITY:
+            continue
+        if sims[best] - sims[other] < get_setting("handbook_router", "min_margin", 0.05):
+            return None
+        break
+    return names[best]
+
+
+def alias_ids(handbook: str) -> List[str]:
+    return _current()["alias_ids"].get(handbook, [])
+
+
+def chroma_filter(handbook: str) -> Dict[str, object]:
+    """
+    Chroma `where` filter for one handbook: its own chunks plus the
+    canonical chunks of text deduplicated out of it.
+    """
+    own = {"handbook_name": handbook}
+    extra = alias_ids(handbook)
+    if not extra:
+        return own
+    return {"$or": [own, {"doc_id": {"$in": extra}}]}
+
+
+def _rows_to_ranges(rows: np.ndarray) -> np.ndarray:
+    rows = np.unique(rows)
+    if not len(rows):
+        return np.zeros((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = rows[np.r_[0, breaks]]
+    ends = rows[np.r_[breaks - 1, len(rows) - 1]] + 1
+    return np.stack([starts, ends], axis=1).astype(np.int64)
+
+
+def handbook_ranges(
+    doc_ids: List[str],
+    row_of: Callable[[str], Optional[int]],
+    handbook: str,
+    index_version: str,
+) -> np.ndarray:
+    """
+    Partition of an index (BM25 / local vectors) for one handbook, as sorted
+    [start, end) row ranges. Ingestion keeps each handbook contiguous, so this
+    is one range plus the canonical rows of its deduplicated chunks.
+    Computed once per index version (e.g. "bm25@<corpus version>") and handbook.
+    """
+    key = (index_version, handbook)
+    with _ranges_lock:
+        cached = _ranges_cache.get(key)
+    if cached is not None:
+        return cached
+
+    prefix = handbook + "::"
+    rows = [i for i, doc_id in enumerate(doc_ids) if doc_id.startswith(prefix)]
+    for doc_id in alias_ids(handbook):
+        row = row_of(doc_id)
+        if row is not None and row >= 0:
+            rows.append(row)
+    ranges = _rows_to_ranges(np.array(rows, dtype=np.int64))
+
+    with _ranges_lock:
+        _ranges_cache[key] = ranges
+    return ranges
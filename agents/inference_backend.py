@@ -0,0 +1,409 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agents.settings import get_setting
+
+
+# exported models: data/onnx/<model slug>/{model.onnx, model.int8.onnx, meta.json, tokenizer files}
+ONNX_DIR = "data/onnx"
+ONNX_OPSET = 17
+BACKENDS = ("torch", "onnx")
+
+
+# -----------------------------
+# Threads
+# -----------------------------
+def cpu_quota() -> int:
+    """
+    CPUs this process may use: the cgroup CPU quota (pod limit) when one is
+    set, else the visible cores.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            q, period = f.read().split()[:2]
+        if q != "max":
+            quota = int(q) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+                q = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+                period = int(f.read())
+            if q > 0:
+                quota = q / period
+        except (OSError, ValueError):
+            pass
+    if quota is None:
+        return cores
+    return max(1, min(cores, int(quota)))
+
+
+def intra_op_threads() -> int:
+    """
+    Threads per model call: the CPU quota split across the model calls that
+    may run at once (runtime.cpu_workers, or one per batched model), unless
+    inference.intra_op_threads is set.
+    """
+    configured = get_setting("inference", "intra_op_threads", None)
+    if configured:
+        return int(configured)
+    from agents.batcher import BATCHED_MODELS, batching_enabled
+    if batching_enabled():
+        # model calls run on one scheduler thread per model, not on the CPU pool
+        return max(1, cpu_quota() // len(BATCHED_MODELS))
+    from agents.executor import CPU_WORKERS
+    return max(1, cpu_quota() // max(1, CPU_WORKERS))
+
+
+_torch_configured = False
+
+
+def configure_torch_threads() -> None:
+    global _torch_configured
+    if _torch_configured:
+        return
+    import torch
+    torch.set_num_threads(intra_op_threads())
+    _torch_configured = True
+
+
+def backend_name() -> str:
+    name = get_setting("inference", "backend", "torch")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name} ({' | '.join(BACKENDS)})")
+    return name
+
+
+def _quantize() -> bool:
+    return bool(get_setting("inference", "quantize", True))
+
+
+# -----------------------------
+# ONNX export (needs torch + sentence_transformers, once per model)
+# -----------------------------
+def _model_dir(model_name: str, onnx_dir: str = ONNX_DIR) -> str:
+    return os.path.join(onnx_dir, model_name.replace("/", "__"))
+
+
+@contextmanager
+def _atomic_path(dst: str, suffix: str = "") -> Iterator[str]:
+    """
+    Temp file next to dst, unique per process (workers exporting the same
+    model at cold start never write the same file), moved onto dst on success.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=os.path.basename(dst) + ".", suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _export(module, tokenizer, sample: Dict[str, Any], out_dir: str, output_name: str,
+            output_axes: Dict[int, str], meta: Dict[str, Any]) -> None:
+    import torch
+
+    input_names = list(sample.keys())
+    os.makedirs(out_dir, exist_ok=True)
+    module.eval()
+    with _atomic_path(os.path.join(out_dir, "model.onnx"), suffix=".onnx") as tmp:
+        with torch.no_grad():
+            torch.onnx.export(
+                module,
+                tuple(sample[n] for n in input_names),
+                tmp,
+                input_names=input_names,
+                output_names=[output_name],
+                dynamic_axes={**{n: {0: "batch", 1: "seq"} for n in input_names}, output_name: output_axes},
+                opset_version=ONNX_OPSET,
+                dynamo=False,
+            )
+    tokenizer.save_pretrained(out_dir)
+    with _atomic_path(os.path.join(out_dir, "meta.json")) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**meta, "inputs": input_names}, f, indent=2)
+
+
+def export_sentence_encoder(model_name: str, onnx_dir: str = ONNX_DIR) -> str:
+    """
+    Exports the transformer of a SentenceTransformer (token embeddings);
+    mean pooling + normalization run in numpy.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = [m for m in st if type(m).__name__ == "Pooling"]
+    if not pooling or pooling[0].get_pooling_mode_str() != "mean":
+        raise ValueError(f"{model_name}: only mean-pooled sentence encoders can be exported")
+
+    transformer = st[0].auto_model
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model, names):
+            super().__init__()
+            self.model = model
+            self.names = names
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(self.names, inputs))).last_hidden_state
+
+    tokenizer = st.tokenizer
+    sample = dict(tokenizer(["warm up"], return_tensors="pt"))
+    out_dir = _model_dir(model_name, onnx_dir)
+    _export(
+        TokenEmbeddings(transformer, list(sample.keys())),
+        tokenizer,
+        sample,
+        out_dir,
+        "token_embeddings",
+        {0: "batch", 1: "seq"},
+        {
+            "model": model_name,
+            "kind": "sentence_encoder",
+            "max_length": st.max_seq_length,
+            "dim": st.get_sentence_embedding_dimension(),
+            "normalize": any(type(m).__name__ == "Normalize" for m in st),
+        },
+    )
+    return out_dir
+
+
+def export_cross_encoder(model_name: str, max_length: int, onnx_dir: str = ONNX_DIR) -> str:
+    """
+    Exports a CrossEncoder's classifier (logits); its activation is recorded
+    and applied in numpy so scores match CrossEncoder.predict.
+    """
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    ce = CrossEncoder(model_name, max_length=max_length, device="cpu")
+    activation = getattr(ce, "activation_fn", None) or getattr(ce, "default_activation_function", None)
+
+    class Logits(torch.nn.Module):
+        def __init__(self, model, names):
+            super().__init__()
+            self.model = model
+            self.names = names
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(self.names, inputs))).logits
+
+    tokenizer = ce.tokenizer
+    sample = dict(tokenizer(["warm up"], ["warm up"], return_tensors="pt"))
+    out_dir = _model_dir(model_name, onnx_dir)
+    _export(
+        Logits(ce.model, list(sample.keys())),
+        tokenizer,
+        sample,
+        out_dir,
+        "logits",
+        {0: "batch"},
+        {
+            "model": model_name,
+            "kind": "cross_encoder",
+            "max_length": max_length,
+            "activation": "sigmoid" if isinstance(activation, torch.nn.Sigmoid) else "identity",
+        },
+    )
+    return out_dir
+
+
+def quantize_onnx(out_dir: str) -> str:
+    """
+    Dynamic int8 quantization (int8 weights, activations quantized per call).
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    src = os.path.join(out_dir, "model.onnx")
+    dst = os.path.join(out_dir, "model.int8.onnx")
+    with _atomic_path(dst, suffix=".onnx") as tmp:
+        quantize_dynamic(src, tmp, weight_type=QuantType.QInt8)
+    return dst
+
+
+def ensure_onnx(model_name: str, kind: str, quantized: bool, max_length: Optional[int] = None,
+                onnx_dir: str = ONNX_DIR) -> str:
+    """
+    Path of the exported (and optionally quantized) model, exporting on first use.
+    """
+    out_dir = _model_dir(model_name, onnx_dir)
+    meta_path = os.path.join(out_dir, "meta.json")
+    stale = True
+    if os.path.exists(meta_path) and os.path.exists(os.path.join(out_dir, "model.onnx")):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        stale = kind == "cross_encoder" and meta.get("max_length") != max_length
+
+    if stale:
+        print(f"📦 Exporting {model_name} to ONNX ({out_dir})")
+        if kind == "sentence_encoder":
+            export_sentence_encoder(model_name, onnx_dir)
+        else:
+            export_cross_encoder(model_name, max_length, onnx_dir)
+        int8_path = os.path.join(out_dir, "model.int8.onnx")
+        if os.path.exists(int8_path):
+            os.remove(int8_path)
+
+    path = os.path.join(out_dir, "model.int8.onnx" if quantized else "model.onnx")
+    if quantized and not os.path.exists(path):
+        print(f"📦 Quantizing {model_name} (dynamic int8)")
+        quantize_onnx(out_dir)
+    return path
+
+
+# -----------------------------
+# ONNX Runtime models
+# -----------------------------
+def _session(path: str, threads: int):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    # one graph per call: parallelism comes from the CPU pool, not inter-op threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class _OnnxModel:
+    def __init__(self, path: str, threads: Optional[int] = None):
+        from transformers import AutoTokenizer
+
+        model_dir = os.path.dirname(path)
+        with open(os.path.join(model_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = _session(path, threads or intra_op_threads())
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    def _run(self, encoded) -> np.ndarray:
+        feed = {n: np.asarray(encoded[n], dtype=np.int64) for n in self._input_names}
+        return self.session.run(None, feed)[0]
+
+
+class OnnxSentenceEncoder(_OnnxModel):
+    """
+    SentenceTransformer.encode / get_sentence_embedding_dimension on ONNX Runtime
+    (mean pooling + L2 normalization in numpy). Texts are length-sorted into
+    batches to keep padding low.
+    """
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.meta["dim"])
+
+    def encode(self, texts: Sequence[str], batch_size: int = 64, convert_to_numpy: bool = True, **_) -> np.ndarray:
+        texts = list(texts)
+        out = np.zeros((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.meta["max_length"],
+                return_tensors="np",
+            )
+            hidden = self._run(encoded)
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            vecs = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.meta.get("normalize", True):
+                vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+            out[idx] = vecs
+        return out
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """
+    CrossEncoder.predict on ONNX Runtime: one score per (query, passage) pair.
+    """
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 16, **_) -> np.ndarray:
+        pairs = list(pairs)
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            encoded = self.tokenizer(
+                [q for q, _ in batch],
+                [p for _, p in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.meta["max_length"],
+                return_tensors="np",
+            )
+            logits = self._run(encoded)[:, 0]
+            if self.meta.get("activation") == "sigmoid":
+                logits = 1.0 / (1.0 + np.exp(-logits))
+            scores[start:start + len(batch)] = logits
+        return scores
+
+
+# -----------------------------
+# Loaders used by the agents (see agents/model_registry.py)
+# -----------------------------
+def load_sentence_encoder(model_name: str, backend: Optional[str] = None, quantized: Optional[bool] = None):
+    backend = backend or backend_name()
+    if backend == "onnx":
+        quantized = _quantize() if quantized is None else quantized
+        return OnnxSentenceEncoder(ensure_onnx(model_name, "sentence_encoder", quantized))
+
+    configure_torch_threads()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def load_cross_encoder(model_name: str, max_length: int, backend: Optional[str] = None,
+                       quantized: Optional[bool] = None):
+    backend = backend or backend_name()
+    if backend == "onnx":
+        quantized = _quantize() if quantized is None else quantized
+        return OnnxCrossEncoder(ensure_onnx(model_name, "cross_encoder", quantized, max_length=max_length))
+
+    configure_torch_threads()
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+
+def load_seq2seq(model_name: str, quantized: Optional[bool] = None):
+    """
+    (tokenizer, model) for FLAN-T5. Generation stays on PyTorch (beam search +
+    KV cache); inference.rewrite_quantize swaps its Linear layers for dynamic int8.
+    """
+    configure_torch_threads()
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    model.eval()
+    if quantized is None:
+        quantized = get_setting("inference", "rewrite_quantize", False)
+    if quantized:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+
+def describe() -> Dict[str, Any]:
+    return {
+        "backend": backend_name(),
+        "quantized": _quantize() if backend_name() == "onnx" else False,
+        "rewrite_quantized": bool(get_setting("inference", "rewrite_quantize", False)),
+        "intra_op_threads": intra_op_threads(),
+        "cpu_quota": cpu_quota(),
+    }
+
@@ -1,11 +1,13 @@
-import sqlite3
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.sqlite import SqliteSaver
+from typing import Callable, Optional, Tuple
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from agents.state import RAGState
 from agents.nodes import (
     node_query_understanding,
     node_query_rewrite,
+    node_dense_raw,
     node_retrieval,
     node_multihop,
     node_rerank,
@@ -13,8 +15,61 @@ from agents.nodes import (
     node_answer,
     node_verify,
     node_action,
-    node_retry
+    node_retry,
+    anode_answer,
+    anode_action,
+    anode_retry
 )
+from agents.executor import run_cpu
+from agents.settings import get_setting
+from agents.tracing import traced_node
+from memory.checkpoints import open_sqlite_saver
+
+
+CHECKPOINT_PATH = "memory/checkpoints.sqlite"
+
+Candidates = Tuple[Optional[str], Optional[str]]
+
+
+def _offloaded(fn: Callable) -> Callable:
+    async def _run(state: RAGState) -> RAGState:
+        return await run_cpu(fn, state)
+    return _run
+
+
+def _traced(name: str, fn: Callable, candidates: Candidates) -> Callable:
+    # per-node trace -> state["timings"][name], /metrics, OpenTelemetry
+    def _run(state: RAGState) -> RAGState:
+        with traced_node(name, state, candidates) as t:
+            return t.finish(fn(state))
+    return _run
+
+
+def _atraced(name: str, afn: Callable, candidates: Candidates) -> Callable:
+    # event loop is shared: CPU time is only counted for work sent to the pools
+    async def _run(state: RAGState) -> RAGState:
+        with traced_node(name, state, candidates, own_cpu=False) as t:
+            return t.finish(await afn(state))
+    return _run
+
+
+def _node(
+    name: str,
+    fn: Callable,
+    afn: Optional[Callable] = None,
+    candidates: Candidates = (None, None)
+) -> RunnableLambda:
+    """
+    Traced node usable from both APIs:
+    - invoke/stream run fn
+    - ainvoke/astream run afn, or fn on the bounded CPU pool
+    candidates: (input, output) state keys whose doc counts are recorded
+    """
+    return RunnableLambda(
+        _traced(name, fn, candidates),
+        afunc=_atraced(name, afn or _offloaded(fn), candidates),
+        name=fn.__name__
+    )
 
 
 def route_after_compress(state: RAGState) -> str:
@@ -51,30 +106,49 @@ def route_after_verify(state: RAGState) -> str:
     return "end"
 
 
-def build_graph():
+def build_graph(checkpointer: Optional[BaseCheckpointSaver] = None, parallel: Optional[bool] = None):
+    """
+    Compiles the pipeline.
+    checkpointer: defaults to a sync SqliteSaver; pass an AsyncSqliteSaver
+    (memory.checkpoints.open_async_sqlite_saver) when the graph is driven
+    with ainvoke/astream.
+    parallel: fan out the raw-query dense search next to the FLAN-T5 rewrite
+    (default: runtime.parallel_stages); False gives the linear graph.
+    """
+    if parallel is None:
+        parallel = get_setting("runtime", "parallel_stages", True)
+
     graph = StateGraph(RAGState)
 
     # -----------------------------
     # Nodes
     # -----------------------------
-    graph.add_node("understand", node_query_understanding)
-    graph.add_node("rewrite", node_query_rewrite)
-    graph.add_node("retrieve", node_retrieval)
-    graph.add_node("multihop", node_multihop)
-    graph.add_node("rerank", node_rerank)
-    graph.add_node("compress", node_compress)
-    graph.add_node("answer", node_answer)
-    graph.add_node("verify", node_verify)
-    graph.add_node("retry", node_retry)
-    graph.add_node("action", node_action)
+    graph.add_node("understand", _node("understand", node_query_understanding))
+    graph.add_node("rewrite", _node("rewrite", node_query_rewrite))
+    graph.add_node("retrieve", _node("retrieve", node_retrieval, candidates=(None, "retrieved_docs")))
+    graph.add_node("multihop", _node("multihop", node_multihop, candidates=("retrieved_docs", "retrieved_docs")))
+    graph.add_node("rerank", _node("rerank", node_rerank, candidates=("retrieved_docs", "reranked_docs")))
+    graph.add_node("compress", _node("compress", node_compress, candidates=("reranked_docs", None)))
+    graph.add_node("answer", _node("answer", node_answer, anode_answer, candidates=("reranked_docs", None)))
+    graph.add_node("verify", _node("verify", node_verify))
+    graph.add_node("retry", _node("retry", node_retry, anode_retry, candidates=(None, "reranked_docs")))
+    graph.add_node("action", _node("action", node_action, anode_action, candidates=("reranked_docs", None)))
 
     # -----------------------------
     # Flow edges
     # -----------------------------
-    graph.set_entry_point("understand")
+    graph.add_edge(START, "understand")
+
+    if parallel:
+        # understand -> {rewrite ‖ dense_raw} -> retrieve (waits for both)
+        graph.add_node("dense_raw", _node("dense_raw", node_dense_raw, candidates=(None, "raw_dense_docs")))
+        graph.add_edge("understand", "rewrite")
+        graph.add_edge("understand", "dense_raw")
+        graph.add_edge(["rewrite", "dense_raw"], "retrieve")
+    else:
+        graph.add_edge("understand", "rewrite")
+        graph.add_edge("rewrite", "retrieve")
 
-    graph.add_edge("understand", "rewrite")
-    graph.add_edge("rewrite", "retrieve")
     graph.add_edge("retrieve", "multihop")
     graph.add_edge("multihop", "rerank")
     graph.add_edge("rerank", "compress")
@@ -111,7 +185,8 @@ def build_graph():
     # -----------------------------
     # SQLite Checkpointing
     # -----------------------------
-    conn = sqlite3.connect("memory/checkpoints.sqlite", check_same_thread=False)
-    checkpointer = SqliteSaver(conn)
+    if checkpointer is None:
+        # WAL + chunk ids instead of chunk texts (see memory/checkpoints.py)
+        checkpointer = open_sqlite_saver(CHECKPOINT_PATH)
 
     return graph.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -1,19 +1,382 @@
+import asyncio
 import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.language_models.chat_models import BaseChatModel
 
+from agents.settings import get_setting
+from agents.tracing import count_tokens
 
-def get_llm():
-    load_dotenv()
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("❌ GEMINI_API_KEY not found in .env")
+GEMINI_MODEL = "models/gemini-2.5-flash"
+
+
+def message_text(message) -> str:
+    """
+    Text of a chat message / stream chunk (content may be a list of parts).
+    """
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+
 
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-2.5-flash",
-        google_api_key=api_key,
-        temperature=0.2,
-        max_output_tokens=1024,
+def _is_retryable(exc: Exception) -> bool:
+    # quota (429), overload (503/500) and transient network errors
+    text = f"{type(exc).__name__} {exc}".upper()
+    markers = (
+        "429", "RESOURCE_EXHAUSTED", "RATE LIMIT", "RATELIMIT",
+        "503", "UNAVAILABLE", "500 INTERNAL", "INTERNALSERVERERROR",
+        "TIMEOUT", "DEADLINE_EXCEEDED", "CONNECTIONERROR",
     )
-    return llm
\ No newline at end of file
+    return any(m in text for m in markers)
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter (rate = requests per second, burst = capacity).
+    Usable from threads and from the event loop.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        """
+        Takes a token and returns 0, or returns the seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self) -> float:
+        waited = 0.0
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+class ConcurrencyLimit:
+    """
+    Caps in-flight calls across threads and event loops with one shared
+    count (an asyncio.Semaphore would bind to the first loop that uses it).
+    Async waiters poll, like TokenBucket.acquire_async.
+    """
+
+    def __init__(self, limit: int, poll_s: float = 0.005):
+        self.limit = limit
+        self.poll_s = poll_s
+        self._active = 0
+        self._cond = threading.Condition()
+
+    def _try_enter(self) -> bool:
+        with self._cond:
+            if self._active < self.limit:
+                self._active += 1
+                return True
+            return False
+
+    def _release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def hold(self):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def hold_async(self):
+        while not self._try_enter():
+            await asyncio.sleep(self.poll_s)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+class LLMGateway:
+    """
+    Process-wide access to the chat model, shared by every agent:
+    - one client per temperature (connection + auth reuse)
+    - token-bucket rate limit sized to the quota
+    - bounded concurrency (one limit for sync and async calls)
+    - jittered exponential retries on 429 / 5xx
+    - latency + token usage metrics
+    """
+
+    def __init__(
+        self,
+        backend: str = "gemini",
+        requests_per_minute: float = 60,
+        burst: float = 5,
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+    ):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=burst)
+        self._limit = ConcurrencyLimit(max_concurrency)
+
+        self._models: Dict[float, BaseChatModel] = {}
+        self._models_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=2000)
+        self._counters = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "rate_limit_wait_s": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+        }
+
+    # -----------------------------
+    # Clients
+    # -----------------------------
+    def chat_model(self, temperature: float = 0.2) -> BaseChatModel:
+        with self._models_lock:
+            model = self._models.get(temperature)
+            if model is None:
+                model = self._create_model(temperature)
+                self._models[temperature] = model
+            return model
+
+    def _create_model(self, temperature: float) -> BaseChatModel:
+        if self.backend == "stub":
+            from agents.llm_stub import StubChatModel
+            return StubChatModel(
+                latency_s=get_setting("llm", "stub_latency_s", 0.3),
+                error_rate=get_setting("llm", "stub_error_rate", 0.0),
+            )
+
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("❌ GEMINI_API_KEY not found in .env")
+
+        return ChatGoogleGenerativeAI(
+            model=GEMINI_MODEL,
+            google_api_key=api_key,
+            temperature=temperature,
+            max_output_tokens=get_setting("llm", "max_output_tokens", 1024),
+        )
+
+    # -----------------------------
+    # Metrics
+    # -----------------------------
+    def _record(self, seconds: float, message: Any = None, error: bool = False) -> None:
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._metrics_lock:
+            self._counters["calls"] += 1
+            if error:
+                self._counters["errors"] += 1
+                return
+            self._latencies.append(seconds)
+            input_tokens = int(usage.get("input_tokens", 0) or 0)
+            output_tokens = int(usage.get("output_tokens", 0) or 0)
+            self._counters["input_tokens"] += input_tokens
+            self._counters["output_tokens"] += output_tokens
+        count_tokens(input_tokens, output_tokens)
+
+    def _count(self, key: str, value: float = 1) -> None:
+        with self._metrics_lock:
+            self._counters[key] += value
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            samples = sorted(self._latencies)
+            out: Dict[str, Any] = {"backend": self.backend, **self._counters}
+        if samples:
+            out["p50_ms"] = round(samples[len(samples) // 2] * 1000, 1)
+            out["p99_ms"] = round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 1)
+        out["rate_limit_wait_s"] = round(out["rate_limit_wait_s"], 3)
+        return out
+
+    # -----------------------------
+    # Calls
+    # -----------------------------
+    def invoke(self, prompt: str, temperature: float = 0.2) -> str:
+        model = self.chat_model(temperature)
+
+        for attempt in range(self.max_retries + 1):
+            self._count("rate_limit_wait_s", self._bucket.acquire())
+            t0 = time.perf_counter()
+            try:
+                with self._limit.hold():
+                    t0 = time.perf_counter()
+                    message = model.invoke(prompt)
+            except Exception as e:
+                self._record(time.perf_counter() - t0, error=True)
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                self._count("retries")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self._record(time.perf_counter() - t0, message)
+            return message_text(message).strip()
+
+    async def ainvoke(self, prompt: str, temperature: float = 0.2) -> str:
+        model = self.chat_model(temperature)
+
+        for attempt in range(self.max_retries + 1):
+            self._count("rate_limit_wait_s", await self._bucket.acquire_async())
+            t0 = time.perf_counter()
+            try:
+                async with self._limit.hold_async():
+                    t0 = time.perf_counter()
+                    message = await model.ainvoke(prompt)
+            except Exception as e:
+                self._record(time.perf_counter() - t0, error=True)
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            self._record(time.perf_counter() - t0, message)
+            return message_text(message).strip()
+
+    def stream(self, prompt: str, temperature: float = 0.2) -> Iterator[str]:
+        """
+        Token stream. Retries only before the first token.
+        """
+        model = self.chat_model(temperature)
+
+        for attempt in range(self.max_retries + 1):
+            self._count("rate_limit_wait_s", self._bucket.acquire())
+            t0 = time.perf_counter()
+            started = False
+            usage = None
+            try:
+                with self._limit.hold():
+                    t0 = time.perf_counter()
+                    for chunk in model.stream(prompt):
+                        usage = getattr(chunk, "usage_metadata", None) or usage
+                        text = message_text(chunk)
+                        if text:
+                            started = True
+                            yield text
+            except Exception as e:
+                self._record(time.perf_counter() - t0, error=True)
+                if started or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                self._count("retries")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self._record(time.perf_counter() - t0, _Usage(usage))
+            return
+
+    async def astream(self, prompt: str, temperature: float = 0.2) -> AsyncIterator[str]:
+        """
+        Async token stream. Retries only before the first token.
+        """
+        model = self.chat_model(temperature)
+
+        for attempt in range(self.max_retries + 1):
+            self._count("rate_limit_wait_s", await self._bucket.acquire_async())
+            t0 = time.perf_counter()
+            started = False
+            usage = None
+            try:
+                async with self._limit.hold_async():
+                    t0 = time.perf_counter()
+                    async for chunk in model.astream(prompt):
+                        usage = getattr(chunk, "usage_metadata", None) or usage
+                        text = message_text(chunk)
+                        if text:
+                            started = True
+                            yield text
+            except Exception as e:
+                self._record(time.perf_counter() - t0, error=True)
+                if started or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            self._record(time.perf_counter() - t0, _Usage(usage))
+            return
+
+
+class _Usage:
+    # adapter so streamed usage goes through the same _record path
+    def __init__(self, usage_metadata: Optional[dict]):
+        self.usage_metadata = usage_metadata
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """
+    Process-wide gateway. Backend: LLM_BACKEND env var or llm.backend
+    in configs/settings.yaml ("gemini" or "stub" for offline runs).
+    """
+    global _gateway
+
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                load_dotenv()
+                _gateway = LLMGateway(
+                    backend=os.getenv("LLM_BACKEND") or get_setting("llm", "backend", "gemini"),
+                    requests_per_minute=get_setting("llm", "requests_per_minute", 60),
+                    burst=get_setting("llm", "burst", 5),
+                    max_concurrency=get_setting("llm", "max_concurrency", 8),
+                    max_retries=get_setting("llm", "max_retries", 4),
+                    base_delay=get_setting("llm", "retry_base_delay_s", 1.0),
+                    max_delay=get_setting("llm", "retry_max_delay_s", 20.0),
+                )
+    return _gateway
+
+
+def get_llm():
+    return get_gateway().chat_model(temperature=0.2)
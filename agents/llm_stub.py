@@ -0,0 +1,150 @@
+import asyncio
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class StubRateLimitError(Exception):
+    """
+    Mimics Gemini's quota error so retry paths can be exercised offline.
+    """
+
+    def __init__(self):
+        super().__init__("429 RESOURCE_EXHAUSTED: stub quota exceeded")
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Offline stand-in for Gemini:
+    - sleeps latency_s (+/- jitter) per call
+    - raises StubRateLimitError with probability error_rate
+    - answers with a short bullet list built from the prompt context,
+      ending with a "Sources:" section (first available citation)
+    """
+
+    latency_s: float = 0.3
+    jitter_s: float = 0.1
+    error_rate: float = 0.0
+    tokens_per_chunk: int = 4
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    # -----------------------------
+    # Fake completion
+    # -----------------------------
+    @staticmethod
+    def _prompt_text(messages: List[BaseMessage]) -> str:
+        return "\n".join(m.content if isinstance(m.content, str) else str(m.content) for m in messages)
+
+    @staticmethod
+    def _completion(prompt: str) -> str:
+        context = ""
+        m = re.search(r"Context[^\n]*:\n(.*?)\n\n", prompt, flags=re.S)
+        if m:
+            context = m.group(1).strip()
+
+        citation = ""
+        m = re.search(r"^\[1\][^\n]*$", prompt, flags=re.M)
+        if m:
+            citation = m.group(0)
+
+        if not context:
+            return "Not found in handbook documents."
+
+        lines = [l.strip() for l in context.splitlines() if l.strip()][:3]
+        body = "\n".join(f"- {l}" for l in lines)
+        sources = f"\n\nSources:\n{citation}" if citation else ""
+        return body + sources
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency_s + random.uniform(-self.jitter_s, self.jitter_s))
+
+    def _maybe_fail(self) -> None:
+        if random.random() < self.error_rate:
+            raise StubRateLimitError()
+
+    def _usage(self, prompt: str, completion: str) -> dict:
+        # rough token estimate (~4 chars per token)
+        inp, out = len(prompt) // 4, len(completion) // 4
+        return {"input_tokens": inp, "output_tokens": out, "total_tokens": inp + out}
+
+    def _chunks(self, text: str) -> List[str]:
+        words = re.findall(r"\S+\s*", text)
+        step = max(1, self.tokens_per_chunk)
+        return ["".join(words[i:i + step]) for i in range(0, len(words), step)]
+
+    # -----------------------------
+    # BaseChatModel hooks
+    # -----------------------------
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._delay())
+        self._maybe_fail()
+
+        prompt = self._prompt_text(messages)
+        text = self._completion(prompt)
+        message = AIMessage(content=text, usage_metadata=self._usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+
+        prompt = self._prompt_text(messages)
+        text = self._completion(prompt)
+        message = AIMessage(content=text, usage_metadata=self._usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._delay())
+        self._maybe_fail()
+
+        prompt = self._prompt_text(messages)
+        text = self._completion(prompt)
+        chunks = self._chunks(text)
+        for i, piece in enumerate(chunks):
+            usage = self._usage(prompt, text) if i == len(chunks) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+
+        prompt = self._prompt_text(messages)
+        text = self._completion(prompt)
+        chunks = self._chunks(text)
+        for i, piece in enumerate(chunks):
+            usage = self._usage(prompt, text) if i == len(chunks) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            await asyncio.sleep(0)
@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional TTL (seconds).
+    Keeps hit/miss counters for monitoring.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            value, stored_at = item
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class PersistentLRUCache(LRUCache):
+    """
+    LRUCache backed by a SQLite file, so entries survive restarts.
+    Memory is the hot tier; the file keeps at most max_size entries
+    (least recently used evicted) and honours the same TTL.
+    Values must be JSON-serializable.
+    """
+
+    _EVICT_EVERY = 100
+
+    def __init__(self, path: str, max_size: int = 10000, ttl_seconds: Optional[float] = None):
+        super().__init__(max_size=max_size, ttl_seconds=ttl_seconds)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT, stored_at REAL, last_used REAL)"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        self._puts = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = super().get(key, None)
+        if value is not None:
+            return value
+
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE key = ?", (str(key),)
+            ).fetchone()
+            if row is None:
+                return default
+
+            value, stored_at = json.loads(row[0]), row[1]
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (str(key),))
+                self._conn.commit()
+                return default
+
+            self._conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (time.time(), str(key)))
+            self._conn.commit()
+
+        # promote to memory tier (miss already counted by the memory tier)
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+            self._data[key] = (value, stored_at)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        super().put(key, value)
+        now = time.time()
+
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at, last_used) VALUES (?, ?, ?, ?)",
+                (str(key), json.dumps(value), now, now),
+            )
+            self._puts += 1
+            if self._puts % self._EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM cache WHERE stored_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+    def delete(self, key: Hashable) -> None:
+        super().delete(key)
+        with self._db_lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (str(key),))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        super().clear()
+        with self._db_lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
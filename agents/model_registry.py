@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ModelRegistry:
+    """
+    Local models (encoders, reranker, FLAN-T5, Chroma client) by name.
+    - register: a loader (heavy imports go inside it) and an optional
+      warm call that runs one tiny forward pass
+    - get: loads on first use, once per process, and records load time
+    - warm_up: loads + warms every model; `ready` turns true after it
+      (or at once via mark_ready when warm-up is off: models load lazily)
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._warmers: Dict[str, Optional[Callable[[Any], Any]]] = {}
+        self._models: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._warm_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._ready = threading.Event()
+
+    def register(self, name: str, loader: Callable[[], Any], warm: Optional[Callable[[Any], Any]] = None) -> None:
+        self._loaders[name] = loader
+        self._warmers[name] = warm
+        self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        # per-model lock: a request needing the encoder never waits on FLAN-T5
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                t0 = time.perf_counter()
+                model = self._loaders[name]()
+                self._load_seconds[name] = time.perf_counter() - t0
+                self._models[name] = model
+                print(f"✅ Loaded {name} in {self._load_seconds[name]:.2f}s")
+        return model
+
+    def warm_up(self, names: Optional[List[str]] = None) -> None:
+        for name in names or list(self._loaders):
+            model = self.get(name)
+            warm = self._warmers.get(name)
+            if warm is not None and name not in self._warm_seconds:
+                t0 = time.perf_counter()
+                warm(model)
+                self._warm_seconds[name] = time.perf_counter() - t0
+        if names is None:
+            self._ready.set()
+
+    def mark_ready(self) -> None:
+        self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "loaded": name in self._models,
+                "load_seconds": round(self._load_seconds[name], 3) if name in self._load_seconds else None,
+                "warm_seconds": round(self._warm_seconds[name], 3) if name in self._warm_seconds else None,
+            }
+            for name in self._loaders
+        }
+
+
+_registry = ModelRegistry()
+
+
+def register_model(name: str, loader: Callable[[], Any], warm: Optional[Callable[[Any], Any]] = None) -> None:
+    _registry.register(name, loader, warm)
+
+
+def get_model(name: str) -> Any:
+    return _registry.get(name)
+
+
+def warm_up(names: Optional[List[str]] = None) -> None:
+    """
+    Loads (and warms) the given models, or all registered ones; only a full
+    warm-up marks the process ready.
+    """
+    _registry.warm_up(names)
+
+
+def mark_ready() -> None:
+    """
+    Ready without a warm-up (models.warm_up off): each model loads on first use.
+    """
+    _registry.mark_ready()
+
+
+def is_ready() -> bool:
+    return _registry.ready
+
+
+def model_stats() -> Dict[str, Dict[str, Any]]:
+    return _registry.stats()
@@ -1,9 +1,13 @@
-from typing import List
+from typing import List, Optional
 from langchain_core.documents import Document
 from agents.retrieval_agent import hybrid_retrieval_agent
 
 
-def multihop_agent(original_query: str, first_pass_docs: List[Document]) -> List[Document]:
+def multihop_agent(
+    original_query: str,
+    first_pass_docs: List[Document],
+    handbook: Optional[str] = None,
+) -> List[Document]:
     """
     Multi-hop retrieval:
     - Extract keywords from first-pass docs
@@ -25,7 +29,7 @@ def multihop_agent(original_query: str, first_pass_docs: List[Document]) -> List
 
     expanded_query = original_query + " " + " ".join(set(extra_terms))
 
-    second_pass_docs = hybrid_retrieval_agent(expanded_query, k_dense=8, k_bm25=8)
+    second_pass_docs = hybrid_retrieval_agent(expanded_query, k_dense=8, k_bm25=8, handbook=handbook)
 
     # merge
     seen = set()
@@ -1,92 +1,131 @@
 from agents.state import RAGState
-from agents.streaming_agent import log_step
-from memory.conversation_memory import load_memory, append_turn
-from agents.handbook_filter import pick_primary_handbook, filter_docs_by_handbook
+from agents.streaming_agent import step_update
+from memory.conversation_memory import DEFAULT_THREAD, load_memory, append_turn, amend_last_turn
+from agents.handbook_filter import pick_primary_handbook
+from agents.handbook_router import route_handbook
 from agents.query_understanding_agent import query_understanding_agent
 from agents.query_rewrite_agent import query_rewrite_agent
-from agents.retrieval_agent import hybrid_retrieval_agent
+from agents.retrieval_agent import hybrid_retrieval_agent, dense_search
 from agents.multihop_agent import multihop_agent
 from agents.reranker_agent import reranker_agent
 from agents.compressor_agent import compressor_agent
-from agents.answer_agent import answer_agent
+from langgraph.config import get_config, get_stream_writer
+from agents.answer_agent import answer_agent, answer_agent_async, answer_agent_astream
 from agents.verifier_agent import verifier_agent
-from agents.action_agent import action_agent
+from agents.action_agent import action_agent, action_agent_astream
+from agents.embedding_service import encode_query
+from agents.executor import run_cpu
 
-def node_rerank(state: RAGState) -> RAGState:
-    docs = reranker_agent(state["rewritten_query"], state["retrieved_docs"], top_n=8)
-
-    # pick primary handbook
-    primary, dist = pick_primary_handbook(docs)
+def _thread_id() -> str:
+    # conversation memory is per LangGraph thread (config["configurable"]["thread_id"])
+    try:
+        return get_config().get("configurable", {}).get("thread_id") or DEFAULT_THREAD
+    except RuntimeError:
+        return DEFAULT_THREAD
 
-    # filter docs to only primary handbook
-    filtered_docs = filter_docs_by_handbook(docs, primary)
 
-    state["reranked_docs"] = filtered_docs
-    state["primary_handbook"] = primary
-    state["handbook_distribution"] = dist
+def _retry_history(state: RAGState, thread_id: str) -> list:
+    # history without the weak answer node_answer just stored for this query
+    history = load_memory(thread_id)
+    if history and history[-1]["user"] == state["user_query"]:
+        history = history[:-1]
+    return history
 
-    return state
 
 def node_query_understanding(state: RAGState) -> RAGState:
-    log_step(state, "🧭 Understanding query (local classifier)...")
-
     user_query = state["user_query"]
-    result = query_understanding_agent(user_query)
+    query_embedding = encode_query(user_query).tolist()
 
-    state["intent"] = result.get("intent", "general_policy")
-    state["entities"] = result.get("entities", {})
-    state["retrieval_strategy"] = result.get("retrieval_strategy", "single_hop")
-    state["needs_action"] = result.get("needs_action", False)
+    result = query_understanding_agent(user_query, query_embedding=query_embedding)
 
-    return state
+    # explicit handbook (request) wins, else the centroid router (None = all handbooks)
+    handbook = state.get("requested_handbook") or route_handbook(query_embedding)
 
+    return step_update(
+        "🧭 Understanding query (local classifier)...",
+        query_embedding=query_embedding,
+        handbook=handbook,
+        intent=result.get("intent", "general_policy"),
+        entities=result.get("entities", {}),
+        retrieval_strategy=result.get("retrieval_strategy", "single_hop"),
+        needs_action=result.get("needs_action", False),
+    )
 
-def node_query_rewrite(state: RAGState) -> RAGState:
-    log_step(state, "✍️ Rewriting query (local FLAN-T5)...")
 
+def node_query_rewrite(state: RAGState) -> RAGState:
     rewritten = query_rewrite_agent(state["user_query"], state["intent"])
-    state["rewritten_query"] = rewritten
-    return state
+    return step_update("✍️ Rewriting query (local FLAN-T5)...", rewritten_query=rewritten)
 
 
-def node_retrieval(state: RAGState) -> RAGState:
-    log_step(state, "🔎 Retrieving relevant handbook sections (hybrid search)...")
+def node_dense_raw(state: RAGState) -> RAGState:
+    """
+    Dense search on the raw query, in parallel with the rewrite.
+    Scores are kept in metadata["dense_score"] for fusion in node_retrieval.
+    """
+    hits = dense_search(
+        state["user_query"], k=10, query_embedding=state.get("query_embedding"), handbook=state.get("handbook")
+    )
+    docs = []
+    for d, score in hits:
+        d.metadata["dense_score"] = score
+        docs.append(d)
+    return step_update("⚡ Dense search on the original query...", raw_dense_docs=docs)
+
 
+def node_retrieval(state: RAGState) -> RAGState:
     query = state["rewritten_query"]
-    docs = hybrid_retrieval_agent(query, k_dense=10, k_bm25=10)
-    state["retrieved_docs"] = docs
-    return state
+
+    # raw-query hits only add something when the rewrite changed the query
+    query_embedding = None
+    extra_hits = None
+    if query == state["user_query"]:
+        query_embedding = state.get("query_embedding")
+    else:
+        extra_hits = [(d, d.metadata.get("dense_score", 0.0)) for d in state.get("raw_dense_docs") or []]
+
+    docs = hybrid_retrieval_agent(
+        query,
+        k_dense=10,
+        k_bm25=10,
+        query_embedding=query_embedding,
+        extra_dense_hits=extra_hits,
+        handbook=state.get("handbook")
+    )
+    return step_update("🔎 Retrieving relevant handbook sections (hybrid search)...", retrieved_docs=docs)
 
 
 def node_multihop(state: RAGState) -> RAGState:
     if state.get("retrieval_strategy") == "multi_hop":
-        log_step(state, "🧩 Multi-hop retrieval enabled...")
-        docs = multihop_agent(state["rewritten_query"], state["retrieved_docs"])
-        state["retrieved_docs"] = docs
-    return state
+        docs = multihop_agent(state["rewritten_query"], state["retrieved_docs"], handbook=state.get("handbook"))
+        return step_update("🧩 Multi-hop retrieval enabled...", retrieved_docs=docs)
+    return {}
 
 
 def node_rerank(state: RAGState) -> RAGState:
-    log_step(state, "📌 Reranking retrieved chunks (cross-encoder)...")
-
     docs = reranker_agent(state["rewritten_query"], state["retrieved_docs"], top_n=6)
-    state["reranked_docs"] = docs
-    return state
 
+    # candidates were already restricted to state["handbook"] during retrieval
+    primary, dist = pick_primary_handbook(docs)
+    return step_update(
+        "📌 Reranking retrieved chunks (cross-encoder)...",
+        reranked_docs=docs,
+        primary_handbook=state.get("handbook") or primary,
+        handbook_distribution=dist,
+    )
 
-def node_compress(state: RAGState) -> RAGState:
-    log_step(state, "🧽 Compressing context (local sentence selection)...")
 
-    compressed = compressor_agent(state["user_query"], state["reranked_docs"])
-    state["compressed_context"] = compressed
-    return state
+def node_compress(state: RAGState) -> RAGState:
+    compressed = compressor_agent(
+        state["user_query"],
+        state["reranked_docs"],
+        query_embedding=state.get("query_embedding")
+    )
+    return step_update("🧽 Compressing context (local sentence selection)...", compressed_context=compressed)
 
 
 def node_answer(state: RAGState) -> RAGState:
-    log_step(state, "🧠 Generating answer (Gemini)...")
-
-    history = load_memory()
-    state["chat_history"] = history
+    thread_id = _thread_id()
+    history = load_memory(thread_id)
 
     ans = answer_agent(
         state["user_query"],
@@ -94,32 +133,36 @@ def node_answer(state: RAGState) -> RAGState:
         state["reranked_docs"],
         chat_history=history
     )
-    state["answer"] = ans
 
     # store memory
-    append_turn(state["user_query"], ans)
+    append_turn(state["user_query"], ans, thread_id)
 
-    return state
+    return step_update("🧠 Generating answer (Gemini)...", answer=ans)
 
 
 def node_verify(state: RAGState) -> RAGState:
-    log_step(state, "✅ Verifying grounding (local verifier)...")
-
     verification = verifier_agent(
         state["user_query"],
         state["answer"],
         state["compressed_context"]
     )
-    state["verification"] = verification
-    return state
+    return step_update("✅ Verifying grounding (local verifier)...", verification=verification)
 
 
 def node_action(state: RAGState) -> RAGState:
-    log_step(state, "📝 Generating requested deliverable (Gemini Action Agent)...")
-
     output = action_agent(state["user_query"], state["compressed_context"])
-    state["action_output"] = output
-    return state
+    return step_update("📝 Generating requested deliverable (Gemini Action Agent)...", action_output=output)
+
+
+def _retry_context(state: RAGState) -> RAGState:
+    # CPU part of node_retry: boosted retrieval + rerank + compress
+    boosted_query = state["user_query"] + " handbook policy rules eligibility process exceptions"
+    docs = hybrid_retrieval_agent(boosted_query, k_dense=12, k_bm25=12, handbook=state.get("handbook"))
+
+    docs = reranker_agent(boosted_query, docs, top_n=6)
+    compressed = compressor_agent(state["user_query"], docs, query_embedding=state.get("query_embedding"))
+
+    return {"reranked_docs": docs, "compressed_context": compressed}
 
 
 def node_retry(state: RAGState) -> RAGState:
@@ -128,21 +171,88 @@ def node_retry(state: RAGState) -> RAGState:
     - Boost query
     - Re-run retrieval + rerank + compress + answer
     """
-    log_step(state, "🔁 Retrying with boosted retrieval query...")
+    update = _retry_context(state)
 
-    state["retry_count"] = state.get("retry_count", 0) + 1
+    thread_id = _thread_id()
+    history = _retry_history(state, thread_id)
+    ans = answer_agent(
+        state["user_query"],
+        update["compressed_context"],
+        update["reranked_docs"],
+        chat_history=history
+    )
 
-    boosted_query = state["user_query"] + " handbook policy rules eligibility process exceptions"
-    docs = hybrid_retrieval_agent(boosted_query, k_dense=12, k_bm25=12)
+    # the retried answer replaces the stored one
+    amend_last_turn(state["user_query"], ans, thread_id)
 
-    docs = reranker_agent(boosted_query, docs, top_n=6)
-    state["reranked_docs"] = docs
+    return step_update(
+        "🔁 Retrying with boosted retrieval query...",
+        retry_count=state.get("retry_count", 0) + 1,
+        answer=ans,
+        **update
+    )
+
+
+# -----------------------------
+# Async variants (ainvoke / astream)
+# CPU-bound steps and conversation memory I/O run on the bounded CPU pool,
+# Gemini calls use the async client.
+# -----------------------------
+async def anode_answer(state: RAGState) -> RAGState:
+    thread_id = _thread_id()
+    history = await run_cpu(load_memory, thread_id)
+
+    # tokens go to astream(stream_mode="custom") consumers; no-op otherwise
+    writer = get_stream_writer()
+    parts = []
+    async for token in answer_agent_astream(
+        state["user_query"],
+        state["compressed_context"],
+        state["reranked_docs"],
+        chat_history=history
+    ):
+        parts.append(token)
+        writer({"type": "token", "node": "answer", "text": token})
+
+    ans = "".join(parts).strip()
+
+    # store memory
+    await run_cpu(append_turn, state["user_query"], ans, thread_id)
 
-    compressed = compressor_agent(state["user_query"], docs)
-    state["compressed_context"] = compressed
+    return step_update("🧠 Generating answer (Gemini)...", answer=ans)
+
+
+async def anode_action(state: RAGState) -> RAGState:
+    writer = get_stream_writer()
+    parts = []
+    async for token in action_agent_astream(state["user_query"], state["compressed_context"]):
+        parts.append(token)
+        writer({"type": "token", "node": "action", "text": token})
+
+    return step_update(
+        "📝 Generating requested deliverable (Gemini Action Agent)...",
+        action_output="".join(parts).strip()
+    )
 
-    history = load_memory()
-    ans = answer_agent(state["user_query"], compressed, docs, chat_history=history)
-    state["answer"] = ans
 
-    return state
\ No newline at end of file
+async def anode_retry(state: RAGState) -> RAGState:
+    update = await run_cpu(_retry_context, state)
+
+    thread_id = _thread_id()
+    history = await run_cpu(_retry_history, state, thread_id)
+    ans = await answer_agent_async(
+        state["user_query"],
+        update["compressed_context"],
+        update["reranked_docs"],
+        chat_history=history
+    )
+
+    # the retried answer replaces the stored one
+    await run_cpu(amend_last_turn, state["user_query"], ans, thread_id)
+
+    return step_update(
+        "🔁 Retrying with boosted retrieval query...",
+        retry_count=state.get("retry_count", 0) + 1,
+        answer=ans,
+        **update
+    )
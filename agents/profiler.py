@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from agents.settings import get_setting
+
+
+# only frames from these top-level packages are attributed (not torch / asyncio internals)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PROJECT_DIRS = tuple(os.path.join(_PROJECT_ROOT, d) + os.sep for d in ("agents", "ingestion", "memory", "api"))
+
+_THIS_FILE = os.path.abspath(__file__)
+
+# one profiled request at a time (the sampler sees every thread in the process)
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.relpath(code.co_filename, _PROJECT_ROOT)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Opt-in wall-clock sampling profiler for a single request:
+    - a daemon thread snapshots every thread's stack every interval_s
+    - "self": innermost project frame of each sample (where time is spent)
+    - "cumulative": every project frame on the stack (what is on the path)
+    - "stacks": collapsed stacks ("a;b;c count"), usable with flamegraph.pl / speedscope
+
+    Samples cover the whole process, so concurrent requests show up too.
+    """
+
+    def __init__(self, interval_s: Optional[float] = None, top_n: int = 15):
+        self.interval_s = interval_s or get_setting("tracing", "profile_interval_s", 0.005)
+        self.top_n = top_n
+        self._self = Counter()
+        self._cumulative = Counter()
+        self._stacks = Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                filename = frame.f_code.co_filename
+                if filename.startswith(_PROJECT_DIRS) and filename != _THIS_FILE:
+                    stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if not stack:
+                continue
+            self._samples += 1
+            self._self[stack[0]] += 1
+            for label in set(stack):
+                self._cumulative[label] += 1
+            self._stacks[";".join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="rag-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        total = max(1, self._samples)
+
+        def _top(counter: Counter):
+            return [
+                {"function": label, "samples": n, "pct": round(100.0 * n / total, 1)}
+                for label, n in counter.most_common(self.top_n)
+            ]
+
+        return {
+            "duration_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "interval_ms": round(self.interval_s * 1000, 2),
+            "samples": self._samples,
+            "self": _top(self._self),
+            "cumulative": _top(self._cumulative),
+            "stacks": [f"{s} {n}" for s, n in self._stacks.most_common(50)],
+        }
+
+
+def try_start_profiler() -> Optional[SamplingProfiler]:
+    """
+    Starts a profiler unless another request is already being profiled.
+    Pair with stop_profiler().
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    return SamplingProfiler().start()
+
+
+def stop_profiler(profiler: Optional[SamplingProfiler]) -> Optional[Dict[str, Any]]:
+    if profiler is None:
+        return None
+    try:
+        return profiler.stop()
+    finally:
+        _profile_lock.release()
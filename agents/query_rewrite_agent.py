@@ -1,16 +1,74 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-import torch
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from agents.batcher import get_batcher
+from agents.inference_backend import load_seq2seq
+from agents.lru_cache import PersistentLRUCache
+from agents.model_registry import get_model, register_model
+from agents.settings import get_setting
+from agents.tracing import count_forward
 
 MODEL_NAME = "google/flan-t5-small"
 
-_tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-_model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME)
+# rewrites are deterministic -> cache them across requests and restarts
+REWRITE_CACHE_PATH = "data/cache/rewrite_cache.sqlite"
+
+# generation settings per mode
+GENERATION_MODES = {
+    "fast": {"num_beams": 1},
+    "quality": {"num_beams": 4},
+}
+
+
+def _warm_rewriter(tokenizer_model) -> None:
+    import torch
+
+    tokenizer, model = tokenizer_model
+    with torch.no_grad():
+        model.generate(**tokenizer(["warm up"], return_tensors="pt"), max_new_tokens=2)
+
+
+# (tokenizer, model), loaded on first use
+register_model("rewriter", lambda: load_seq2seq(MODEL_NAME), warm=_warm_rewriter)
+
+# opened on first use, so importing this module never touches data/cache
+_cache = None
+_cache_lock = threading.Lock()
+
+# per-call model latency (seconds), cache hits excluded; both guarded by _timings_lock
+_timings: deque = deque(maxlen=2000)
+_timings_lock = threading.Lock()
+_fallbacks = 0
 
-_model.eval()
 
+def get_rewrite_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PersistentLRUCache(
+                    REWRITE_CACHE_PATH,
+                    max_size=get_setting("rewrite", "cache_size", 50000),
+                    ttl_seconds=get_setting("rewrite", "cache_ttl_seconds", 7 * 24 * 3600),
+                )
+    return _cache
 
-def query_rewrite_agent(user_query: str, intent: str) -> str:
-    prompt = f"""
+
+def use_rewrite_cache(cache) -> None:
+    """
+    Swaps in another cache (benchmarks use an in-memory LRUCache so they
+    never read or write the persisted one).
+    """
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def _build_prompt(user_query: str, intent: str) -> str:
+    return f"""
 Rewrite this employee handbook query into a short retrieval query.
 
 Rules:
@@ -26,20 +84,144 @@ Query: {user_query}
 Rewritten query:
 """.strip()
 
-    inputs = _tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
+
+def _cache_key(user_query: str, intent: str, mode: str) -> str:
+    normalized = " ".join(user_query.lower().split())
+    return f"{mode}|{intent}|{normalized}"
+
+
+def _record(seconds: float) -> None:
+    with _timings_lock:
+        _timings.append(seconds)
+
+
+def _generate_batch(prompts: List[str], key) -> List[str]:
+    import torch
+
+    mode, max_time = key
+    tokenizer, model = get_model("rewriter")
+    inputs = tokenizer(prompts, return_tensors="pt", truncation=True, max_length=512, padding=True)
+
+    gen_kwargs = dict(GENERATION_MODES[mode])
+    if max_time:
+        gen_kwargs["max_time"] = max_time
 
     with torch.no_grad():
-        output = _model.generate(
+        output = model.generate(
             **inputs,
             max_new_tokens=40,
-            num_beams=4,
-            do_sample=False
+            do_sample=False,
+            **gen_kwargs
         )
 
-    rewritten = _tokenizer.decode(output[0], skip_special_tokens=True).strip()
+    return [tokenizer.decode(o, skip_special_tokens=True).strip() for o in output]
+
+
+def _generate(prompts: List[str], mode: str, max_time: Optional[float] = None) -> List[str]:
+    # concurrent single-query rewrites with the same settings share one generate() (see agents/batcher.py)
+    count_forward("rewrite", len(prompts), len(prompts))
+    batcher = get_batcher("generate", _generate_batch)
+    if batcher is not None:
+        return batcher.submit(prompts, key=(mode, max_time))
+    return _generate_batch(prompts, (mode, max_time))
+
+
+def query_rewrite_agent(
+    user_query: str,
+    intent: str,
+    mode: Optional[str] = None,
+    budget_s: Optional[float] = None
+) -> str:
+    """
+    Rewrites the query for retrieval.
+    - cached by normalized query + intent (+ mode), LRU + TTL, persisted
+    - mode: "fast" (greedy) or "quality" (beam search)
+    - budget_s: latency budget; past it the original query is used
+    """
+    global _fallbacks
+
+    mode = mode or get_setting("rewrite", "mode", "fast")
+    if budget_s is None:
+        budget_s = get_setting("rewrite", "budget_seconds", 1.5)
+
+    cache = get_rewrite_cache()
+    key = _cache_key(user_query, intent, mode)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    t0 = time.perf_counter()
+    rewritten = _generate([_build_prompt(user_query, intent)], mode, max_time=budget_s)[0]
+    elapsed = time.perf_counter() - t0
+    _record(elapsed)
+
+    # over budget -> generation was cut short, don't trust (or cache) it
+    if budget_s and elapsed >= budget_s:
+        with _timings_lock:
+            _fallbacks += 1
+        return user_query
 
     # fallback safety
     if len(rewritten) < 3:
         return user_query
 
-    return rewritten
\ No newline at end of file
+    cache.put(key, rewritten)
+    return rewritten
+
+
+def query_rewrite_agent_batch(
+    queries: List[str],
+    intents: List[str],
+    mode: Optional[str] = None,
+    batch_size: int = 32
+) -> List[str]:
+    """
+    Rewrites many queries (offline replay). Cached items are skipped,
+    the rest go through the model in padded batches. No latency budget.
+    """
+    mode = mode or get_setting("rewrite", "mode", "fast")
+    cache = get_rewrite_cache()
+    results: List[Optional[str]] = []
+    pending = []
+
+    for i, (q, intent) in enumerate(zip(queries, intents)):
+        cached = cache.get(_cache_key(q, intent, mode))
+        results.append(cached)
+        if cached is None:
+            pending.append(i)
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+
+        t0 = time.perf_counter()
+        outputs = _generate([_build_prompt(queries[i], intents[i]) for i in batch], mode)
+        # per-item share of the batch call
+        _record((time.perf_counter() - t0) / len(batch))
+
+        for i, rewritten in zip(batch, outputs):
+            if len(rewritten) < 3:
+                results[i] = queries[i]
+                continue
+            results[i] = rewritten
+            cache.put(_cache_key(queries[i], intents[i], mode), rewritten)
+
+    return results
+
+
+def rewrite_timing_stats() -> Dict[str, Any]:
+    """
+    Model latency percentiles (ms) over recent calls + cache counters.
+    """
+    with _timings_lock:
+        samples = np.array(_timings, dtype=np.float64) * 1000
+        fallbacks = _fallbacks
+
+    stats: Dict[str, Any] = {
+        "calls": int(len(samples)),
+        "budget_fallbacks": fallbacks,
+        "cache": get_rewrite_cache().stats(),
+    }
+    if len(samples):
+        stats["p50_ms"] = round(float(np.percentile(samples, 50)), 2)
+        stats["p99_ms"] = round(float(np.percentile(samples, 99)), 2)
+    return stats
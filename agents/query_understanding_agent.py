@@ -1,8 +1,15 @@
-from typing import Dict, Any
-from sentence_transformers import SentenceTransformer, util
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Any, List, Optional
 
-# Local CPU model
-_embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+import numpy as np
+
+from agents.embedding_service import EMBED_MODEL_NAME, encode_query, encode_texts
+
+# persisted label matrices (keyed by model name + label text hash)
+INTENT_CACHE_DIR = "data/cache"
 
 INTENTS = {
     "leave_policy": "questions about leave, holidays, sick leave, casual leave, earned leave",
@@ -27,16 +34,59 @@ ACTION_HINTS = [
 ]
 
 
-def _classify_intent(query: str) -> str:
-    labels = list(INTENTS.keys())
-    label_texts = [INTENTS[k] for k in labels]
+_LABELS = list(INTENTS.keys())
+_label_matrix: Optional[np.ndarray] = None
+_label_lock = threading.Lock()
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _label_cache_path() -> str:
+    label_texts = [INTENTS[k] for k in _LABELS]
+    digest = hashlib.sha1(
+        json.dumps([EMBED_MODEL_NAME, _LABELS, label_texts]).encode("utf-8")
+    ).hexdigest()[:16]
+    model_slug = EMBED_MODEL_NAME.replace("/", "__")
+    return os.path.join(INTENT_CACHE_DIR, f"intent_labels_{model_slug}_{digest}.npy")
+
+
+def _get_label_matrix() -> np.ndarray:
+    """
+    Normalized intent label embeddings [n_labels, dim].
+    Computed once per process (or loaded from disk if already persisted).
+    """
+    global _label_matrix
+
+    if _label_matrix is not None:
+        return _label_matrix
 
-    q_emb = _embedder.encode(query, convert_to_tensor=True)
-    l_emb = _embedder.encode(label_texts, convert_to_tensor=True)
+    with _label_lock:
+        if _label_matrix is None:
+            path = _label_cache_path()
+            if os.path.exists(path):
+                matrix = np.load(path)
+            else:
+                matrix = _normalize(encode_texts([INTENTS[k] for k in _LABELS]))
+                try:
+                    os.makedirs(INTENT_CACHE_DIR, exist_ok=True)
+                    np.save(path, matrix)
+                except OSError:
+                    pass  # read-only disk: keep it in memory only
+            _label_matrix = matrix
 
-    scores = util.cos_sim(q_emb, l_emb)[0].cpu().tolist()
-    best_idx = max(range(len(scores)), key=lambda i: scores[i])
-    return labels[best_idx]
+    return _label_matrix
+
+
+def _classify_intent(query: str, query_embedding: Optional[List[float]] = None) -> str:
+    q_emb = encode_query(query) if query_embedding is None else query_embedding
+
+    # cosine similarity = one matrix-vector product on normalized vectors
+    scores = _get_label_matrix() @ _normalize(q_emb)
+    return _LABELS[int(np.argmax(scores))]
 
 
 def _detect_multihop(query: str) -> str:
@@ -56,8 +106,7 @@ def _needs_action(query: str) -> bool:
     return any(h in q for h in ACTION_HINTS)
 
 
-def query_understanding_agent(user_query: str) -> Dict[str, Any]:
-    intent = _classify_intent(user_query)
+def _build_result(user_query: str, intent: str) -> Dict[str, Any]:
     retrieval_strategy = _detect_multihop(user_query)
     needs_action = _needs_action(user_query)
 
@@ -69,4 +118,33 @@ def query_understanding_agent(user_query: str) -> Dict[str, Any]:
         "entities": entities,
         "retrieval_strategy": retrieval_strategy,
         "needs_action": needs_action
-    }
\ No newline at end of file
+    }
+
+
+def query_understanding_agent(
+    user_query: str,
+    query_embedding: Optional[List[float]] = None
+) -> Dict[str, Any]:
+    intent = _classify_intent(user_query, query_embedding)
+    return _build_result(user_query, intent)
+
+
+def query_understanding_agent_batch(
+    queries: List[str],
+    batch_size: int = 256,
+    query_embeddings: Optional[np.ndarray] = None
+) -> List[Dict[str, Any]]:
+    """
+    Classifies many queries with batched encoder passes
+    (offline replay of traffic logs, bulk answering).
+    Pass query_embeddings when the vectors are already known.
+    """
+    if not queries:
+        return []
+
+    if query_embeddings is None:
+        query_embeddings = encode_texts(queries, batch_size=batch_size)
+    q_emb = _normalize(query_embeddings)
+    best = np.argmax(q_emb @ _get_label_matrix().T, axis=1)
+
+    return [_build_result(q, _LABELS[int(i)]) for q, i in zip(queries, best)]
@@ -1,24 +1,125 @@
-from typing import List
+import hashlib
+from typing import List, Optional
 from langchain_core.documents import Document
-from sentence_transformers import CrossEncoder
 
+from agents.batcher import get_batcher
+from agents.inference_backend import load_cross_encoder
+from agents.lru_cache import LRUCache
+from agents.model_registry import get_model, register_model
+from agents.settings import get_setting
+from agents.tracing import count_forward
 
-# lightweight reranker (works on CPU)
-reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
 
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 
-def reranker_agent(query: str, docs: List[Document], top_n: int = 6) -> List[Document]:
+# token budget per (query, chunk) pair; longer chunks are truncated by the tokenizer
+MAX_LENGTH = get_setting("rerank", "max_length", 256)
+
+
+def _load_reranker():
+    # CrossEncoder or its ONNX Runtime twin (inference.backend)
+    return load_cross_encoder(RERANK_MODEL_NAME, MAX_LENGTH)
+
+
+# lightweight reranker (works on CPU), loaded on first use
+register_model("reranker", _load_reranker, warm=lambda m: m.predict([("warm up", "warm up")], show_progress_bar=False))
+
+
+def get_reranker():
+    return get_model("reranker")
+
+
+def _predict_batch(pairs, _key=None):
+    # one forward pass over pairs merged from concurrent callers
+    return get_reranker().predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+
+# (query hash, chunk id) -> score, shared by retries and multi-hop passes
+_score_cache = LRUCache(max_size=get_setting("rerank", "cache_size", 20000))
+
+
+def _query_hash(query: str) -> str:
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+
+
+def _doc_key(d: Document) -> str:
+    doc_id = d.metadata.get("doc_id") or d.id
+    if doc_id:
+        return doc_id
+    return hashlib.sha1(d.page_content.encode("utf-8")).hexdigest()
+
+
+def _early_cut(docs: List[Document], max_candidates: int, min_fusion_ratio: float) -> List[Document]:
+    """
+    Drops candidates that clearly lose on first-stage (fused) score:
+    - below min_fusion_ratio * best fused score
+    - beyond max_candidates
+    Only applies when every doc carries metadata["fusion_score"].
+    """
+    if any("fusion_score" not in d.metadata for d in docs):
+        return docs[:max_candidates]
+
+    best = max(d.metadata["fusion_score"] for d in docs)
+    kept = [d for d in docs if d.metadata["fusion_score"] >= min_fusion_ratio * best]
+    kept.sort(key=lambda d: d.metadata["fusion_score"], reverse=True)
+    return kept[:max_candidates]
+
+
+def reranker_stats() -> dict:
+    return _score_cache.stats()
+
+
+def reranker_agent(
+    query: str,
+    docs: List[Document],
+    top_n: int = 6,
+    batch_size: Optional[int] = None,
+    max_candidates: Optional[int] = None,
+    min_fusion_ratio: Optional[float] = None,
+) -> List[Document]:
     """
     Reranks docs using cross-encoder and returns top_n.
+    - first-stage early cut (fused scores)
+    - cached pair scores are reused, only new pairs hit the model
+    - model runs in fixed-size batches
     """
 
     if not docs:
         return []
 
-    pairs = [(query, d.page_content) for d in docs]
-    scores = reranker.predict(pairs)
+    batch_size = batch_size or get_setting("rerank", "batch_size", 16)
+    max_candidates = max_candidates or get_setting("rerank", "max_candidates", 20)
+    if min_fusion_ratio is None:
+        min_fusion_ratio = get_setting("rerank", "min_fusion_ratio", 0.0)
+
+    docs = _early_cut(docs, max_candidates, min_fusion_ratio)
+
+    q_hash = _query_hash(query)
+    scores: List[Optional[float]] = []
+    missing = []
+
+    for i, d in enumerate(docs):
+        cached = _score_cache.get((q_hash, _doc_key(d)))
+        scores.append(cached)
+        if cached is None:
+            missing.append(i)
+
+    if missing:
+        # rough char cap so the tokenizer never sees a huge chunk
+        max_chars = MAX_LENGTH * 6
+        pairs = [(query, docs[i].page_content[:max_chars]) for i in missing]
+        count_forward("rerank", len(pairs), batch_size)
+        batcher = get_batcher("rerank", _predict_batch)
+        if batcher is not None:
+            new_scores = batcher.submit(pairs)
+        else:
+            new_scores = get_reranker().predict(pairs, batch_size=batch_size, show_progress_bar=False)
+
+        for i, sc in zip(missing, new_scores):
+            scores[i] = float(sc)
+            _score_cache.put((q_hash, _doc_key(docs[i])), float(sc))
 
     scored_docs = list(zip(docs, scores))
     scored_docs.sort(key=lambda x: x[1], reverse=True)
 
-    return [d for d, s in scored_docs[:top_n]]
\ No newline at end of file
+    return [d for d, s in scored_docs[:top_n]]
@@ -1,70 +1,267 @@
 import os
-from typing import List, Tuple
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from langchain_core.documents import Document
-from rank_bm25 import BM25Okapi
+
+from ingestion.bm25_index import BM25Index, BM25_DIR, load_bm25_index
+from ingestion.corpus_version import read_corpus_version
+from ingestion.dedup import load_aliases
+from ingestion.vector_index import VECTOR_DIR, load_vector_index
+from agents.fusion import fuse
+from agents.settings import get_setting
+from agents.embedding_service import SharedEmbeddings, encode_query
+from agents.executor import run_parallel
+from agents.dense_backend import ChromaBackend, LocalIndexBackend
+from agents.handbook_router import handbook_ranges
+from agents.model_registry import get_model, register_model
 
 
 CHROMA_DIR = "data/vectorstore"
 COLLECTION_NAME = "company_handbooks"
 
-# same embeddings used during ingestion
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+# same model used during ingestion, shared with the other agents
+embeddings = SharedEmbeddings()
+
+
+def _load_vectordb():
+    from langchain_community.vectorstores import Chroma
+    return Chroma(
+        persist_directory=CHROMA_DIR,
+        collection_name=COLLECTION_NAME,
+        embedding_function=embeddings
+    )
+
+
+# Chroma client, opened on first use
+register_model("chroma", _load_vectordb, warm=lambda db: db.get(limit=1, include=[]))
+
 
-vectordb = Chroma(
-    persist_directory=CHROMA_DIR,
-    collection_name=COLLECTION_NAME,
-    embedding_function=embeddings
-)
+def get_vectordb():
+    return get_model("chroma")
 
 
-def _tokenize(text: str) -> List[str]:
-    return text.lower().split()
+# prebuilt by ingestion/build_vectorstore.py, memory-mapped once per corpus version
+_bm25_index: Optional[BM25Index] = None
 
+# canonical chunk id -> other places the same text appears (ingestion dedup)
+_aliases: Dict[str, List[Dict[str, object]]] = {}
 
-def _build_bm25_index(all_docs: List[Document]) -> BM25Okapi:
-    tokenized_corpus = [_tokenize(d.page_content) for d in all_docs]
-    return BM25Okapi(tokenized_corpus)
+_dense_backends: Dict[str, object] = {}
+
+# corpus version the indexes above were loaded at
+_loaded_version: Optional[str] = None
+_load_lock = threading.Lock()
+
+
+def _refresh() -> None:
+    """
+    (Re)loads the derived indexes when ingestion has stamped a new corpus
+    version; requests in flight keep the objects they already hold.
+    """
+    global _bm25_index, _aliases, _loaded_version
+    version = read_corpus_version()
+    if version == _loaded_version:
+        return
+    with _load_lock:
+        if version == _loaded_version:
+            return
+        _bm25_index = load_bm25_index(BM25_DIR)
+        if _bm25_index is not None:
+            _bm25_index.version = version
+        _aliases = load_aliases()
+        _dense_backends.pop("local", None)
+        _loaded_version = version
 
 
-def hybrid_retrieval_agent(query: str, k_dense: int = 8, k_bm25: int = 8) -> List[Document]:
+def get_bm25_index() -> BM25Index:
     """
-    Returns merged docs from:
+    Returns the BM25 index of the current corpus version.
+    If ingestion has not written one yet (old vector store), it is built
+    once in memory from the Chroma collection instead of per query.
+    """
+    global _bm25_index
+
+    _refresh()
+    if _bm25_index is None:
+        print(f"⚠️ BM25 index not found at {BM25_DIR}, building it in memory (run ingestion to persist it).")
+        corpus = get_vectordb().get(include=["documents"])
+        index = BM25Index.from_texts(corpus["documents"], corpus["ids"])
+        index.version = _loaded_version
+        _bm25_index = index
+
+    return _bm25_index
+
+
+def get_dense_backend(name: Optional[str] = None):
+    """
+    Dense search backend: "chroma" (default) or "local" (quantized
+    in-process index). "local" falls back to Chroma until ingestion
+    has built the index.
+    """
+    _refresh()
+    name = name or get_setting("retrieval", "dense_backend", "chroma")
+    backend = _dense_backends.get(name)
+    if backend is not None:
+        return backend
+
+    if name == "local":
+        index = load_vector_index(VECTOR_DIR)
+        if index is None:
+            print(f"⚠️ Vector index not found at {VECTOR_DIR}, using Chroma (run ingestion to build it).")
+            return get_dense_backend("chroma")
+        backend = LocalIndexBackend(
+            index,
+            fetch_docs=get_documents_by_ids,
+            nprobe=get_setting("vector_index", "nprobe", 8),
+            exact=get_setting("vector_index", "exact", False),
+            version=_loaded_version,
+        )
+    elif name == "chroma":
+        backend = ChromaBackend(get_vectordb())
+    else:
+        raise ValueError(f"Unknown dense backend: {name} (chroma | local)")
+
+    _dense_backends[name] = backend
+    return backend
+
+
+def get_documents_by_ids(ids: List[str]) -> List[Document]:
+    """
+    Fetches chunks from Chroma, in the order of ids.
+    """
+    if not ids:
+        return []
+
+    res = get_vectordb().get(ids=ids, include=["documents", "metadatas"])
+    by_id = {
+        res["ids"][i]: Document(id=res["ids"][i], page_content=res["documents"][i], metadata=res["metadatas"][i])
+        for i in range(len(res["ids"]))
+    }
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def dense_search(
+    query: str,
+    k: int = 8,
+    query_embedding: Optional[List[float]] = None,
+    backend: Optional[str] = None,
+    handbook: Optional[str] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Dense hits as (doc, score), higher is better.
+    backend: "chroma" | "local", default retrieval.dense_backend.
+    handbook: search only that handbook's chunks.
+    """
+    if query_embedding is None:
+        query_embedding = encode_query(query)
+
+    return get_dense_backend(backend).search(query_embedding, k=k, handbook=handbook)
+
+
+def _dense_rows(hits, index: BM25Index, docs_by_id: Dict[int, Document], unknown: Dict[str, int]):
+    # chunk ids as BM25 rows; docs missing from the index get stable negative ids
+    ids = np.empty(len(hits), dtype=np.int64)
+    for i, (d, _) in enumerate(hits):
+        key = d.metadata.get("doc_id") or d.id or d.page_content
+        row = index.row_of(key)
+        if row < 0:
+            row = unknown.setdefault(key, -(len(unknown) + 1))
+        ids[i] = row
+        docs_by_id.setdefault(int(row), d)
+    scores = np.array([sc for _, sc in hits], dtype=np.float32)
+    return ids, scores
+
+
+def hybrid_retrieval_agent(
+    query: str,
+    k_dense: int = 8,
+    k_bm25: int = 8,
+    fusion_method: Optional[str] = None,
+    top_n: Optional[int] = None,
+    query_embedding: Optional[List[float]] = None,
+    extra_dense_hits: Optional[List[Tuple[Document, float]]] = None,
+    parallel: Optional[bool] = None,
+    backend: Optional[str] = None,
+    handbook: Optional[str] = None,
+) -> List[Document]:
+    """
+    Returns fused docs from:
     - dense similarity search
-    - BM25 keyword search
+    - BM25 keyword search (prebuilt inverted index)
+    - extra_dense_hits, if given (e.g. dense hits of the raw query)
+
+    Results are ranked by fused score (RRF or weighted normalized scores),
+    stored on each doc as metadata["fusion_score"] for the reranker.
+
+    Pass query_embedding when the query vector is already known.
+    Dense and BM25 search run concurrently unless parallel=False.
+    backend picks the dense search backend (see get_dense_backend).
+    handbook restricts both searches to one handbook partition (metadata
+    filter for dense search, row ranges of the BM25 index).
     """
+    index = get_bm25_index()
+    fusion_method = fusion_method or get_setting("retrieval", "fusion_method", "rrf")
+    top_n = top_n if top_n is not None else get_setting("retrieval", "fusion_top_n")
+    if parallel is None:
+        parallel = get_setting("runtime", "parallel_stages", True)
 
-    # Dense retrieval
-    dense_docs = vectordb.similarity_search(query, k=k_dense)
+    def _dense():
+        return dense_search(query, k=k_dense, query_embedding=query_embedding, backend=backend, handbook=handbook)
 
-    # BM25 retrieval (needs full corpus)
-    all_docs = vectordb.get()["documents"]
-    all_metas = vectordb.get()["metadatas"]
+    def _bm25():
+        ranges = handbook_ranges(index.doc_ids, index.row_of, handbook, f"bm25@{index.version}") if handbook else None
+        return index.search(query, k=k_bm25, ranges=ranges)
 
-    corpus_docs = [
-        Document(page_content=all_docs[i], metadata=all_metas[i])
-        for i in range(len(all_docs))
-    ]
+    if parallel:
+        dense_hits, bm25_hits = run_parallel(_dense, _bm25)
+    else:
+        dense_hits, bm25_hits = _dense(), _bm25()
 
-    bm25 = _build_bm25_index(corpus_docs)
+    docs_by_id: Dict[int, Document] = {}
+    unknown: Dict[str, int] = {}
 
-    tokenized_query = _tokenize(query)
-    scores = bm25.get_scores(tokenized_query)
+    dense_ids, dense_scores = _dense_rows(dense_hits, index, docs_by_id, unknown)
+    ranked_ids = [dense_ids]
+    ranked_scores = [dense_scores]
+    weights = [get_setting("retrieval", "dense_weight", 1.0)]
 
-    top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k_bm25]
-    bm25_docs = [corpus_docs[i] for i in top_indices]
+    # BM25 retrieval
+    bm25_ids = np.array([index.row_of(doc_id) for doc_id, _ in bm25_hits], dtype=np.int64)
+    bm25_scores = np.array([sc for _, sc in bm25_hits], dtype=np.float32)
+    ranked_ids.append(bm25_ids)
+    ranked_scores.append(bm25_scores)
+    weights.append(get_setting("retrieval", "bm25_weight", 1.0))
 
-    # Merge + deduplicate
-    seen = set()
-    merged = []
+    if extra_dense_hits:
+        extra_ids, extra_scores = _dense_rows(extra_dense_hits, index, docs_by_id, unknown)
+        ranked_ids.append(extra_ids)
+        ranked_scores.append(extra_scores)
+        weights.append(get_setting("retrieval", "raw_dense_weight", 0.5))
+
+    fused_ids, fused_scores = fuse(
+        ranked_ids,
+        ranked_scores,
+        method=fusion_method,
+        weights=weights,
+        rrf_k=get_setting("retrieval", "rrf_k", 60),
+        top_n=top_n,
+    )
 
-    for d in dense_docs + bm25_docs:
-        key = (d.metadata.get("handbook_name"), d.metadata.get("page"), d.metadata.get("chunk_id"))
-        if key not in seen:
-            seen.add(key)
-            merged.append(d)
+    # only fetch text for BM25 winners not already returned by dense search
+    missing = [index.doc_ids[i] for i in fused_ids.tolist() if i not in docs_by_id]
+    for d in get_documents_by_ids(missing):
+        docs_by_id[index.row_of(d.id)] = d
+
+    merged = []
+    for row, score in zip(fused_ids.tolist(), fused_scores.tolist()):
+        d = docs_by_id.get(row)
+        if d is None:
+            continue
+        d.metadata["fusion_score"] = score
+        aliases = _aliases.get(d.id)
+        if aliases:
+            d.metadata["aliases"] = aliases
+        merged.append(d)
 
-    return merged
\ No newline at end of file
+    return merged
@@ -0,0 +1,25 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict
+
+import yaml
+
+
+SETTINGS_PATH = os.getenv("RAG_SETTINGS_PATH", "configs/settings.yaml")
+
+
+@lru_cache(maxsize=1)
+def load_settings() -> Dict[str, Any]:
+    """
+    Loads configs/settings.yaml once per process.
+    Missing file -> empty settings (code defaults apply).
+    """
+    if not os.path.exists(SETTINGS_PATH):
+        return {}
+    with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def get_setting(section: str, key: str, default: Any = None) -> Any:
+    value = (load_settings().get(section) or {}).get(key)
+    return default if value is None else value
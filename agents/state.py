@@ -1,7 +1,38 @@
-from typing import List, Optional, TypedDict, Dict, Any
+from typing import Annotated, List, Optional, TypedDict, Dict, Any
 from langchain_core.documents import Document
 
 
+# Reducers for keys written by parallel branches.
+# Passing None resets the key (done at the start of every turn).
+def add_logs(left: Optional[List[str]], right: Optional[List[str]]) -> List[str]:
+    if right is None:
+        return []
+    return (left or []) + right
+
+
+def add_timings(left: Optional[Dict[str, Dict[str, Any]]], right: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    # per-node records; a node that runs twice (verify after retry) is summed
+    if right is None:
+        return {}
+    merged = dict(left or {})
+    for node, record in right.items():
+        prev = merged.get(node)
+        if prev is None:
+            merged[node] = record
+            continue
+        combined = dict(prev)
+        for k, v in record.items():
+            if isinstance(v, dict):
+                inner = dict(combined.get(k, {}))
+                for model, n in v.items():
+                    inner[model] = inner.get(model, 0) + n
+                combined[k] = inner
+            else:
+                combined[k] = round(combined.get(k, 0) + v, 2)
+        merged[node] = combined
+    return merged
+
+
 class RAGState(TypedDict, total=False):
     # user input
     user_query: str
@@ -12,14 +43,22 @@ class RAGState(TypedDict, total=False):
     retrieval_strategy: str
     needs_action: bool
 
+    # shared query vector (embedded once, reused downstream)
+    query_embedding: List[float]
+
     # rewritten query
     rewritten_query: str
 
     # retrieval pipeline
+    raw_dense_docs: List[Document]
     retrieved_docs: List[Document]
     reranked_docs: List[Document]
 
     # handbook filtering
+    # handbook asked for by the caller (reset every turn)
+    requested_handbook: Optional[str]
+    # handbook searched (request or router), None = every handbook
+    handbook: Optional[str]
     primary_handbook: str
     handbook_distribution: Dict[str, int]
 
@@ -38,4 +77,24 @@ class RAGState(TypedDict, total=False):
     action_output: Optional[str]
 
     # streaming logs
-    stream_log: List[str]
\ No newline at end of file
+    stream_log: Annotated[List[str], add_logs]
+
+    # per-node trace for the current turn (wall/cpu ms, forward passes,
+    # candidates in/out, Gemini tokens), see agents/tracing.py
+    timings: Annotated[Dict[str, Dict[str, Any]], add_timings]
+
+
+def initial_state(user_query: str, handbook: Optional[str] = None) -> RAGState:
+    """
+    Input of one graph run (one conversation turn).
+    """
+    return {
+        "user_query": user_query,
+        "retry_count": 0,
+        "max_retries": 1,
+        # reset the per-turn accumulators (None -> empty, see the reducers above)
+        "stream_log": None,
+        "timings": None,
+        # explicit handbook, or None (router / every handbook); never carried over from the last turn
+        "requested_handbook": handbook
+    }
@@ -11,4 +11,11 @@ def log_step(state: RAGState, message: str) -> RAGState:
 def streaming_node(message: str):
     def _node(state: RAGState) -> RAGState:
         return log_step(state, message)
-    return _node
\ No newline at end of file
+    return _node
+
+def step_update(message: str, **fields) -> dict:
+    """
+    Partial state update for a node: its log line plus the keys it writes.
+    (Parallel branches must not return the whole state.)
+    """
+    return {"stream_log": [message], **fields}
@@ -0,0 +1,282 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from agents.settings import get_setting
+
+
+# -----------------------------
+# Per-node trace (lives in a contextvar while the node runs,
+# so agents and pool threads started from the node report into it)
+# -----------------------------
+class NodeTrace:
+    def __init__(self, node: str):
+        self.node = node
+        self.cpu_s = 0.0
+        self.forward_passes: Dict[str, int] = {}
+        self.llm_input_tokens = 0
+        self.llm_output_tokens = 0
+        self._lock = threading.Lock()
+
+    def add_cpu(self, seconds: float) -> None:
+        with self._lock:
+            self.cpu_s += seconds
+
+    def add_forward(self, model: str, passes: int) -> None:
+        with self._lock:
+            self.forward_passes[model] = self.forward_passes.get(model, 0) + passes
+
+    def add_tokens(self, input_tokens: int, output_tokens: int) -> None:
+        with self._lock:
+            self.llm_input_tokens += input_tokens
+            self.llm_output_tokens += output_tokens
+
+
+_current: contextvars.ContextVar[Optional[NodeTrace]] = contextvars.ContextVar("rag_node_trace", default=None)
+
+
+def current_trace() -> Optional[NodeTrace]:
+    return _current.get()
+
+
+def count_forward(model: str, n_items: int, batch_size: int) -> None:
+    """
+    Records the forward passes of one batched model call (ceil(items / batch)).
+    No-op outside a traced node.
+    """
+    trace = _current.get()
+    if trace is not None and n_items > 0:
+        trace.add_forward(model, -(-n_items // max(1, batch_size)))
+
+
+def count_tokens(input_tokens: int, output_tokens: int) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_tokens(input_tokens, output_tokens)
+
+
+def add_cpu(seconds: float) -> None:
+    # CPU time spent for the current node on another thread
+    trace = _current.get()
+    if trace is not None:
+        trace.add_cpu(seconds)
+
+
+# -----------------------------
+# Prometheus-style metrics (text exposition format)
+# -----------------------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            counts, total = self._series.setdefault(label_value, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {total[0]:.6f}')
+                lines.append(f'{self.name}_count{{{self.label}="{value}"}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: Tuple[str, ...], value: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, v in sorted(self._values.items()):
+                labels = ",".join(f'{k}="{val}"' for k, val in zip(self.labels, values))
+                lines.append(f"{self.name}{{{labels}}} {v:g}")
+        return lines
+
+
+NODE_WALL = Histogram("rag_node_wall_seconds", "Wall-clock time per graph node.", "node")
+NODE_CPU = Histogram("rag_node_cpu_seconds", "Thread CPU time per graph node.", "node")
+REQUEST_WALL = Histogram("rag_request_seconds", "End-to-end request latency.", "endpoint")
+FORWARD_PASSES = Counter("rag_model_forward_passes_total", "Local model forward passes.", ("node", "model"))
+CANDIDATES = Counter("rag_node_candidates_total", "Candidate documents in / out of a node.", ("node", "direction"))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Gemini tokens used.", ("node", "direction"))
+
+_METRICS = (NODE_WALL, NODE_CPU, REQUEST_WALL, FORWARD_PASSES, CANDIDATES, LLM_TOKENS)
+
+
+def observe_request(endpoint: str, seconds: float) -> None:
+    REQUEST_WALL.observe(endpoint, seconds)
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# OpenTelemetry (optional)
+# -----------------------------
+_tracer = None
+
+
+def setup_opentelemetry() -> None:
+    """
+    Enables OpenTelemetry spans per node when tracing.opentelemetry is true.
+    Exports over OTLP/gRPC to tracing.otlp_endpoint, or to the console.
+    """
+    global _tracer
+
+    if not get_setting("tracing", "opentelemetry", False) or _tracer is not None:
+        return
+
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        print("⚠️ opentelemetry-sdk not installed, spans disabled.")
+        return
+
+    endpoint = get_setting("tracing", "otlp_endpoint")
+    if endpoint:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=endpoint, insecure=True)
+    else:
+        exporter = ConsoleSpanExporter()
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "handbook-rag"}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("handbook_rag")
+
+
+@contextmanager
+def _span(node: str) -> Iterator[Any]:
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(f"rag.{node}") as span:
+        yield span
+
+
+# -----------------------------
+# Node wrapper
+# -----------------------------
+def _count_docs(value: Any) -> Optional[int]:
+    return len(value) if isinstance(value, list) else None
+
+
+class traced_node:
+    """
+    Context manager around one node run:
+
+        with traced_node("rerank", state, candidates=("retrieved_docs", "reranked_docs")) as t:
+            update = fn(state)
+            t.finish(update)
+
+    - wall time, and CPU time of the calling thread when own_cpu=True
+      (async nodes run on the shared event loop, so only pool work counts)
+    - forward passes / Gemini tokens reported by agents via the contextvar
+    - candidate counts from the given (input key, output key)
+    finish() returns the update with state["timings"][node] set.
+    """
+
+    def __init__(self, node: str, state: Dict[str, Any], candidates: Tuple[Optional[str], Optional[str]] = (None, None), own_cpu: bool = True):
+        self.node = node
+        self.state = state
+        self.candidates = candidates
+        self.own_cpu = own_cpu
+        self.trace = NodeTrace(node)
+
+    def __enter__(self) -> "traced_node":
+        self._token = _current.set(self.trace)
+        self._span_cm = _span(self.node)
+        self._span = self._span_cm.__enter__()
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.thread_time()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._span_cm.__exit__(*exc)
+        _current.reset(self._token)
+
+    def finish(self, update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        update = dict(update or {})
+        wall_s = time.perf_counter() - self._t0
+        if self.own_cpu:
+            self.trace.add_cpu(time.thread_time() - self._cpu0)
+
+        key_in, key_out = self.candidates
+        n_in = _count_docs(self.state.get(key_in)) if key_in else None
+        n_out = _count_docs(update.get(key_out)) if key_out else None
+
+        t = self.trace
+        record: Dict[str, Any] = {
+            "wall_ms": round(wall_s * 1000, 2),
+            "cpu_ms": round(t.cpu_s * 1000, 2),
+        }
+        if t.forward_passes:
+            record["forward_passes"] = dict(t.forward_passes)
+        if n_in is not None:
+            record["candidates_in"] = n_in
+        if n_out is not None:
+            record["candidates_out"] = n_out
+        if t.llm_input_tokens or t.llm_output_tokens:
+            record["llm_input_tokens"] = t.llm_input_tokens
+            record["llm_output_tokens"] = t.llm_output_tokens
+
+        # Prometheus
+        NODE_WALL.observe(self.node, wall_s)
+        NODE_CPU.observe(self.node, t.cpu_s)
+        for model, passes in t.forward_passes.items():
+            FORWARD_PASSES.inc((self.node, model), passes)
+        if n_in is not None:
+            CANDIDATES.inc((self.node, "in"), n_in)
+        if n_out is not None:
+            CANDIDATES.inc((self.node, "out"), n_out)
+        if t.llm_input_tokens or t.llm_output_tokens:
+            LLM_TOKENS.inc((self.node, "input"), t.llm_input_tokens)
+            LLM_TOKENS.inc((self.node, "output"), t.llm_output_tokens)
+
+        # OpenTelemetry
+        if self._span is not None:
+            for k, v in record.items():
+                if k == "forward_passes":
+                    for model, passes in v.items():
+                        self._span.set_attribute(f"rag.forward_passes.{model}", passes)
+                else:
+                    self._span.set_attribute(f"rag.{k}", v)
+
+        update["timings"] = {self.node: record}
+        return update
@@ -1,7 +1,7 @@
 from typing import Dict, Any
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
 
-_embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+from agents.embedding_service import encode_texts
 
 
 def verifier_agent(user_query: str, answer: str, context: str) -> Dict[str, Any]:
@@ -25,10 +25,9 @@ def verifier_agent(user_query: str, answer: str, context: str) -> Dict[str, Any]
         issues.append("missing_sources_section")
 
     # embedding similarity
-    a_emb = _embedder.encode(answer, convert_to_tensor=True)
-    c_emb = _embedder.encode(context, convert_to_tensor=True)
+    a_emb, c_emb = encode_texts([answer, context])
 
-    sim = util.cos_sim(a_emb, c_emb)[0][0].item()
+    sim = float(a_emb @ c_emb / max(float(np.linalg.norm(a_emb) * np.linalg.norm(c_emb)), 1e-12))
 
     # scale to 0-100
     confidence = int(max(0, min(100, sim * 100)))
@@ -1,15 +1,73 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sse_starlette.sse import EventSourceResponse
-from typing import Dict, Any, List
+from typing import Dict, Any
 import asyncio
-import re
+import json
+import time
 
-from api.schemas import ChatRequest, ChatResponse
-from agents.langgraph_supervisor import build_graph
+from api.schemas import ChatRequest, ChatResponse, ChatBatchRequest
+from api.bulk import answer_many
+from api.responses import (
+    extract_sources_from_answer,
+    maybe_cache,
+    record_cached_turn,
+    response_fields,
+    thread_answer_cache,
+)
+from agents.langgraph_supervisor import build_graph, CHECKPOINT_PATH
+from agents.state import initial_state
+from agents.executor import run_cpu
+from agents.query_rewrite_agent import rewrite_timing_stats
+from agents.reranker_agent import reranker_stats
+from agents.answer_cache import get_answer_cache
+from agents.embedding_service import encode_query
+from agents.llm import get_gateway
+from agents.tracing import setup_opentelemetry, render_prometheus, observe_request
+from agents.profiler import try_start_profiler, stop_profiler
+from agents.handbook_router import list_handbooks
+from agents.model_registry import warm_up, is_ready, mark_ready, model_stats
+from agents.batcher import batcher_stats
+from agents.settings import get_setting
+from memory.checkpoints import open_async_sqlite_saver, aprune_checkpoints, checkpoint_durability
+
+
+GRAPH_APP = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build graph once (important), with an async checkpointer so
+    # ainvoke/astream never block the event loop on SQLite
+    global GRAPH_APP
+    setup_opentelemetry()
+    async with open_async_sqlite_saver(CHECKPOINT_PATH) as checkpointer:
+        GRAPH_APP = build_graph(checkpointer=checkpointer)
+        # models load in the background: the server accepts connections at
+        # once and /ready flips to true when warm-up is done
+        warm_task = None
+        if get_setting("models", "warm_up", True):
+            warm_task = asyncio.create_task(_warm_up())
+        else:
+            mark_ready()
+        yield
+        if warm_task is not None:
+            warm_task.cancel()
+
+
+async def _warm_up() -> None:
+    t0 = time.perf_counter()
+    try:
+        await run_cpu(warm_up)
+    except Exception as e:
+        print(f"❌ Model warm-up failed: {e}")
+        return
+    print(f"✅ Models warm in {time.perf_counter() - t0:.1f}s")
 
 
-app = FastAPI(title="Enterprise Handbook RAG API", version="1.0")
+app = FastAPI(title="Enterprise Handbook RAG API", version="1.0", lifespan=lifespan)
 
 # Allow UI / browser calls
 app.add_middleware(
@@ -20,103 +78,236 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Build graph once (important)
-GRAPH_APP = build_graph()
+@app.get("/")
+def root():
+    return {"status": "ok", "message": "Enterprise Handbook RAG API is running"}
+
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once every model is loaded and warmed, else 503.
+    """
+    body = {"ready": is_ready(), "models": model_stats()}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
 
+@app.get("/stats")
+def stats():
+    """
+    Local model costs, cache counters and LLM gateway metrics.
+    """
+    answer_cache = get_answer_cache()
+    return {
+        "rewrite": rewrite_timing_stats(),
+        "rerank_cache": reranker_stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else {"enabled": False},
+        "llm": get_gateway().metrics(),
+        "models": model_stats(),
+        "batching": batcher_stats(),
+    }
 
-def _extract_sources_from_answer(answer: str) -> List[Dict[str, Any]]:
+
+@app.get("/handbooks")
+def handbooks():
     """
-    Extracts sources from the answer text.
-    Your answer_agent prints citations like:
-    Sources:
-    [1] handbook (page x, chunk y)
-    ...
+    Handbooks that ChatRequest.handbook can select.
     """
-    sources = []
-    if "Sources:" not in answer:
-        return sources
+    return {"handbooks": list_handbooks()}
 
-    after = answer.split("Sources:", 1)[-1].strip()
-    lines = [l.strip() for l in after.splitlines() if l.strip()]
 
-    for line in lines:
-        # Example:
-        # [1] ABC Handbook (page 10, chunk 5)
-        m = re.match(r"^\[(\d+)\]\s+(.*)$", line)
-        if m:
-            sources.append({"id": int(m.group(1)), "text": m.group(2)})
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus text format: per-node wall/CPU histograms, forward passes,
+    candidate counts, Gemini tokens, request latency.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
-    return sources
 
+def _initial_state(req: ChatRequest) -> Dict[str, Any]:
+    return initial_state(req.query, req.handbook)
 
-@app.get("/")
-def root():
-    return {"status": "ok", "message": "Enterprise Handbook RAG API is running"}
 
+def _check_handbook(req: ChatRequest) -> None:
+    handbooks = list_handbooks()
+    if req.handbook and handbooks and req.handbook not in handbooks:
+        raise HTTPException(status_code=400, detail=f"Unknown handbook: {req.handbook}")
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    initial_state = {
-        "user_query": req.query,
-        "retry_count": 0,
-        "max_retries": 1
-    }
 
-    config = {
+def _config(req: ChatRequest) -> Dict[str, Any]:
+    return {
         "configurable": {
             "thread_id": req.thread_id,
         }
     }
 
-    result: Dict[str, Any] = GRAPH_APP.invoke(initial_state, config=config)
 
-    verification = result.get("verification", {})
-    answer = result.get("answer", "")
+def _start_profiler(req: ChatRequest):
+    return try_start_profiler() if req.profile else None
+
+
+def _profile_result(req: ChatRequest, profiler) -> Any:
+    if not req.profile:
+        return None
+    if profiler is None:
+        return {"skipped": "another request is being profiled"}
+    return stop_profiler(profiler)
 
-    sources = _extract_sources_from_answer(answer)
+
+def _sse(event: str, data: Dict[str, Any]) -> Dict[str, str]:
+    return {"event": event, "data": json.dumps(data, ensure_ascii=False)}
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    _check_handbook(req)
+    t0 = time.perf_counter()
+    answer_cache = await run_cpu(thread_answer_cache, get_answer_cache(), req.thread_id)
+    query_embedding = await run_cpu(encode_query, req.query)
+
+    if answer_cache is not None:
+        hit = answer_cache.lookup(query_embedding, scope=req.handbook)
+        if hit is not None:
+            await run_cpu(record_cached_turn, req.query, hit["response"], req.thread_id)
+            observe_request("chat_cached", time.perf_counter() - t0)
+            return ChatResponse(
+                **hit["response"],
+                cached=True,
+                stream_log=["⚡ Served from semantic answer cache"]
+            )
+
+    profiler = _start_profiler(req)
+    try:
+        result: Dict[str, Any] = await GRAPH_APP.ainvoke(
+            _initial_state(req), config=_config(req), durability=checkpoint_durability()
+        )
+    finally:
+        profile = _profile_result(req, profiler)
+    await aprune_checkpoints(GRAPH_APP.checkpointer, req.thread_id)
+
+    response = response_fields(result)
+    maybe_cache(answer_cache, query_embedding, response, scope=req.handbook)
+    observe_request("chat", time.perf_counter() - t0)
 
     return ChatResponse(
-        answer=answer,
-        confidence=int(verification.get("confidence", 0)),
-        is_grounded=bool(verification.get("is_grounded", False)),
-        issues=verification.get("issues", []),
-        action_output=result.get("action_output"),
-        intent=result.get("intent"),
-        rewritten_query=result.get("rewritten_query"),
+        **response,
         stream_log=result.get("stream_log", []),
-        sources=sources
+        timings=result.get("timings", {}),
+        profile=profile
     )
 
 
 @app.post("/chat/stream")
 async def chat_stream(req: ChatRequest):
     """
-    Streaming endpoint using SSE.
-    We stream the node updates from LangGraph.
+    Streaming endpoint using SSE. Typed JSON events:
+    - step:         {"node", "message", "timing"} when a pipeline node finishes
+    - token:        {"node", "text"} Gemini tokens (answer / action)
+    - sources:      {"sources": [...]} once the answer is complete
+    - verification: {"confidence", "is_grounded", "issues"}
+    - done:         full ChatResponse payload
     """
+    _check_handbook(req)
+    config = _config(req)
 
-    initial_state = {
-        "user_query": req.query,
-        "retry_count": 0,
-        "max_retries": 1
-    }
+    async def event_generator():
+        t0 = time.perf_counter()
+        answer_cache = await run_cpu(thread_answer_cache, get_answer_cache(), req.thread_id)
+        query_embedding = await run_cpu(encode_query, req.query)
 
-    config = {
-        "configurable": {
-            "thread_id": req.thread_id,
-        }
-    }
+        if answer_cache is not None:
+            hit = answer_cache.lookup(query_embedding, scope=req.handbook)
+            if hit is not None:
+                response = hit["response"]
+                await run_cpu(record_cached_turn, req.query, response, req.thread_id)
+                yield _sse("step", {"node": "cache", "message": "⚡ Served from semantic answer cache"})
+                yield _sse("token", {"node": "answer", "text": response["answer"]})
+                yield _sse("sources", {"sources": response["sources"]})
+                yield _sse("verification", {
+                    "confidence": response["confidence"],
+                    "is_grounded": response["is_grounded"],
+                    "issues": response["issues"],
+                })
+                yield _sse("done", {**response, "cached": True, "stream_log": []})
+                observe_request("stream_cached", time.perf_counter() - t0)
+                return
 
-    async def event_generator():
-        # LangGraph streaming yields events
-        for event in GRAPH_APP.stream(initial_state, config=config):
-            # event is usually dict: {"node_name": {...state...}}
-            yield {
-                "event": "message",
-                "data": str(event)
-            }
-            await asyncio.sleep(0.01)
-
-        yield {"event": "done", "data": "DONE"}
-
-    return EventSourceResponse(event_generator())
\ No newline at end of file
+        profiler = _start_profiler(req)
+
+        # "custom" carries tokens from the answer/action nodes, "updates" the finished nodes
+        try:
+            async for mode, chunk in GRAPH_APP.astream(
+                _initial_state(req),
+                config=config,
+                stream_mode=["updates", "custom"],
+                durability=checkpoint_durability(),
+            ):
+                if mode == "custom":
+                    if chunk.get("type") == "token":
+                        yield _sse("token", {"node": chunk.get("node"), "text": chunk.get("text", "")})
+                    continue
+
+                for node, update in chunk.items():
+                    update = update or {}
+                    logs = update.get("stream_log") or []
+                    yield _sse("step", {
+                        "node": node,
+                        "message": logs[-1] if logs else node,
+                        "timing": (update.get("timings") or {}).get(node),
+                    })
+
+                    if node in ("answer", "retry") and update.get("answer"):
+                        yield _sse("sources", {"sources": extract_sources_from_answer(update["answer"])})
+
+                    if node == "verify" and update.get("verification"):
+                        v = update["verification"]
+                        yield _sse("verification", {
+                            "confidence": int(v.get("confidence", 0)),
+                            "is_grounded": bool(v.get("is_grounded", False)),
+                            "issues": v.get("issues", []),
+                        })
+        finally:
+            profile = _profile_result(req, profiler)
+
+        result = (await GRAPH_APP.aget_state(config)).values
+        await aprune_checkpoints(GRAPH_APP.checkpointer, req.thread_id)
+        response = response_fields(result)
+        maybe_cache(answer_cache, query_embedding, response, scope=req.handbook)
+
+        yield _sse("done", {
+            **response,
+            "cached": False,
+            "stream_log": result.get("stream_log", []),
+            "timings": result.get("timings", {}),
+            "profile": profile,
+        })
+        observe_request("stream", time.perf_counter() - t0)
+
+    return EventSourceResponse(event_generator())
+
+
+@app.post("/chat/batch")
+async def chat_batch(req: ChatBatchRequest):
+    """
+    Many questions in one call, answered with batched stages (see api/bulk.py).
+    Streams JSONL: one line per item as it completes, with the ChatResponse
+    fields, "id", "cached", "timings" and "elapsed_ms" (or "error").
+    """
+    handbooks = list_handbooks()
+    for item in req.items:
+        if item.handbook and handbooks and item.handbook not in handbooks:
+            raise HTTPException(status_code=400, detail=f"Unknown handbook: {item.handbook}")
+
+    items = [
+        {"id": item.id or str(i), "query": item.query, "handbook": item.handbook, "thread_id": item.thread_id}
+        for i, item in enumerate(req.items)
+    ]
+
+    async def lines():
+        t0 = time.perf_counter()
+        async for result in answer_many(GRAPH_APP, items, concurrency=req.concurrency, use_cache=req.use_cache):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        observe_request("chat_batch", time.perf_counter() - t0)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
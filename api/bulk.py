@@ -0,0 +1,214 @@
+"""
+Bulk answering: many questions through the pipeline at once.
+
+Per window of questions, the cheap-to-batch stages run up front in large
+batches (query embeddings, intent classification, FLAN-T5 rewrites), so
+the graph runs of that window hit the embedding / rewrite caches.
+Graph runs then go `concurrency` at a time: their rerank, encode and
+generate calls meet in the batch schedulers (agents/batcher.py), and
+Gemini calls are bounded by the LLM gateway.
+
+Items without a thread_id are one-off: their conversation turns and
+checkpoints are dropped after the answer.
+
+CLI (one JSON object per line in and out, e.g. {"id": "faq-1", "query": "..."}):
+    python -m api.bulk --input questions.jsonl --output answers.jsonl
+    python -m api.bulk --input questions.jsonl --concurrency 32 --no-cache
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from agents.embedding_service import encode_query, encode_texts, prime_query_cache
+from agents.executor import run_cpu
+from agents.answer_cache import get_answer_cache
+from agents.query_rewrite_agent import query_rewrite_agent_batch
+from agents.query_understanding_agent import query_understanding_agent_batch
+from agents.settings import get_setting
+from agents.state import initial_state
+from api.responses import maybe_cache, record_cached_turn, response_fields, thread_answer_cache
+from memory.checkpoints import checkpoint_durability
+from memory.conversation_memory import clear_thread
+
+
+def _prepare(queries: List[str]) -> None:
+    # one batched pass per stage for the whole window; results land in the caches
+    vectors = encode_texts(queries, batch_size=256)
+    prime_query_cache(queries, vectors)
+    intents = [r["intent"] for r in query_understanding_agent_batch(queries, query_embeddings=vectors)]
+    query_rewrite_agent_batch(queries, intents)
+
+
+async def _answer_one(graph, item: Dict[str, Any], use_cache: bool) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    query = item["query"]
+    handbook = item.get("handbook")
+    out: Dict[str, Any] = {"id": item["id"], "query": query}
+
+    thread_id = item.get("thread_id")
+    answer_cache = await run_cpu(thread_answer_cache, get_answer_cache(), thread_id) if use_cache else None
+    if answer_cache is not None:
+        query_embedding = await run_cpu(encode_query, query)
+        hit = answer_cache.lookup(query_embedding, scope=handbook)
+        if hit is not None:
+            await run_cpu(record_cached_turn, query, hit["response"], thread_id)
+            out.update(hit["response"], cached=True, timings={})
+            out["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            return out
+
+    one_off = not thread_id
+    if one_off:
+        thread_id = f"bulk-{uuid.uuid4().hex}"
+
+    config = {"configurable": {"thread_id": thread_id}}
+    try:
+        result = await graph.ainvoke(initial_state(query, handbook), config=config, durability=checkpoint_durability())
+    finally:
+        if one_off:
+            await graph.checkpointer.adelete_thread(thread_id)
+            await run_cpu(clear_thread, thread_id)
+
+    response = response_fields(result)
+    if answer_cache is not None:
+        maybe_cache(answer_cache, query_embedding, response, scope=handbook)
+
+    out.update(response, cached=False, timings=result.get("timings", {}))
+    out["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return out
+
+
+async def answer_many(
+    graph,
+    items: Iterable[Dict[str, Any]],
+    concurrency: Optional[int] = None,
+    window: Optional[int] = None,
+    use_cache: bool = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields one result per item ({"id", "query", ChatResponse fields,
+    "cached", "timings", "elapsed_ms"} or {"id", "query", "error"}),
+    in completion order. Items need "id" and "query"; "handbook" and
+    "thread_id" are optional.
+    """
+    concurrency = concurrency or get_setting("bulk", "concurrency", 16)
+    window = window or get_setting("bulk", "window", 256)
+    sem = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    done = object()
+    # graph runs in flight, cancelled if the consumer goes away (e.g. client disconnect)
+    running: Set[asyncio.Task] = set()
+
+    def start(item: Dict[str, Any]) -> asyncio.Task:
+        task = asyncio.create_task(run_item(item))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        return task
+
+    async def run_item(item: Dict[str, Any]) -> None:
+        async with sem:
+            try:
+                out = await _answer_one(graph, item, use_cache)
+            except Exception as e:
+                out = {"id": item["id"], "query": item["query"], "error": f"{type(e).__name__}: {e}"}
+        await results.put(out)
+
+    async def produce() -> None:
+        try:
+            previous: List[asyncio.Task] = []
+            it = iter(items)
+            while True:
+                batch = [item for _, item in zip(range(window), it)]
+                if not batch:
+                    break
+                await run_cpu(_prepare, [item["query"] for item in batch])
+                current = [start(item) for item in batch]
+                # at most two windows in flight: the next one is prepared while this one runs
+                if previous:
+                    await asyncio.gather(*previous)
+                previous = current
+            await asyncio.gather(*previous)
+        finally:
+            await results.put(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            out = await results.get()
+            if out is done:
+                break
+            yield out
+        # re-raises a failure of the batched stages
+        await producer
+    finally:
+        producer.cancel()
+        for task in running:
+            task.cancel()
+        await asyncio.gather(producer, *running, return_exceptions=True)
+
+
+def read_items(lines: Iterable[str]) -> Iterable[Dict[str, Any]]:
+    """
+    JSONL questions: {"query" | "question": str, "id"?, "handbook"?, "thread_id"?};
+    a missing id is the line number.
+    """
+    for n, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        row = json.loads(line)
+        query = row.get("query") or row.get("question")
+        if not query:
+            print(f"⚠️ line {n}: no query, skipped", file=sys.stderr)
+            continue
+        yield {
+            "id": str(row.get("id", n)),
+            "query": query,
+            "handbook": row.get("handbook"),
+            "thread_id": row.get("thread_id"),
+        }
+
+
+async def _run_cli(args) -> None:
+    from langgraph.checkpoint.memory import InMemorySaver
+    from agents.langgraph_supervisor import build_graph
+
+    # nothing to resume offline: checkpoints stay in memory
+    graph = build_graph(checkpointer=InMemorySaver())
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    t0 = time.perf_counter()
+    n = errors = 0
+    try:
+        with open(args.input, "r", encoding="utf-8") as f:
+            async for result in answer_many(graph, read_items(f), args.concurrency, args.window, not args.no_cache):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                n += 1
+                errors += "error" in result
+                if n % 50 == 0:
+                    rate = n / (time.perf_counter() - t0) * 3600
+                    print(f"⏱️ {n} answered ({rate:.0f}/hour)", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {n} answered in {elapsed:.1f}s ({n / max(elapsed, 1e-9) * 3600:.0f}/hour), {errors} errors",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", required=True, help="JSONL questions")
+    parser.add_argument("--output", default=None, help="JSONL answers (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=None, help="graph runs at once (default: bulk.concurrency)")
+    parser.add_argument("--window", type=int, default=None, help="questions prepared per batch (default: bulk.window)")
+    parser.add_argument("--no-cache", action="store_true", help="skip the semantic answer cache")
+    asyncio.run(_run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from memory.conversation_memory import append_turn, load_memory
+
+
+def extract_sources_from_answer(answer: str) -> List[Dict[str, Any]]:
+    """
+    Extracts sources from the answer text.
+    Your answer_agent prints citations like:
+    Sources:
+    [1] handbook (page x, chunk y)
+    ...
+    """
+    sources = []
+    if "Sources:" not in answer:
+        return sources
+
+    after = answer.split("Sources:", 1)[-1].strip()
+    lines = [l.strip() for l in after.splitlines() if l.strip()]
+
+    for line in lines:
+        # Example:
+        # [1] ABC Handbook (page 10, chunk 5)
+        m = re.match(r"^\[(\d+)\]\s+(.*)$", line)
+        if m:
+            sources.append({"id": int(m.group(1)), "text": m.group(2)})
+
+    return sources
+
+
+def response_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    verification = result.get("verification", {})
+    answer = result.get("answer", "")
+
+    return dict(
+        answer=answer,
+        confidence=int(verification.get("confidence", 0)),
+        is_grounded=bool(verification.get("is_grounded", False)),
+        issues=verification.get("issues", []),
+        action_output=result.get("action_output"),
+        intent=result.get("intent"),
+        rewritten_query=result.get("rewritten_query"),
+        primary_handbook=result.get("primary_handbook"),
+        sources=extract_sources_from_answer(answer)
+    )
+
+
+def maybe_cache(answer_cache, query_embedding, response: Dict[str, Any], scope: Optional[str] = None) -> None:
+    # only plain, grounded answers are reusable (action deliverables are per-request)
+    if answer_cache is None:
+        return
+    if response["answer"] and response["is_grounded"] and not response["action_output"]:
+        answer_cache.store(query_embedding, {"response": response}, scope=scope)
+
+
+def thread_answer_cache(answer_cache, thread_id: Optional[str]):
+    """
+    The answer cache is shared by all threads, but an answer depends on
+    the thread's history: only a thread without history reads or fills it.
+    Reads the conversation store (blocking, call it through run_cpu).
+    """
+    if answer_cache is None or (thread_id and load_memory(thread_id)):
+        return None
+    return answer_cache
+
+
+def record_cached_turn(query: str, response: Dict[str, Any], thread_id: Optional[str]) -> None:
+    # a cache hit skips the graph, which would have stored the turn
+    if thread_id:
+        append_turn(query, response["answer"], thread_id)
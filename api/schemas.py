@@ -5,6 +5,27 @@ from pydantic import BaseModel, Field
 class ChatRequest(BaseModel):
     query: str = Field(..., min_length=1)
     thread_id: str = Field(default="default_thread")
+    # restrict retrieval to one handbook (file name, see GET /handbooks);
+    # default: the handbook router picks one, or every handbook is searched
+    handbook: Optional[str] = None
+    # opt-in sampling profiler for this request (returned as ChatResponse.profile)
+    profile: bool = False
+
+
+class ChatBatchItem(BaseModel):
+    # echoed in the result line (default: position in the batch)
+    id: Optional[str] = None
+    query: str = Field(..., min_length=1)
+    # default: a one-off thread, dropped after the answer
+    thread_id: Optional[str] = None
+    handbook: Optional[str] = None
+
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatBatchItem] = Field(..., min_length=1)
+    # graph runs at once (default: bulk.concurrency)
+    concurrency: Optional[int] = Field(default=None, ge=1)
+    use_cache: bool = True
 
 
 class ChatResponse(BaseModel):
@@ -17,6 +38,14 @@ class ChatResponse(BaseModel):
 
     intent: Optional[str] = None
     rewritten_query: Optional[str] = None
+    primary_handbook: Optional[str] = None
+
+    # served from the semantic answer cache
+    cached: bool = False
 
     stream_log: List[str] = []
+    # per-node trace: wall_ms, cpu_ms, forward_passes, candidates_in/out,
+    # llm_input/output_tokens (parallel nodes overlap in wall time)
+    timings: Dict[str, Dict[str, Any]] = {}
+    profile: Optional[Dict[str, Any]] = None
     sources: List[Dict[str, Any]] = []
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Micro-batching benchmark: N concurrent callers each encoding one query,
+reranking its candidates or rewriting one query, with every call running
+on its own vs merged by the batch scheduler (agents/batcher.py).
+
+Reports calls/s and per-call latency p50 / p99 for each concurrency.
+
+Usage:
+    python -m evaluation.bench_batching
+    python -m evaluation.bench_batching --concurrency 1 8 20 32 --models encode rerank generate
+"""
+import argparse
+import statistics
+import threading
+import time
+from typing import Callable, List
+
+from agents.batcher import _DEFAULTS, MicroBatcher
+from agents.embedding_service import _encode_batch, get_embedder
+from agents.query_rewrite_agent import _build_prompt, _generate_batch
+from agents.reranker_agent import _predict_batch, get_reranker
+from agents.settings import get_setting
+
+
+QUERIES = [
+    "What is the notice period for resignation?",
+    "How many sick leaves are allowed per year?",
+    "Explain the probation period policy",
+    "Can I work from home two days a week?",
+    "How are travel expenses reimbursed?",
+    "What is the process to raise a grievance?",
+]
+
+# what each scheduler runs on a merged batch
+BATCH_FNS = {"encode": _encode_batch, "rerank": _predict_batch, "generate": _generate_batch}
+
+PASSAGE = (
+    "Employees must serve a notice period of 60 days after submitting their resignation. "
+    "The notice period may be bought out by paying basic salary for the unserved days, "
+    "subject to approval by the reporting manager and HR."
+)
+
+
+def _call_factory(model: str, batcher: MicroBatcher = None) -> Callable[[int], object]:
+    key = None
+    if model == "encode":
+        items = lambda i: [QUERIES[i % len(QUERIES)]]
+    elif model == "rerank":
+        items = lambda i: [(QUERIES[i % len(QUERIES)], f"{PASSAGE} ({j})") for j in range(12)]
+    else:
+        items = lambda i: [_build_prompt(QUERIES[i % len(QUERIES)], "general_policy")]
+        key = ("fast", None)
+
+    if batcher is None:
+        return lambda i: BATCH_FNS[model](items(i), key)
+    return lambda i: batcher.submit(items(i), key=key)
+
+
+def run(call: Callable[[int], object], concurrency: int, calls_per_worker: int):
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker(w: int):
+        local = []
+        for j in range(calls_per_worker):
+            t0 = time.perf_counter()
+            call(w * calls_per_worker + j)
+            local.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    return len(latencies) / elapsed, statistics.median(latencies), p99
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 20, 32])
+    parser.add_argument("--calls", type=int, default=10, help="calls per concurrent worker")
+    parser.add_argument("--models", nargs="+", default=["encode", "rerank"], choices=list(_DEFAULTS))
+    args = parser.parse_args()
+
+    # load + warm outside the timings
+    get_embedder().encode(["warm up"])
+    get_reranker().predict([("warm up", "warm up")], show_progress_bar=False)
+
+    for model in args.models:
+        cfg = {**_DEFAULTS[model], **(get_setting("batching", model, None) or {})}
+        print(f"\n🧪 {model} (max_batch {cfg['max_batch']}, max_wait_ms {cfg['max_wait_ms']})")
+        print(f"{'concurrency':>12}{'mode':>10}{'calls/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for n in args.concurrency:
+            for mode in ("direct", "batched"):
+                batcher = None
+                if mode == "batched":
+                    batcher = MicroBatcher(model, BATCH_FNS[model], max_batch=cfg["max_batch"],
+                                           max_wait_ms=cfg["max_wait_ms"])
+                rate, p50, p99 = run(_call_factory(model, batcher), n, args.calls)
+                print(f"{n:>12}{mode:>10}{rate:>10.1f}{p50:>10.1f}{p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+BM25 latency benchmark: per-query corpus rebuild (old hybrid_retrieval_agent path)
+vs the prebuilt, memory-mapped inverted index.
+
+Usage:
+    python -m evaluation.bench_bm25
+    python -m evaluation.bench_bm25 --sizes 1000 10000 100000 --queries 50
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from typing import List
+
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+
+from ingestion.bm25_index import BM25Index, tokenize
+
+
+QUERIES = [
+    "notice period resignation buyout",
+    "sick leave casual leave earned leave",
+    "probation period confirmation review",
+    "work from home remote hybrid policy",
+    "termination misconduct dismissal",
+    "travel reimbursement expenses claims",
+]
+
+
+def make_corpus(n_docs: int, seed: int = 7) -> List[str]:
+    """
+    Synthetic handbook-like chunks (~180 tokens, Zipf-ish vocabulary).
+    """
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(20000)]
+    for q in QUERIES:
+        vocab.extend(tokenize(q))
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+
+    return [" ".join(rng.choices(vocab, weights=weights, k=180)) for _ in range(n_docs)]
+
+
+def legacy_query(texts: List[str], metas: List[dict], query: str, k: int = 10) -> List[Document]:
+    # mirrors the old per-query path: rebuild Documents + BM25Okapi + full sort
+    corpus_docs = [Document(page_content=texts[i], metadata=metas[i]) for i in range(len(texts))]
+    bm25 = BM25Okapi([tokenize(d.page_content) for d in corpus_docs])
+    scores = bm25.get_scores(tokenize(query))
+    top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+    return [corpus_docs[i] for i in top_indices]
+
+
+def _ms(samples: List[float]) -> str:
+    return f"p50={statistics.median(samples) * 1000:.2f}ms max={max(samples) * 1000:.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=50, help="queries per size (index path)")
+    parser.add_argument("--legacy-queries", type=int, default=3, help="queries per size (old path)")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        print("\n" + "=" * 80)
+        print(f"📦 Corpus size: {n} chunks")
+        print("=" * 80)
+
+        texts = make_corpus(n)
+        doc_ids = [f"doc-{i}" for i in range(n)]
+        metas = [{"doc_id": d} for d in doc_ids]
+
+        t0 = time.perf_counter()
+        index = BM25Index.from_texts(texts, doc_ids)
+        print(f"🔤 Index build (one-off, ingestion): {time.perf_counter() - t0:.2f}s")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index.save(tmp)
+            index = BM25Index.load(tmp)
+
+            new_samples = []
+            for i in range(args.queries):
+                q = QUERIES[i % len(QUERIES)]
+                t0 = time.perf_counter()
+                index.search(q, k=10)
+                new_samples.append(time.perf_counter() - t0)
+
+        old_samples = []
+        for i in range(args.legacy_queries):
+            q = QUERIES[i % len(QUERIES)]
+            t0 = time.perf_counter()
+            legacy_query(texts, metas, q, k=10)
+            old_samples.append(time.perf_counter() - t0)
+
+        print(f"🐢 Per-query rebuild : {_ms(old_samples)}")
+        print(f"⚡ Prebuilt index    : {_ms(new_samples)}")
+        print(f"🚀 Speedup (p50)     : {statistics.median(old_samples) / statistics.median(new_samples):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Single-request latency of the LangGraph pipeline: linear vs parallel stages.
+Runs every query through both graphs and prints wall time plus the
+per-node breakdown (parallel nodes overlap, so their sum exceeds the wall time).
+
+Usage:
+    LLM_BACKEND=stub python -m evaluation.bench_graph
+    python -m evaluation.bench_graph --runs 5
+"""
+import argparse
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agents import query_rewrite_agent, reranker_agent
+from agents.langgraph_supervisor import build_graph
+from agents.lru_cache import LRUCache
+
+
+QUERIES = [
+    "Explain probation period policy",
+    "What is the notice period and what happens if I don't serve it fully?",
+    "How many sick leaves are allowed?",
+    "Is work from home allowed?",
+]
+
+
+def _cold_caches() -> None:
+    # every request pays for the FLAN-T5 rewrite and the cross-encoder,
+    # otherwise whichever graph runs second gets cache hits
+    query_rewrite_agent.get_rewrite_cache().clear()
+    reranker_agent._score_cache.clear()
+
+
+def run(app, runs: int):
+    walls = []
+    per_node = defaultdict(list)
+
+    for _ in range(runs):
+        for q in QUERIES:
+            state = {
+                "user_query": q,
+                "retry_count": 0,
+                "max_retries": 0,
+                "stream_log": None,
+                "timings": None
+            }
+            config = {"configurable": {"thread_id": f"bench-{uuid.uuid4().hex[:8]}"}}
+
+            _cold_caches()
+            t0 = time.perf_counter()
+            result = app.invoke(state, config=config)
+            walls.append((time.perf_counter() - t0) * 1000)
+
+            for node, record in result.get("timings", {}).items():
+                per_node[node].append(record["wall_ms"])
+
+    return walls, per_node
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # in-memory rewrite cache so the benchmark never wipes data/cache
+    query_rewrite_agent.use_rewrite_cache(LRUCache(max_size=1000))
+
+    # warm-up: model loads, caches of the first call
+    build_graph(checkpointer=InMemorySaver(), parallel=True).invoke(
+        {"user_query": QUERIES[0], "retry_count": 0, "max_retries": 0},
+        config={"configurable": {"thread_id": "bench-warmup"}}
+    )
+
+    results = {}
+    for label, parallel in (("linear", False), ("parallel", True)):
+        app = build_graph(checkpointer=InMemorySaver(), parallel=parallel)
+        results[label] = run(app, args.runs)
+
+    nodes = sorted({n for _, per_node in results.values() for n in per_node})
+
+    print(f"\n{'node (mean ms)':<18}{'linear':>12}{'parallel':>12}")
+    for node in nodes:
+        row = [f"{node:<18}"]
+        for label in ("linear", "parallel"):
+            samples = results[label][1].get(node)
+            row.append(f"{statistics.mean(samples):>12.1f}" if samples else f"{'-':>12}")
+        print("".join(row))
+
+    print(f"\n{'wall (ms)':<18}{'linear':>12}{'parallel':>12}")
+    for name, fn in (("mean", statistics.mean), ("p50", statistics.median), ("max", max)):
+        print(f"{name:<18}{fn(results['linear'][0]):>12.1f}{fn(results['parallel'][0]):>12.1f}")
+
+    before, after = statistics.mean(results["linear"][0]), statistics.mean(results["parallel"][0])
+    print(f"\nmean wall-clock change: {(after - before) / before * 100:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
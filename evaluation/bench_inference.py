@@ -0,0 +1,249 @@
+"""
+Local model backends: ONNX Runtime (float32 / dynamic int8) against the
+PyTorch path.
+
+Parity (PyTorch = reference):
+- bi-encoder: cosine of each embedding to the reference, overlap@k of
+  query -> chunk rankings
+- cross-encoder: max score delta, Spearman rank correlation and top-k
+  overlap of reranked candidates per query
+Throughput: texts/s (encode, batch 64), pairs/s (rerank, batch 16), and
+single-query encode latency; FLAN-T5 float32 vs dynamic int8 with --rewrite.
+
+Texts: chunks from Chroma (first --n-docs), or built-in samples.
+
+Usage:
+    python -m evaluation.bench_inference
+    python -m evaluation.bench_inference --threads 1 2 4 --rewrite
+    python -m evaluation.bench_inference --min-cosine 0.98 --min-spearman 0.9   # exit 1 below
+"""
+import argparse
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from agents.embedding_service import EMBED_MODEL_NAME
+from agents.inference_backend import (
+    cpu_quota,
+    intra_op_threads,
+    load_cross_encoder,
+    load_sentence_encoder,
+    load_seq2seq,
+)
+from agents.query_rewrite_agent import MODEL_NAME as REWRITE_MODEL_NAME
+from agents.reranker_agent import MAX_LENGTH, RERANK_MODEL_NAME
+
+
+CHROMA_DIR = "data/vectorstore"
+COLLECTION_NAME = "company_handbooks"
+
+QUERIES = [
+    "What is the notice period for resignation?",
+    "How many sick leaves are allowed per year?",
+    "Explain the probation period policy",
+    "Can I work from home two days a week?",
+    "How are travel expenses reimbursed?",
+    "What happens if I do not serve the full notice period?",
+    "What is the process to raise a grievance?",
+    "Which behaviour counts as misconduct?",
+]
+
+SAMPLE_DOCS = [
+    "Employees must serve a notice period of 60 days after submitting their resignation.",
+    "The notice period may be bought out by paying basic salary for the unserved days.",
+    "Employees are entitled to 12 days of sick leave per calendar year.",
+    "Casual leave cannot be carried forward to the next year.",
+    "New joiners are on probation for six months, after which performance is reviewed.",
+    "Confirmation after probation is communicated in writing by HR.",
+    "Work from home may be approved by the reporting manager for up to two days a week.",
+    "Travel expenses are reimbursed against original bills submitted within 30 days.",
+    "Grievances can be raised with HR or through the anonymous ethics hotline.",
+    "Harassment, fraud and repeated absence without leave are treated as misconduct.",
+    "Termination for misconduct follows a disciplinary inquiry.",
+    "Salary is credited on the last working day of each month.",
+]
+
+# name -> (backend, quantized)
+VARIANTS = {
+    "torch": ("torch", False),
+    "onnx": ("onnx", False),
+    "onnx-int8": ("onnx", True),
+}
+
+
+def load_docs(n: int) -> List[str]:
+    try:
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=CHROMA_DIR).get_collection(COLLECTION_NAME)
+        docs = collection.get(limit=n, include=["documents"])["documents"]
+    except Exception as e:
+        print(f"⚠️ Chroma corpus unavailable ({e}), using built-in samples")
+        docs = []
+    return docs or SAMPLE_DOCS
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def _overlap(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    return len(set(a[:k].tolist()) & set(b[:k].tolist())) / k
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> float:
+    if len(a) < 2:
+        return 1.0
+    ra = np.argsort(np.argsort(a)).astype(np.float64)
+    rb = np.argsort(np.argsort(b)).astype(np.float64)
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def _rate(fn, n_items: int, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return n_items / best
+
+
+def _p50_ms(fn, n: int = 50) -> float:
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def encoder_parity(ref, model, docs: List[str], k: int) -> Dict[str, float]:
+    texts = docs + QUERIES
+    a = _normalize(np.asarray(ref.encode(texts, batch_size=64), dtype=np.float32))
+    b = _normalize(np.asarray(model.encode(texts, batch_size=64), dtype=np.float32))
+    cos = (a * b).sum(axis=1)
+
+    d_ref, q_ref = a[:len(docs)], a[len(docs):]
+    d_new, q_new = b[:len(docs)], b[len(docs):]
+    k = min(k, len(docs))
+    overlaps = [
+        _overlap(np.argsort(-(d_ref @ qr)), np.argsort(-(d_new @ qn)), k)
+        for qr, qn in zip(q_ref, q_new)
+    ]
+    return {"min_cos": float(cos.min()), "mean_cos": float(cos.mean()), "overlap": statistics.mean(overlaps)}
+
+
+def reranker_parity(ref, model, candidates: Dict[str, List[str]], k: int) -> Dict[str, float]:
+    deltas, rhos, overlaps = [], [], []
+    for query, cands in candidates.items():
+        pairs = [(query, c) for c in cands]
+        s_ref = np.asarray(ref.predict(pairs, batch_size=16, show_progress_bar=False), dtype=np.float32)
+        s_new = np.asarray(model.predict(pairs, batch_size=16, show_progress_bar=False), dtype=np.float32)
+        deltas.append(float(np.abs(s_ref - s_new).max()))
+        rhos.append(_spearman(s_ref, s_new))
+        overlaps.append(_overlap(np.argsort(-s_ref), np.argsort(-s_new), min(k, len(cands))))
+    return {"max_delta": max(deltas), "spearman": statistics.mean(rhos), "overlap": statistics.mean(overlaps)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-docs", type=int, default=256)
+    parser.add_argument("--k", type=int, default=6, help="top-k for ranking overlap (default: rerank top_n)")
+    parser.add_argument("--candidates", type=int, default=20, help="chunks reranked per query")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="intra-op threads to benchmark (default: inference.intra_op_threads)")
+    parser.add_argument("--rewrite", action="store_true", help="also time FLAN-T5 float32 vs dynamic int8")
+    parser.add_argument("--min-cosine", type=float, default=None, help="fail if an encoder variant is below this")
+    parser.add_argument("--min-spearman", type=float, default=None, help="fail if a reranker variant is below this")
+    args = parser.parse_args()
+
+    docs = load_docs(args.n_docs)
+    threads = args.threads or [intra_op_threads()]
+    print(f"📚 {len(docs)} chunks, {len(QUERIES)} queries | CPU quota {cpu_quota()}, threads {threads}")
+
+    # reference models (PyTorch), and the candidates each query reranks
+    ref_enc = load_sentence_encoder(EMBED_MODEL_NAME, backend="torch")
+    ref_ce = load_cross_encoder(RERANK_MODEL_NAME, MAX_LENGTH, backend="torch")
+    doc_vecs = _normalize(ref_enc.encode(docs, batch_size=64))
+    candidates = {
+        q: [docs[i] for i in np.argsort(-(doc_vecs @ _normalize(ref_enc.encode([q])[0])))[:args.candidates]]
+        for q in QUERIES
+    }
+    pairs = [(q, c) for q, cands in candidates.items() for c in cands]
+
+    failed = False
+    print(f"\n{'variant':<12}{'min cos':>9}{'mean cos':>10}{'enc@' + str(args.k):>8}"
+          f"{'max Δ':>9}{'spearman':>10}{'rr@' + str(args.k):>7}")
+    for name in args.variants:
+        backend, quantized = VARIANTS[name]
+        if name == "torch":
+            enc, ce = ref_enc, ref_ce
+        else:
+            enc = load_sentence_encoder(EMBED_MODEL_NAME, backend=backend, quantized=quantized)
+            ce = load_cross_encoder(RERANK_MODEL_NAME, MAX_LENGTH, backend=backend, quantized=quantized)
+
+        e = encoder_parity(ref_enc, enc, docs, args.k)
+        r = reranker_parity(ref_ce, ce, candidates, args.k)
+        print(f"{name:<12}{e['min_cos']:>9.4f}{e['mean_cos']:>10.4f}{e['overlap']:>8.2f}"
+              f"{r['max_delta']:>9.3f}{r['spearman']:>10.3f}{r['overlap']:>7.2f}")
+        if args.min_cosine is not None and e["min_cos"] < args.min_cosine:
+            print(f"   ❌ encoder min cosine {e['min_cos']:.4f} < {args.min_cosine}")
+            failed = True
+        if args.min_spearman is not None and r["spearman"] < args.min_spearman:
+            print(f"   ❌ reranker spearman {r['spearman']:.3f} < {args.min_spearman}")
+            failed = True
+
+    print(f"\n{'variant':<12}{'threads':>8}{'texts/s':>10}{'query ms':>10}{'pairs/s':>10}")
+    for n_threads in threads:
+        for name in args.variants:
+            backend, quantized = VARIANTS[name]
+            if backend == "torch":
+                import torch
+                torch.set_num_threads(n_threads)
+                enc, ce = ref_enc, ref_ce
+            else:
+                from agents.inference_backend import OnnxCrossEncoder, OnnxSentenceEncoder, ensure_onnx
+                enc = OnnxSentenceEncoder(ensure_onnx(EMBED_MODEL_NAME, "sentence_encoder", quantized), n_threads)
+                ce = OnnxCrossEncoder(
+                    ensure_onnx(RERANK_MODEL_NAME, "cross_encoder", quantized, max_length=MAX_LENGTH), n_threads
+                )
+
+            enc.encode(docs[:8])
+            texts_s = _rate(lambda: enc.encode(docs, batch_size=64), len(docs))
+            query_ms = _p50_ms(lambda: enc.encode([QUERIES[0]]))
+            pairs_s = _rate(lambda: ce.predict(pairs, batch_size=16, show_progress_bar=False), len(pairs))
+            print(f"{name:<12}{n_threads:>8}{texts_s:>10.0f}{query_ms:>10.2f}{pairs_s:>10.0f}")
+
+    if args.rewrite:
+        import torch
+
+        torch.set_num_threads(threads[0])
+        prompts = [f"Rewrite this employee handbook query into a short retrieval query.\nQuery: {q}" for q in QUERIES]
+        print(f"\n{'rewriter':<12}{'ms/query':>10}{'same text':>11}")
+        outputs = {}
+        for label, quantized in (("float32", False), ("int8", True)):
+            tokenizer, model = load_seq2seq(REWRITE_MODEL_NAME, quantized=quantized)
+
+            def _run():
+                with torch.no_grad():
+                    out = model.generate(**tokenizer(prompts, return_tensors="pt", padding=True),
+                                         max_new_tokens=40, do_sample=False)
+                return [tokenizer.decode(o, skip_special_tokens=True) for o in out]
+
+            outputs[label] = _run()
+            ms = 1000 / _rate(_run, len(prompts), repeats=2)
+            same = sum(a == b for a, b in zip(outputs["float32"], outputs[label])) / len(prompts)
+            print(f"{label:<12}{ms:>10.1f}{same:>11.2f}")
+
+    if failed:
+        sys.exit(1)
+    if args.min_cosine is not None or args.min_spearman is not None:
+        print("\n✅ ONNX parity within limits")
+
+
+if __name__ == "__main__":
+    main()
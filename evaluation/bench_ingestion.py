@@ -0,0 +1,85 @@
+"""
+Ingestion throughput on data/raw_handbooks: sequential parse/chunk vs the
+process-pool pipeline, plus the batched embedding stage.
+Reports pages/sec, chunks/sec and peak RSS. Nothing is written to Chroma.
+
+Usage:
+    python -m evaluation.bench_ingestion
+    python -m evaluation.bench_ingestion --workers 1 4 8 --no-embed
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+
+from ingestion.load_docs import list_handbook_pdfs
+from ingestion.pipeline import iter_chunked_pdfs, iter_embedded_batches
+
+
+RAW_FOLDER = "data/raw_handbooks"
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def bench_parse(pdf_files, workers: int):
+    pages = chunks = 0
+    t0 = time.perf_counter()
+    for _, n_pages, docs, _ in iter_chunked_pdfs(RAW_FOLDER, pdf_files, workers=workers):
+        pages += n_pages
+        chunks += len(docs)
+    return pages, chunks, time.perf_counter() - t0
+
+
+def bench_pipeline(pdf_files, workers: int, batch_size: int):
+    from agents.embedding_service import encode_texts
+
+    pages = 0
+    embedded = 0
+
+    def _stream():
+        nonlocal pages
+        for _, n_pages, docs, _ in iter_chunked_pdfs(RAW_FOLDER, pdf_files, workers=workers):
+            pages += n_pages
+            yield from docs
+
+    t0 = time.perf_counter()
+    for docs, vectors in iter_embedded_batches(
+        _stream(), encode_fn=lambda texts: encode_texts(texts, batch_size=256), batch_size=batch_size
+    ):
+        embedded += len(docs)
+    return pages, embedded, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=1, help="process the folder N times (bigger corpus)")
+    parser.add_argument("--no-embed", action="store_true", help="parse + chunk only")
+    args = parser.parse_args()
+
+    pdf_files = list_handbook_pdfs(RAW_FOLDER) * args.repeat
+    print(f"📚 {len(pdf_files)} PDFs from {RAW_FOLDER}")
+
+    print(f"\n{'stage':<22}{'workers':>8}{'pages':>8}{'chunks':>8}{'sec':>8}{'pages/s':>10}{'chunks/s':>10}")
+    for workers in args.workers:
+        pages, chunks, secs = bench_parse(pdf_files, workers)
+        print(f"{'parse + chunk':<22}{workers:>8}{pages:>8}{chunks:>8}{secs:>8.2f}"
+              f"{pages / secs:>10.1f}{chunks / secs:>10.1f}")
+
+    if not args.no_embed:
+        for workers in args.workers:
+            pages, chunks, secs = bench_pipeline(pdf_files, workers, args.batch_size)
+            print(f"{'parse + chunk + embed':<22}{workers:>8}{pages:>8}{chunks:>8}{secs:>8.2f}"
+                  f"{pages / secs:>10.1f}{chunks / secs:>10.1f}")
+
+    print(f"\npeak RSS (main process): {_peak_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Local vector index check: recall@k of the quantized / IVF index against
+exact float32 search, plus query latency (p50 / p99) and index size.
+
+Corpus: chunk embeddings from Chroma (default) or --synthetic N clustered
+vectors (to check a corpus of a few hundred thousand chunks).
+Queries: corpus vectors with noise, or --queries FILE (one per line,
+encoded with the shared embedding model).
+
+Usage:
+    python -m evaluation.bench_vector_index
+    python -m evaluation.bench_vector_index --synthetic 300000 --nprobe 4 8 16 32
+    python -m evaluation.bench_vector_index --min-recall 0.9   # exit 1 below it
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from ingestion.vector_index import VectorIndex, _normalize
+
+
+CHROMA_DIR = "data/vectorstore"
+COLLECTION_NAME = "company_handbooks"
+
+
+def synthetic_corpus(n: int, dim: int = 384, n_topics: int = 1000, seed: int = 7) -> np.ndarray:
+    """
+    Clustered unit vectors (topics + noise), closer to real embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 65536):
+        end = min(start + 65536, n)
+        out[start:end] = topics[rng.integers(0, n_topics, end - start)]
+        out[start:end] += 0.7 * rng.normal(size=(end - start, dim)).astype(np.float32)
+    return _normalize(out)
+
+
+def chroma_corpus():
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=CHROMA_DIR).get_collection(COLLECTION_NAME)
+    res = collection.get(include=["embeddings"])
+    return _normalize(np.asarray(res["embeddings"], dtype=np.float32)), res["ids"]
+
+
+def noisy_queries(corpus: np.ndarray, n: int, seed: int = 11) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.integers(0, len(corpus), n)]
+    # noise of norm ~0.5 around a corpus vector
+    noise = rng.normal(size=picks.shape).astype(np.float32) / np.sqrt(corpus.shape[1])
+    return _normalize(picks + 0.5 * noise)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    truth = []
+    for q in queries:
+        scores = corpus @ q
+        truth.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+    return truth
+
+
+def run(index: VectorIndex, queries: np.ndarray, truth: List[set], k: int, **kwargs):
+    recalls, latencies = [], []
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        hits = index.search(q, k=k, **kwargs)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        got = {index.row_of[doc_id] for doc_id, _ in hits}
+        recalls.append(len(got & expected) / k)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    return statistics.mean(recalls), statistics.median(latencies), p99
+
+
+def _configured_nprobe() -> int:
+    from agents.settings import get_setting
+    return get_setting("vector_index", "nprobe", 8)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", type=int, default=0, help="N synthetic vectors instead of the Chroma corpus")
+    parser.add_argument("--queries", default=None, help="text file, one query per line")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None, help="IVF lists (default: index default)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="fail if recall@k of the configured nprobe is below this")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus = synthetic_corpus(args.synthetic)
+        doc_ids = [str(i) for i in range(len(corpus))]
+    else:
+        corpus, doc_ids = chroma_corpus()
+    print(f"📚 {len(corpus)} vectors, dim {corpus.shape[1]} (float32: {corpus.nbytes / 1e6:.1f} MB)")
+
+    if args.queries:
+        from agents.embedding_service import encode_texts
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [l.strip() for l in f if l.strip()]
+        queries = _normalize(encode_texts(texts))
+    else:
+        queries = noisy_queries(corpus, args.n_queries)
+
+    k = min(args.k, len(corpus))
+    truth = exact_top_k(corpus, queries, k)
+
+    print(f"\n{'index':<28}{'MB':>8}{'recall@' + str(k):>11}{'p50 ms':>9}{'p99 ms':>9}")
+    recall_at_setting = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ["float16", "int8"]:
+            t0 = time.perf_counter()
+            index = VectorIndex.build(corpus, doc_ids, dtype=dtype, n_lists=args.n_lists)
+            build_s = time.perf_counter() - t0
+            # search the memory-mapped copy, like the API does
+            index.save(f"{tmp}/{dtype}")
+            index = VectorIndex.load(f"{tmp}/{dtype}")
+
+            recall, p50, p99 = run(index, queries, truth, k, exact=True)
+            print(f"{dtype + ' exact':<28}{index.nbytes / 1e6:>8.1f}{recall:>11.3f}{p50:>9.2f}{p99:>9.2f}")
+
+            if index.n_lists == 1:
+                print(f"   (1 IVF list below {len(corpus)} chunks: IVF = exact, built in {build_s:.1f}s)")
+                if dtype == "int8":
+                    recall_at_setting = recall
+                continue
+
+            for nprobe in sorted(set(args.nprobe) | {_configured_nprobe()}):
+                recall, p50, p99 = run(index, queries, truth, k, nprobe=nprobe)
+                label = f"{dtype} ivf{index.n_lists} nprobe={nprobe}"
+                print(f"{label:<28}{index.nbytes / 1e6:>8.1f}{recall:>11.3f}{p50:>9.2f}{p99:>9.2f}")
+                if dtype == "int8" and nprobe == _configured_nprobe():
+                    recall_at_setting = recall
+            print(f"   (built in {build_s:.1f}s)")
+
+    if args.min_recall is not None and recall_at_setting is not None:
+        ok = recall_at_setting >= args.min_recall
+        print(f"\n{'✅' if ok else '❌'} int8 recall@{k} at configured nprobe: "
+              f"{recall_at_setting:.3f} (min {args.min_recall})")
+        if not ok:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Labeled retrieval test set, built from the handbook PDFs.
+
+Each question comes from the most distinctive sentence of one sampled
+chunk (highest mean IDF over the corpus), in one of two forms:
+- "keyword": its rarest content words in a question template
+  (favours BM25, like a user who knows the handbook's wording)
+- "sentence": the sentence with part of its content words dropped
+  (a loose paraphrase, closer to what dense retrieval is good at)
+relevant_ids: every chunk containing that sentence, ids as in the index
+(handbook::p<page>::c<chunk>), near-duplicate aliases and their canonical
+chunk included.
+
+Parsing, chunking and dedup are the ingestion ones, so the ids match a
+fresh build; the same PDFs and seed give the same test set. --extra merges
+hand-labeled questions (JSONL: {"query", "relevant_ids", "id"?, "handbook"?}).
+
+Usage:
+    python -m evaluation.build_testset
+    python -m evaluation.build_testset --n 300 --seed 7 --extra manual.jsonl --out evaluation/testset.jsonl
+"""
+import argparse
+import json
+import math
+import random
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from agents.settings import get_setting
+from ingestion.build_vectorstore import RAW_FOLDER
+from ingestion.dedup import MAX_DISTANCE, MIN_JACCARD, ChunkDeduper
+from ingestion.load_docs import list_handbook_pdfs
+from ingestion.pipeline import process_pdf
+from ingestion.sentence_index import split_sentences
+
+
+DEFAULT_OUT = "evaluation/testset.jsonl"
+
+MIN_CHUNK_CHARS = 200
+MIN_CONTENT_WORDS = 6
+MAX_SENTENCE_WORDS = 60
+# a sentence repeated in more chunks than this is boilerplate (headers, footers)
+MAX_SENTENCE_CHUNKS = 3
+KEYWORDS = 4
+DROP_RATIO = 0.4
+MAX_QUERY_WORDS = 25
+
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been before being below between both but by can
+could did do does doing during each either etc for from further had has have having he her here his
+how i if in into is it its may might more most must no nor not of off on once only or other our out
+over own per same shall she should so some such than that the their them then there these they this
+those through to too under until up upon very was we were what when where which while who whom why
+will with within without would you your
+""".split())
+
+TEMPLATES = [
+    "What does the handbook say about {}?",
+    "What is the policy on {}?",
+    "Explain the rules for {}.",
+    "How does the company handle {}?",
+]
+
+_WORD = re.compile(r"[a-z][a-z'\-]*[a-z]")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _content(words: List[str]) -> List[str]:
+    return [w for w in words if w not in STOPWORDS and len(w) > 2]
+
+
+def load_chunks(folder: str) -> Tuple[List[dict], Dict[str, str]]:
+    """
+    Every chunk of every handbook as {"id", "handbook", "page", "text"},
+    plus alias id -> canonical id for the near-duplicates dedup drops.
+    """
+    deduper = ChunkDeduper(
+        near=get_setting("ingestion", "near_dedup", False),
+        max_distance=get_setting("ingestion", "simhash_max_distance", MAX_DISTANCE),
+        min_jaccard=get_setting("ingestion", "near_dedup_min_jaccard", MIN_JACCARD),
+    )
+    chunks: List[dict] = []
+    alias_of: Dict[str, str] = {}
+    for pdf_file in list_handbook_pdfs(folder):
+        name, pages, docs, sigs = process_pdf(folder, pdf_file)
+        for d, sig in zip(docs, sigs):
+            doc_id = d.metadata["doc_id"]
+            canonical = deduper.match(sig, d.page_content)
+            if canonical is not None:
+                alias_of[doc_id] = canonical
+            else:
+                deduper.add(doc_id, sig, d.page_content)
+            chunks.append({
+                "id": doc_id,
+                "handbook": name,
+                "page": d.metadata.get("page"),
+                "text": re.sub(r"\s+", " ", d.page_content).strip(),
+            })
+        print(f"   📘 {name}: {pages} pages, {len(docs)} chunks")
+    return chunks, alias_of
+
+
+def _idf(chunks: List[dict]) -> Dict[str, float]:
+    df: Counter = Counter()
+    for c in chunks:
+        df.update(set(_words(c["text"])))
+    n = len(chunks)
+    return {w: math.log((n + 1) / (f + 0.5)) for w, f in df.items()}
+
+
+def _best_sentence(text: str, idf: Dict[str, float]) -> Tuple[str, float]:
+    best, best_score = "", 0.0
+    for s in split_sentences(text):
+        words = _words(s)
+        content = _content(words)
+        if len(content) < MIN_CONTENT_WORDS or len(words) > MAX_SENTENCE_WORDS:
+            continue
+        score = sum(idf.get(w, 0.0) for w in content) / len(content)
+        if score > best_score:
+            best, best_score = s, score
+    return best, best_score
+
+
+def keyword_query(sentence: str, idf: Dict[str, float], rng: random.Random) -> str:
+    content = list(dict.fromkeys(_content(_words(sentence))))
+    rare = set(sorted(content, key=lambda w: -idf.get(w, 0.0))[:KEYWORDS])
+    # rarest words, in sentence order
+    return rng.choice(TEMPLATES).format(" ".join(w for w in content if w in rare))
+
+
+def sentence_query(sentence: str, rng: random.Random) -> str:
+    words = sentence.rstrip(".!?;:").split()
+    kept = [
+        w for w in words
+        if w.lower().strip(",;:()\"'") in STOPWORDS or rng.random() >= DROP_RATIO
+    ]
+    return " ".join(kept[:MAX_QUERY_WORDS]).strip(",;: ")
+
+
+def build(folder: str, n: int, seed: int) -> List[dict]:
+    chunks, alias_of = load_chunks(folder)
+    canonical = [c for c in chunks if c["id"] not in alias_of]
+    idf = _idf(canonical)
+
+    candidates = []
+    for c in canonical:
+        if len(c["text"]) < MIN_CHUNK_CHARS:
+            continue
+        sentence, score = _best_sentence(c["text"], idf)
+        if not sentence:
+            continue
+        containing = [x["id"] for x in chunks if sentence in x["text"]]
+        relevant = set(containing) | {alias_of[i] for i in containing if i in alias_of}
+        if len({alias_of.get(i, i) for i in containing}) > MAX_SENTENCE_CHUNKS:
+            continue
+        candidates.append((c, sentence, sorted(relevant)))
+
+    rng = random.Random(seed)
+    picked = rng.sample(candidates, min(n, len(candidates)))
+    picked.sort(key=lambda x: x[0]["id"])
+
+    items = []
+    for i, (c, sentence, relevant) in enumerate(picked):
+        kind = "keyword" if i % 2 == 0 else "sentence"
+        query = keyword_query(sentence, idf, rng) if kind == "keyword" else sentence_query(sentence, rng)
+        items.append({
+            "id": f"q{i:04d}",
+            "query": query,
+            "kind": kind,
+            "handbook": c["handbook"],
+            "page": c["page"],
+            "source_id": c["id"],
+            "relevant_ids": relevant,
+        })
+
+    print(f"🧪 {len(items)} questions from {len(candidates)} eligible chunks ({len(canonical)} unique)")
+    return items
+
+
+def read_extra(path: str) -> List[dict]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if not row.get("query") or not row.get("relevant_ids"):
+                print(f"⚠️ {path} line {n}: needs query and relevant_ids, skipped")
+                continue
+            items.append({
+                "id": str(row.get("id", f"m{n:04d}")),
+                "query": row["query"],
+                "kind": row.get("kind", "manual"),
+                "handbook": row.get("handbook"),
+                "page": row.get("page"),
+                "source_id": row.get("source_id"),
+                "relevant_ids": list(row["relevant_ids"]),
+            })
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folder", default=RAW_FOLDER)
+    parser.add_argument("--n", type=int, default=200, help="generated questions")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--extra", default=None, help="hand-labeled questions to merge (JSONL)")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    print(f"📄 Building the test set from {args.folder}...")
+    items = build(args.folder, args.n, args.seed)
+    if args.extra:
+        extra = read_extra(args.extra)
+        print(f"➕ {len(extra)} hand-labeled questions from {args.extra}")
+        items += extra
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    print(f"✅ {len(items)} questions -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
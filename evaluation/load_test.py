@@ -0,0 +1,137 @@
+"""
+Load test for the API: N concurrent conversations against /chat or /chat/stream.
+Reports throughput and latency percentiles; save runs to compare before/after.
+
+Usage:
+    uvicorn api.app:app --port 8000 --workers 1
+    python -m evaluation.load_test --concurrency 20 --requests 200 --out after.json
+    python -m evaluation.load_test --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+
+
+QUERIES = [
+    "Explain probation period policy",
+    "What is the notice period and what happens if I don't serve it fully?",
+    "How many sick leaves are allowed?",
+    "Is work from home allowed?",
+    "What happens during termination for misconduct?",
+    "What is the travel reimbursement policy?",
+]
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def _one_request(client: httpx.AsyncClient, url: str, endpoint: str, i: int) -> Dict[str, Any]:
+    payload = {"query": QUERIES[i % len(QUERIES)], "thread_id": f"load-{uuid.uuid4().hex[:8]}"}
+    t0 = time.perf_counter()
+    first_byte = None
+
+    try:
+        if endpoint == "stream":
+            async with client.stream("POST", f"{url}/chat/stream", json=payload) as r:
+                async for _ in r.aiter_lines():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - t0
+                ok = r.status_code == 200
+        else:
+            r = await client.post(f"{url}/chat", json=payload)
+            ok = r.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+
+    return {"ok": ok, "latency": time.perf_counter() - t0, "ttfb": first_byte}
+
+
+async def run_load(url: str, endpoint: str, concurrency: int, n_requests: int, timeout: float) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+
+        async def _bounded(i: int):
+            async with sem:
+                return await _one_request(client, url, endpoint, i)
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*[_bounded(i) for i in range(n_requests)])
+        wall = time.perf_counter() - t0
+
+    latencies = [r["latency"] for r in results if r["ok"]]
+    ttfbs = [r["ttfb"] for r in results if r["ok"] and r["ttfb"] is not None]
+
+    report = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": sum(1 for r in results if not r["ok"]),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+            "p50": round(_percentile(latencies, 50) * 1000, 1),
+            "p95": round(_percentile(latencies, 95) * 1000, 1),
+            "p99": round(_percentile(latencies, 99) * 1000, 1),
+        },
+    }
+    if ttfbs:
+        report["ttfb_ms"] = {
+            "p50": round(_percentile(ttfbs, 50) * 1000, 1),
+            "p99": round(_percentile(ttfbs, 99) * 1000, 1),
+        }
+    return report
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path, "r", encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, "r", encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"{'metric':<18}{'before':>12}{'after':>12}{'change':>10}")
+    rows = [("throughput_rps", before["throughput_rps"], after["throughput_rps"])]
+    for p in ("p50", "p95", "p99"):
+        rows.append((f"latency {p} ms", before["latency_ms"][p], after["latency_ms"][p]))
+
+    for name, b, a in rows:
+        change = f"{(a - b) / b * 100:+.0f}%" if b else "n/a"
+        print(f"{name:<18}{b:>12}{a:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["chat", "stream"], default="chat")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run_load(args.url, args.endpoint, args.concurrency, args.requests, args.timeout))
+    print(json.dumps(report, indent=2))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
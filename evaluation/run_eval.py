@@ -0,0 +1,365 @@
+"""
+Benchmark suite over the labeled test set (evaluation/build_testset.py).
+
+- retrieval quality: recall@k and MRR for dense, BM25, hybrid (fusion) and
+  hybrid + cross-encoder rerank, overall and per question kind, plus the
+  latency of each method
+- pipeline: per-stage latency p50 / p95 / p99 (timings of the graph nodes)
+  and end-to-end latency, one question at a time; throughput (questions/s)
+  with --concurrency graph runs at once (api/bulk.py); context hit rate =
+  questions whose final reranked context holds a relevant chunk
+- peak RSS of the process
+
+Runs offline: Gemini steps go to the stub backend (llm.stub_latency_s),
+the local models are real. Caches are cold for every question (rewrite,
+rerank scores, query vectors; the answer cache is not used), and the
+persisted rewrite cache is never touched.
+
+Relevant ids missing from the BM25 index (other corpus build) are
+ignored; questions with none left are skipped and counted.
+
+Usage:
+    python -m evaluation.run_eval --out before.json
+    python -m evaluation.run_eval --limit 50 --skip-pipeline --out after.json
+    python -m evaluation.run_eval --compare before.json after.json   # exit 1 on a quality drop
+"""
+import os
+
+# before any agent import: the gateway picks its backend when first created
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import argparse
+import asyncio
+import hashlib
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from agents import embedding_service, query_rewrite_agent, reranker_agent
+from agents.lru_cache import LRUCache
+from agents.retrieval_agent import dense_search, get_bm25_index, hybrid_retrieval_agent
+from agents.settings import get_setting, load_settings
+from agents.state import initial_state
+from evaluation.build_testset import DEFAULT_OUT as DEFAULT_TESTSET
+
+
+METHODS = ("dense", "bm25", "hybrid", "rerank")
+PERCENTILES = (50, 95, 99)
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def _latency(samples_ms: List[float]) -> Dict[str, float]:
+    out = {f"p{p}": round(_percentile(samples_ms, p), 2) for p in PERCENTILES}
+    out["mean"] = round(statistics.mean(samples_ms), 2) if samples_ms else 0.0
+    return out
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _cold_caches() -> None:
+    # every question pays for its query vector, rewrite and cross-encoder scores
+    embedding_service._query_cache.clear()
+    query_rewrite_agent.get_rewrite_cache().clear()
+    reranker_agent._score_cache.clear()
+
+
+def _doc_id(d) -> str:
+    return d.metadata.get("doc_id") or d.id
+
+
+def load_testset(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Questions whose relevant chunks are in the current index; relevant_ids
+    narrowed to those chunks.
+    """
+    index = get_bm25_index()
+    items, skipped = [], 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            relevant = [i for i in item["relevant_ids"] if index.row_of(i) >= 0]
+            if not relevant:
+                skipped += 1
+                continue
+            items.append({**item, "relevant_ids": relevant})
+            if limit and len(items) >= limit:
+                break
+    if skipped:
+        print(f"⚠️ {skipped} questions skipped: none of their chunks is in the index (rebuild the test set?)")
+    return items
+
+
+def _searchers(k: int, backend: Optional[str]) -> Dict[str, Callable[[str], List[str]]]:
+    index = get_bm25_index()
+
+    def hybrid(q: str):
+        return hybrid_retrieval_agent(q, k_dense=k, k_bm25=k, top_n=k, backend=backend)
+
+    return {
+        "dense": lambda q: [_doc_id(d) for d, _ in dense_search(q, k=k, backend=backend)],
+        "bm25": lambda q: [doc_id for doc_id, _ in index.search(q, k=k)],
+        "hybrid": lambda q: [_doc_id(d) for d in hybrid(q)],
+        "rerank": lambda q: [_doc_id(d) for d in reranker_agent.reranker_agent(q, hybrid(q), top_n=k)],
+    }
+
+
+def _scores(ranked: List[str], relevant: List[str], ks: List[int]) -> Dict[str, float]:
+    relevant = set(relevant)
+    out = {f"recall@{k}": len(relevant & set(ranked[:k])) / len(relevant) for k in ks}
+    rank = next((i for i, doc_id in enumerate(ranked, start=1) if doc_id in relevant), None)
+    out["mrr"] = 1.0 / rank if rank else 0.0
+    return out
+
+
+def _mean_scores(rows: List[Dict[str, float]]) -> Dict[str, float]:
+    return {m: round(statistics.mean(r[m] for r in rows), 4) for m in rows[0]} if rows else {}
+
+
+def eval_retrieval(items: List[Dict[str, Any]], methods: List[str], ks: List[int],
+                   backend: Optional[str]) -> Dict[str, Any]:
+    searchers = _searchers(max(ks), backend)
+    report = {}
+    for method in methods:
+        search = searchers[method]
+        search("warm up")
+
+        per_kind = defaultdict(list)
+        latencies = []
+        for item in items:
+            _cold_caches()
+            t0 = time.perf_counter()
+            ranked = search(item["query"])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            per_kind[item.get("kind", "other")].append(_scores(ranked, item["relevant_ids"], ks))
+
+        rows = [r for kind_rows in per_kind.values() for r in kind_rows]
+        report[method] = {
+            **_mean_scores(rows),
+            "by_kind": {kind: _mean_scores(kind_rows) for kind, kind_rows in sorted(per_kind.items())},
+            "latency_ms": _latency(latencies),
+        }
+        r = report[method]
+        print(f"{method:<10}" + "".join(f"{r[f'recall@{k}']:>10.3f}" for k in ks)
+              + f"{r['mrr']:>8.3f}{r['latency_ms']['p50']:>10.1f}{r['latency_ms']['p99']:>10.1f}")
+    return report
+
+
+async def eval_pipeline(items: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from agents.langgraph_supervisor import build_graph
+    from api.bulk import answer_many
+    from memory.conversation_memory import clear_thread
+
+    graph = build_graph(checkpointer=InMemorySaver())
+    # model loads + first-call setup outside the timings
+    await graph.ainvoke(initial_state("warm up"), config={"configurable": {"thread_id": "eval-warmup"}})
+    clear_thread("eval-warmup")
+
+    walls: List[float] = []
+    stages: Dict[str, List[float]] = defaultdict(list)
+    hits = errors = 0
+    for item in items:
+        _cold_caches()
+        thread_id = f"eval-{uuid.uuid4().hex}"
+        t0 = time.perf_counter()
+        try:
+            result = await graph.ainvoke(initial_state(item["query"]), config={"configurable": {"thread_id": thread_id}})
+        except Exception as e:
+            errors += 1
+            print(f"⚠️ {item['id']}: {type(e).__name__}: {e}")
+            continue
+        finally:
+            clear_thread(thread_id)
+        walls.append((time.perf_counter() - t0) * 1000)
+
+        for node, record in (result.get("timings") or {}).items():
+            stages[node].append(record["wall_ms"])
+        context = {_doc_id(d) for d in result.get("reranked_docs") or []}
+        hits += bool(context & set(item["relevant_ids"]))
+
+    # throughput: the bulk path, concurrent graph runs
+    _cold_caches()
+    t0 = time.perf_counter()
+    bulk_errors = 0
+    async for out in answer_many(graph, ({"id": i["id"], "query": i["query"]} for i in items),
+                                 concurrency=concurrency, use_cache=False):
+        bulk_errors += "error" in out
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "questions": len(items),
+        "errors": errors,
+        "latency_ms": _latency(walls),
+        "stages_ms": {node: _latency(samples) for node, samples in sorted(stages.items())},
+        "context_hit_rate": round(hits / max(len(walls), 1), 4),
+        "throughput": {
+            "concurrency": concurrency,
+            "questions_per_s": round((len(items) - bulk_errors) / elapsed, 3) if elapsed else 0.0,
+            "errors": bulk_errors,
+        },
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _testset_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def run(args) -> Dict[str, Any]:
+    # in-memory rewrite cache so the benchmark never wipes data/cache
+    query_rewrite_agent.use_rewrite_cache(LRUCache(max_size=1000))
+
+    items = load_testset(args.testset, args.limit)
+    settings = load_settings()
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "testset": args.testset,
+            "testset_sha1": _testset_hash(args.testset),
+            "questions": len(items),
+            "k": args.k,
+            "llm_backend": os.environ.get("LLM_BACKEND"),
+            "dense_backend": args.backend or get_setting("retrieval", "dense_backend"),
+            "settings": {s: settings.get(s) for s in ("retrieval", "rerank", "inference", "batching")},
+        },
+    }
+    print(f"🧪 {len(items)} questions from {args.testset}")
+
+    print(f"\n{'method':<10}" + "".join(f"{'R@' + str(k):>10}" for k in args.k)
+          + f"{'MRR':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    report["retrieval"] = eval_retrieval(items, args.methods, args.k, args.backend)
+    report["peak_rss_mb"] = {"retrieval": _peak_rss_mb()}
+
+    if not args.skip_pipeline:
+        subset = items[:args.pipeline_questions]
+        print(f"\n⏱️ Pipeline: {len(subset)} questions, then concurrency {args.concurrency}...")
+        pipeline = asyncio.run(eval_pipeline(subset, args.concurrency))
+        report["pipeline"] = pipeline
+        report["peak_rss_mb"]["pipeline"] = _peak_rss_mb()
+
+        print(f"\n{'stage (ms)':<22}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for node, lat in list(pipeline["stages_ms"].items()) + [("end-to-end", pipeline["latency_ms"])]:
+            print(f"{node:<22}{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['p99']:>10.1f}")
+        print(f"\n📈 {pipeline['throughput']['questions_per_s']} questions/s at concurrency {args.concurrency}, "
+              f"context hit rate {pipeline['context_hit_rate']:.3f}")
+
+    report["peak_rss_mb"]["total"] = _peak_rss_mb()
+    print(f"🧠 peak RSS {report['peak_rss_mb']['total']} MB")
+    return report
+
+
+def _rows(report: Dict[str, Any]) -> List[tuple]:
+    # (metric, value, kind): "quality" = higher is better, "speed" = lower is better, "rate" = higher is better
+    rows = []
+    for method, r in report.get("retrieval", {}).items():
+        for metric in [m for m in r if m.startswith("recall@")] + ["mrr"]:
+            rows.append((f"{method} {metric}", r[metric], "quality"))
+        rows.append((f"{method} p50 ms", r["latency_ms"]["p50"], "speed"))
+    pipeline = report.get("pipeline")
+    if pipeline:
+        rows.append(("context hit rate", pipeline["context_hit_rate"], "quality"))
+        for node, lat in pipeline["stages_ms"].items():
+            for p in ("p50", "p95"):
+                rows.append((f"{node} {p} ms", lat[p], "speed"))
+        for p in ("p50", "p95", "p99"):
+            rows.append((f"end-to-end {p} ms", pipeline["latency_ms"][p], "speed"))
+        rows.append(("questions/s", pipeline["throughput"]["questions_per_s"], "rate"))
+    rows.append(("peak RSS MB", report.get("peak_rss_mb", {}).get("total", 0.0), "speed"))
+    return rows
+
+
+def compare(before_path: str, after_path: str, max_quality_drop: float) -> bool:
+    """
+    Prints before / after per metric; False when a quality metric dropped
+    by more than max_quality_drop (absolute).
+    """
+    with open(before_path, "r", encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, "r", encoding="utf-8") as f:
+        after = json.load(f)
+
+    if before["meta"].get("testset_sha1") != after["meta"].get("testset_sha1"):
+        print("⚠️ the runs used different test sets, quality numbers are not comparable")
+
+    after_rows = {name: value for name, value, _ in _rows(after)}
+    ok = True
+    print(f"{'metric':<30}{'before':>12}{'after':>12}{'change':>10}")
+    for name, b, kind in _rows(before):
+        if name not in after_rows:
+            continue
+        a = after_rows[name]
+        if kind == "quality":
+            change = f"{a - b:+.3f}"
+            flag = ""
+            if b - a > max_quality_drop:
+                flag, ok = "  ❌", False
+        else:
+            change = f"{(a - b) / b * 100:+.0f}%" if b else "n/a"
+            flag = ""
+        print(f"{name:<30}{b:>12}{a:>12}{change:>10}{flag}")
+
+    print("\n✅ no quality drop" if ok else f"\n❌ quality dropped by more than {max_quality_drop}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--testset", default=DEFAULT_TESTSET)
+    parser.add_argument("--limit", type=int, default=None, help="first N questions only")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    parser.add_argument("--backend", default=None, help="dense backend: chroma | local (default: retrieval.dense_backend)")
+    parser.add_argument("--skip-pipeline", action="store_true", help="retrieval metrics only")
+    parser.add_argument("--pipeline-questions", type=int, default=50, help="questions run through the full graph")
+    parser.add_argument("--concurrency", type=int, default=None, help="graph runs at once (default: bulk.concurrency)")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--max-quality-drop", type=float, default=0.02,
+                        help="--compare fails when recall / MRR / context hit rate drop by more than this")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.max_quality_drop) else 1)
+
+    args.k = sorted(set(args.k))
+    args.concurrency = args.concurrency or get_setting("bulk", "concurrency", 16)
+    report = run(args)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 report -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
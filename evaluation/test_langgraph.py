@@ -1,4 +1,6 @@
 from agents.langgraph_supervisor import build_graph
+from agents.state import initial_state
+from memory.checkpoints import checkpoint_durability
 
 
 def pretty_print_sources(docs):
@@ -29,16 +31,10 @@ def main():
         print(f"QUERY: {q}")
         print("=" * 100)
 
-        initial_state = {
-            "user_query": q,
-            "retry_count": 0,
-            "max_retries": 1
-        }
-
         config = {"configurable": {"thread_id": "test-thread"}}
 
         try:
-            result = app.invoke(initial_state, config=config)
+            result = app.invoke(initial_state(q), config=config, durability=checkpoint_durability())
         except Exception as e:
             print("\n❌ ERROR DURING GRAPH RUN")
             print(str(e))
@@ -75,6 +71,10 @@ def main():
         print("\n--- SOURCES (RERANKED DOCS) ---")
         pretty_print_sources(reranked_docs)
 
+        print("\n--- NODE TIMINGS ---")
+        for node, record in result.get("timings", {}).items():
+            print(f"- {node}: {record}")
+
         print("\n--- INTERNAL AGENT LOGS ---")
         if logs:
             for l in logs:
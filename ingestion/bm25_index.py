@@ -0,0 +1,363 @@
+import json
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+BM25_DIR = "data/bm25_index"
+
+# same defaults as rank_bm25.BM25Okapi, so scores match the old per-query index
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    return text.lower().split()
+
+
+def _postings_of(texts: Sequence[str], vocab: Dict[str, int], row_offset: int = 0):
+    """
+    Flat postings of texts: (term ids, rows, tfs, doc lens).
+    New terms are appended to vocab.
+    """
+    term_ids: List[int] = []
+    rows: List[int] = []
+    tfs: List[int] = []
+    doc_lens = np.zeros(len(texts), dtype=np.int32)
+
+    for i, text in enumerate(texts):
+        tokens = tokenize(text)
+        doc_lens[i] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row_offset + i)
+            tfs.append(tf)
+
+    return (
+        np.array(term_ids, dtype=np.int64),
+        np.array(rows, dtype=np.int64),
+        np.array(tfs, dtype=np.int64),
+        doc_lens,
+    )
+
+
+class BM25Index:
+    """
+    Compact inverted BM25 index.
+
+    On disk (one folder, next to data/vectorstore):
+    - vocab.json         term list (term id = position)
+    - term_offsets.npy   int64 [V + 1], postings slice per term
+    - postings_doc.npy   int32 [P], doc rows sorted per term
+    - postings_tf.npy    uint16 [P], term frequency per posting
+    - doc_lens.npy       int32 [N]
+    - idf.npy            float32 [V]
+    - doc_ids.json       row -> vector store id
+    - meta.json          k1, b, avgdl, num_docs
+
+    Arrays are memory-mapped on load, so a query only touches the
+    postings of its own terms.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        term_offsets: np.ndarray,
+        postings_doc: np.ndarray,
+        postings_tf: np.ndarray,
+        doc_lens: np.ndarray,
+        idf: np.ndarray,
+        doc_ids: List[str],
+        avgdl: float,
+        k1: float = K1,
+        b: float = B,
+    ):
+        self.terms = terms
+        self.term_to_id: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.postings_doc = postings_doc
+        self.postings_tf = postings_tf
+        self.doc_lens = doc_lens
+        self.idf = idf
+        self.doc_ids = doc_ids
+        self._row_of: Optional[Dict[str, int]] = None
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+        # corpus version the index was loaded at (set by the API's loader)
+        self.version = "unversioned"
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_ids)
+
+    def row_of(self, doc_id: str) -> int:
+        """
+        Row number of a chunk id (-1 if unknown).
+        """
+        if self._row_of is None:
+            self._row_of = {d: i for i, d in enumerate(self.doc_ids)}
+        return self._row_of.get(doc_id, -1)
+
+    # -----------------------------
+    # Build
+    # -----------------------------
+    @classmethod
+    def from_texts(
+        cls,
+        texts: Sequence[str],
+        doc_ids: Sequence[str],
+        k1: float = K1,
+        b: float = B,
+        epsilon: float = EPSILON,
+    ) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids, rows, tfs, doc_lens = _postings_of(texts, vocab, row_offset=0)
+        return cls._build(list(vocab), term_ids, rows, tfs, doc_lens, doc_ids, k1, b, epsilon)
+
+    def updated(
+        self,
+        doc_ids: Sequence[str],
+        new_texts: Dict[str, str],
+        epsilon: float = EPSILON,
+    ) -> "BM25Index":
+        """
+        New index with rows in doc_ids order, without re-tokenizing the corpus:
+        - chunks in new_texts are (re)tokenized
+        - every other chunk reuses its postings from this index
+        - chunks of this index missing from doc_ids are dropped
+        Same result as from_texts() over the full corpus.
+        """
+        new_row = np.full(self.num_docs, -1, dtype=np.int64)
+        for row, doc_id in enumerate(doc_ids):
+            if doc_id in new_texts:
+                continue
+            old = self.row_of(doc_id)
+            if old < 0:
+                raise KeyError(f"{doc_id} is neither in the index nor in new_texts")
+            new_row[old] = row
+
+        # postings of kept chunks, remapped to their new rows
+        old_terms = np.repeat(
+            np.arange(len(self.terms), dtype=np.int64), np.diff(np.asarray(self.term_offsets))
+        )
+        old_rows = new_row[np.asarray(self.postings_doc)]
+        keep = old_rows >= 0
+
+        vocab: Dict[str, int] = {t: i for i, t in enumerate(self.terms)}
+        changed = [(row, doc_id) for row, doc_id in enumerate(doc_ids) if doc_id in new_texts]
+        add_terms, add_rows, add_tfs, add_lens = _postings_of([new_texts[d] for _, d in changed], vocab, row_offset=0)
+        changed_rows = np.array([row for row, _ in changed], dtype=np.int64)
+
+        doc_lens = np.zeros(len(doc_ids), dtype=np.int32)
+        kept_old = np.nonzero(new_row >= 0)[0]
+        doc_lens[new_row[kept_old]] = np.asarray(self.doc_lens)[kept_old]
+        if len(changed_rows):
+            doc_lens[changed_rows] = add_lens
+
+        return self._build(
+            list(vocab),
+            np.concatenate([old_terms[keep], add_terms]),
+            np.concatenate([old_rows[keep], changed_rows[add_rows] if len(add_rows) else add_rows]),
+            np.concatenate([np.asarray(self.postings_tf)[keep], add_tfs]),
+            doc_lens,
+            doc_ids,
+            self.k1,
+            self.b,
+            epsilon,
+        )
+
+    @classmethod
+    def _build(
+        cls,
+        vocab: List[str],
+        term_ids: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+        doc_lens: np.ndarray,
+        doc_ids: Sequence[str],
+        k1: float,
+        b: float,
+        epsilon: float,
+    ) -> "BM25Index":
+        """
+        Index from flat (term id, row, tf) postings; term ids point into vocab.
+        Terms are stored sorted, terms without postings are dropped.
+        """
+        n_docs = len(doc_ids)
+
+        # vocab id -> sorted term id (or -1 when the term has no postings left)
+        df_by_vocab = np.bincount(term_ids, minlength=len(vocab)) if len(vocab) else np.zeros(0, dtype=np.int64)
+        live = np.nonzero(df_by_vocab)[0].tolist()
+        live.sort(key=lambda i: vocab[i])
+        terms = [vocab[i] for i in live]
+        remap = np.full(len(vocab), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live), dtype=np.int64)
+
+        sorted_terms = remap[term_ids]
+        order = np.lexsort((rows, sorted_terms))
+
+        df = np.bincount(sorted_terms, minlength=len(terms)).astype(np.int64)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(df, out=term_offsets[1:])
+
+        postings_doc = rows[order].astype(np.int32)
+        postings_tf = np.minimum(tfs[order], np.iinfo(np.uint16).max).astype(np.uint16)
+
+        # BM25Okapi idf: negative values are floored to epsilon * mean idf
+        df = df.astype(np.float64)
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+
+        doc_lens = np.asarray(doc_lens, dtype=np.int32)
+        avgdl = float(doc_lens.sum()) / n_docs if n_docs else 0.0
+
+        return cls(
+            terms=terms,
+            term_offsets=term_offsets,
+            postings_doc=postings_doc,
+            postings_tf=postings_tf,
+            doc_lens=doc_lens,
+            idf=idf.astype(np.float32),
+            doc_ids=list(doc_ids),
+            avgdl=avgdl,
+            k1=k1,
+            b=b,
+        )
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, index_dir: str = BM25_DIR) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+
+        np.save(os.path.join(index_dir, "term_offsets.npy"), self.term_offsets)
+        np.save(os.path.join(index_dir, "postings_doc.npy"), self.postings_doc)
+        np.save(os.path.join(index_dir, "postings_tf.npy"), self.postings_tf)
+        np.save(os.path.join(index_dir, "doc_lens.npy"), self.doc_lens)
+        np.save(os.path.join(index_dir, "idf.npy"), self.idf)
+
+        with open(os.path.join(index_dir, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(self.terms, f, ensure_ascii=False)
+
+        with open(os.path.join(index_dir, "doc_ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.doc_ids, f, ensure_ascii=False)
+
+        meta = {
+            "k1": self.k1,
+            "b": self.b,
+            "avgdl": self.avgdl,
+            "num_docs": self.num_docs,
+            "num_terms": len(self.terms),
+        }
+        with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, index_dir: str = BM25_DIR) -> "BM25Index":
+        def _array(name: str) -> np.ndarray:
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        with open(os.path.join(index_dir, "doc_ids.json"), "r", encoding="utf-8") as f:
+            doc_ids = json.load(f)
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        return cls(
+            terms=terms,
+            term_offsets=_array("term_offsets.npy"),
+            postings_doc=_array("postings_doc.npy"),
+            postings_tf=_array("postings_tf.npy"),
+            doc_lens=_array("doc_lens.npy"),
+            idf=_array("idf.npy"),
+            doc_ids=doc_ids,
+            avgdl=meta["avgdl"],
+            k1=meta["k1"],
+            b=meta["b"],
+        )
+
+    # -----------------------------
+    # Query
+    # -----------------------------
+    def _partition_postings(self, start: int, end: int, ranges: np.ndarray) -> np.ndarray:
+        # postings positions of one term inside the row ranges (binary search,
+        # postings rows are sorted per term)
+        postings = self.postings_doc[start:end]
+        lo = np.searchsorted(postings, ranges[:, 0])
+        hi = np.searchsorted(postings, ranges[:, 1])
+        parts = [np.arange(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return start + np.concatenate(parts)
+
+    def score(self, query: str, ranges: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (rows, scores) for every doc matching at least one query term.
+        Cost depends on the postings of the query terms, not on corpus size.
+        ranges: int64 [R, 2] sorted [start, end) row ranges (e.g. one handbook);
+        only their postings are read. IDF stays corpus-wide.
+        """
+        rows_parts = []
+        score_parts = []
+
+        # duplicates are scored once per occurrence, like BM25Okapi.get_scores
+        for token in tokenize(query):
+            term_id = self.term_to_id.get(token)
+            if term_id is None:
+                continue
+
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            if ranges is None:
+                rows = np.asarray(self.postings_doc[start:end])
+                tf = np.asarray(self.postings_tf[start:end], dtype=np.float32)
+            else:
+                positions = self._partition_postings(int(start), int(end), ranges)
+                if not len(positions):
+                    continue
+                rows = np.asarray(self.postings_doc[positions])
+                tf = np.asarray(self.postings_tf[positions], dtype=np.float32)
+            dl = np.asarray(self.doc_lens[rows], dtype=np.float32)
+
+            norm = self.k1 * (1 - self.b + self.b * dl / self.avgdl)
+            rows_parts.append(rows)
+            score_parts.append(self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm))
+
+        if not rows_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        all_rows = np.concatenate(rows_parts)
+        all_scores = np.concatenate(score_parts)
+
+        rows, inverse = np.unique(all_rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=all_scores).astype(np.float32)
+        return rows, scores
+
+    def search(self, query: str, k: int = 8, ranges: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k (doc_id, score) for query, optionally within row ranges (see score).
+        """
+        rows, scores = self.score(query, ranges)
+        if not len(rows):
+            return []
+
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        order = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.doc_ids[rows[i]], float(scores[i])) for i in order]
+
+
+def load_bm25_index(index_dir: str = BM25_DIR) -> Optional[BM25Index]:
+    """
+    Loads the memory-mapped index, or None if ingestion has not built it yet.
+    """
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    return BM25Index.load(index_dir)
@@ -1,47 +1,368 @@
+import argparse
 import os
+import shutil
+import time
+from typing import Dict, Iterator, List, Optional, Set
+import numpy as np
 from dotenv import load_dotenv
-from ingestion.load_docs import load_handbook_pdfs
-from ingestion.chunk_docs import chunk_documents
+from langchain_core.documents import Document
+from ingestion.load_docs import list_handbook_pdfs
+from ingestion.pipeline import iter_chunked_pdfs, iter_embedded_batches
+from ingestion.bm25_index import BM25Index, BM25_DIR, load_bm25_index
+from ingestion.sentence_index import SentenceIndex, SENTENCE_DIR, load_sentence_index
+from ingestion.vector_index import VectorIndex, VECTOR_DIR, load_vector_index
+from ingestion.corpus_version import write_corpus_version
+from ingestion.manifest import MANIFEST_PATH, load_manifest, save_manifest, scan_folder, diff_manifest
+from ingestion.dedup import ChunkDeduper, MAX_DISTANCE, MIN_JACCARD, save_aliases
+from ingestion.handbook_centroids import centroid_of_sum, load_centroids, save_centroids
+from agents.settings import get_setting
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 
-def main():
-    load_dotenv()
 
-    RAW_FOLDER = "data/raw_handbooks"
-    CHROMA_DIR = "data/vectorstore"
-    COLLECTION_NAME = "company_handbooks"
+RAW_FOLDER = "data/raw_handbooks"
+CHROMA_DIR = "data/vectorstore"
+COLLECTION_NAME = "company_handbooks"
+
+# Chroma rejects very large add / delete calls
+STORE_BATCH = 2048
+
+
+def _fetch_texts(vectordb: Chroma, ids: List[str]) -> Dict[str, str]:
+    texts = {}
+    for start in range(0, len(ids), STORE_BATCH):
+        res = vectordb.get(ids=ids[start:start + STORE_BATCH], include=["documents"])
+        texts.update(zip(res["ids"], res["documents"]))
+    return texts
+
+
+def _fetch_embeddings(vectordb: Chroma, ids: List[str]) -> Dict[str, np.ndarray]:
+    vectors = {}
+    for start in range(0, len(ids), STORE_BATCH):
+        res = vectordb.get(ids=ids[start:start + STORE_BATCH], include=["embeddings"])
+        vectors.update(zip(res["ids"], np.asarray(res["embeddings"], dtype=np.float32)))
+    return vectors
+
+
+def _encode(texts: List[str]):
+    # imported lazily: parse workers re-import this module under spawn / forkserver
+    # and must not load the embedding model
+    from agents.embedding_service import encode_texts
+    return encode_texts(texts, batch_size=get_setting("ingestion", "model_batch_size", 256))
+
+
+def _publish_dir(staging: str, live: str) -> None:
+    # swap a fully written index folder in place of the live one
+    old = live + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(live):
+        os.replace(live, old)
+    os.replace(staging, live)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _canonical_ids(entry: dict) -> List[str]:
+    # chunks of a manifest entry that are stored (not aliases of another chunk)
+    aliases = entry.get("aliases", {})
+    return [i for i in entry["doc_ids"] if i not in aliases]
+
+
+def _files_to_reprocess(previous: Dict[str, dict], kept: List[str], dedup: bool) -> Set[str]:
+    """
+    Unchanged PDFs that still have to be re-parsed for dedup:
+    - no chunk signatures in the manifest (built before dedup), or
+      aliases left over from a run with dedup enabled
+    - an alias whose canonical chunk belongs to a file being re-parsed
+      (repeated until stable, the canonical copy may move to another file)
+    """
+    reprocess = {
+        name for name in kept
+        if "signatures" not in previous[name] or (not dedup and previous[name].get("aliases"))
+    }
+    while True:
+        canonical = {i for name in kept if name not in reprocess for i in _canonical_ids(previous[name])}
+        orphans = {
+            name for name in kept
+            if name not in reprocess
+            and any(c not in canonical for c in previous[name].get("aliases", {}).values())
+        }
+        if not orphans:
+            return reprocess
+        reprocess |= orphans
+
+
+def _updated_indexes(
+    vectordb: Chroma,
+    doc_ids: List[str],
+    new_texts: Dict[str, str],
+    bm25_index: Optional[BM25Index],
+    sentence_index: Optional[SentenceIndex],
+):
+    """
+    Derived indexes for the new corpus: unchanged chunks are reused,
+    only new_texts are tokenized / encoded. A missing or stale index is
+    rebuilt from the chunk texts in Chroma.
+    """
+    try:
+        if bm25_index is not None:
+            bm25_index = bm25_index.updated(doc_ids, new_texts)
+        if sentence_index is not None:
+            sentence_index = sentence_index.updated(doc_ids, new_texts, encode_fn=_encode)
+    except KeyError as e:
+        print(f"⚠️ Derived index out of sync with the manifest ({e}), rebuilding it.")
+        bm25_index = sentence_index = None
+
+    if bm25_index is None or sentence_index is None:
+        texts = {**_fetch_texts(vectordb, [i for i in doc_ids if i not in new_texts]), **new_texts}
+        corpus = [texts[i] for i in doc_ids]
+        if bm25_index is None:
+            bm25_index = BM25Index.from_texts(corpus, doc_ids)
+        if sentence_index is None:
+            sentence_index = SentenceIndex.build(corpus, doc_ids, encode_fn=_encode)
+
+    return bm25_index, sentence_index
+
+
+def _updated_vector_index(
+    vectordb: Chroma,
+    doc_ids: List[str],
+    new_vectors: Dict[str, np.ndarray],
+    vector_index: Optional[VectorIndex],
+) -> VectorIndex:
+    """
+    Local dense index for the new corpus: stored rows of unchanged chunks
+    are reused. A missing index, or one with another dtype, is rebuilt
+    from the embeddings in Chroma.
+    """
+    dtype = get_setting("vector_index", "dtype", "int8")
+    n_lists = get_setting("vector_index", "n_lists")
+    if vector_index is not None and vector_index.dtype == dtype:
+        try:
+            return vector_index.updated(doc_ids, new_vectors, n_lists=n_lists)
+        except KeyError as e:
+            print(f"⚠️ Vector index out of sync with the manifest ({e}), rebuilding it.")
+
+    vectors = {**_fetch_embeddings(vectordb, [i for i in doc_ids if i not in new_vectors]), **new_vectors}
+    return VectorIndex.build(np.stack([vectors[i] for i in doc_ids]), doc_ids, dtype=dtype, n_lists=n_lists)
+
+
+def _handbook_centroids(
+    vectordb: Chroma,
+    files: Dict[str, dict],
+    new_files: Dict[str, dict],
+    new_sums: Dict[str, np.ndarray],
+    previous: Dict[str, np.ndarray],
+) -> Dict[str, np.ndarray]:
+    """
+    Embedding centroid per handbook, over all its chunks (aliases count with
+    their canonical vector). new_sums holds the vectors embedded in this run;
+    unchanged handbooks keep their previous centroid.
+    """
+    centroids = {}
+    for name, entry in files.items():
+        if name not in new_files and name in previous:
+            centroids[name] = previous[name]
+            continue
+
+        aliases = entry.get("aliases", {})
+        if name in new_files:
+            total = new_sums.get(name)
+            wanted = list(aliases.values())
+        else:
+            total = None
+            wanted = [aliases.get(i, i) for i in entry["doc_ids"]]
+
+        vectors = _fetch_embeddings(vectordb, sorted(set(wanted)))
+        for doc_id in wanted:
+            if doc_id in vectors:
+                total = vectors[doc_id] if total is None else total + vectors[doc_id]
+        if total is not None:
+            centroids[name] = centroid_of_sum(total)
+    return centroids
+
+
+def main(full: bool = False):
+    """
+    Incremental ingestion driven by a manifest of PDF content hashes:
+    - only new / changed PDFs are parsed, chunked and embedded
+      (process pool -> batched embedding thread -> Chroma upserts, streamed)
+    - chunks of changed / removed PDFs are deleted from Chroma
+    - BM25 + sentence (+ optional local vector) indexes are updated from the previous ones
+    - repeated chunks (exact or SimHash near-duplicates) are stored once;
+      the other copies are kept as aliases of the canonical chunk (citations)
+
+    Order (the manifest is the commit point, a crashed run is simply redone):
+    1. Chroma upserts + deletes (idempotent, ids are stable)
+    2. derived indexes written to staging folders, then swapped in
+    3. aliases + handbook centroids sidecars, manifest, then corpus version stamp
+    """
+    load_dotenv()
+    t0 = time.perf_counter()
 
     os.makedirs(CHROMA_DIR, exist_ok=True)
 
-    print("📄 Loading handbook PDFs...")
-    docs = load_handbook_pdfs(RAW_FOLDER)
-    print(f"✅ Loaded {len(docs)} PDF pages.")
+    previous = {} if full else load_manifest(MANIFEST_PATH)
+    pdf_files = list_handbook_pdfs(RAW_FOLDER)
+
+    print("🔍 Hashing handbook PDFs...")
+    current = scan_folder(RAW_FOLDER, pdf_files, previous)
+    added, changed, removed = diff_manifest(previous, current)
+    print(f"✅ {len(added)} new, {len(changed)} changed, {len(removed)} removed, "
+          f"{len(pdf_files) - len(added) - len(changed)} unchanged.")
 
-    print("✂️ Chunking documents...")
-    chunked_docs = chunk_documents(docs)
-    print(f"✅ Created {len(chunked_docs)} chunks.")
+    bm25_index = None if full else load_bm25_index(BM25_DIR)
+    sentence_index = None if full else load_sentence_index(SENTENCE_DIR)
+    use_vector_index = get_setting("vector_index", "enabled", True)
+    vector_index = None if full or not use_vector_index else load_vector_index(VECTOR_DIR)
 
-    print("🧠 Creating embeddings + storing in Chroma...")
+    dedup = get_setting("ingestion", "dedup", True)
+    kept = [name for name in pdf_files if name not in added and name not in changed]
+    reprocess = _files_to_reprocess(previous, kept, dedup)
+    if reprocess:
+        print(f"🧬 Re-parsing {len(reprocess)} unchanged PDFs for chunk dedup.")
 
-    embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+    indexes_ready = bm25_index is not None and sentence_index is not None
+    if use_vector_index and vector_index is None:
+        indexes_ready = False
+    if not (added or changed or removed or reprocess) and indexes_ready:
+        print("✅ Nothing to do, corpus is up to date.")
+        return
 
-    vectordb = Chroma.from_documents(
-        documents=chunked_docs,
-        embedding=embeddings,
+    # same model instance the API uses at query time
+    from agents.embedding_service import SharedEmbeddings
+    embeddings = SharedEmbeddings()
+    vectordb = Chroma(
         persist_directory=CHROMA_DIR,
         collection_name=COLLECTION_NAME,
+        embedding_function=embeddings,
     )
 
-    vectordb.persist()
+    if not previous and vectordb._collection.count():
+        # no manifest: the collection was filled by an older (append-only) build
+        print("🧹 No manifest found, resetting the existing collection (removes duplicates)...")
+        vectordb.delete_collection()
+        vectordb = Chroma(
+            persist_directory=CHROMA_DIR,
+            collection_name=COLLECTION_NAME,
+            embedding_function=embeddings,
+        )
+
+    # canonical chunks of the untouched PDFs, new chunks are matched against them
+    deduper = ChunkDeduper(
+        near=get_setting("ingestion", "near_dedup", False),
+        max_distance=get_setting("ingestion", "simhash_max_distance", MAX_DISTANCE),
+        min_jaccard=get_setting("ingestion", "near_dedup_min_jaccard", MIN_JACCARD),
+    ) if dedup else None
+    alias_of: Dict[str, str] = {}
+    for name in kept:
+        if name in reprocess:
+            continue
+        alias_of.update(previous[name].get("aliases", {}))
+        if deduper is not None:
+            aliases = previous[name].get("aliases", {})
+            for doc_id, sig in zip(previous[name]["doc_ids"], previous[name]["signatures"]):
+                if doc_id not in aliases:
+                    deduper.add(doc_id, tuple(sig))
+
+    print("📄 Parsing, chunking + embedding new / changed PDFs...")
+    new_files: Dict[str, dict] = {}
+    new_texts: Dict[str, str] = {}
+    new_vectors: Dict[str, np.ndarray] = {}
+    # per handbook: sum of the vectors embedded in this run (router centroids)
+    new_sums: Dict[str, np.ndarray] = {}
+    n_pages = 0
+
+    def _chunk_stream() -> Iterator[Document]:
+        nonlocal n_pages
+        # files in name order, so the canonical copy of a duplicate does not depend on parse timing
+        for name, pages, chunks, sigs in iter_chunked_pdfs(RAW_FOLDER, sorted(added + changed + list(reprocess))):
+            n_pages += pages
+            aliases: Dict[str, str] = {}
+            for d, sig in zip(chunks, sigs):
+                doc_id = d.metadata["doc_id"]
+                canonical = deduper.match(sig, d.page_content) if deduper is not None else None
+                if canonical is not None:
+                    aliases[doc_id] = canonical
+                    continue
+                if deduper is not None:
+                    deduper.add(doc_id, sig, d.page_content)
+                new_texts[doc_id] = d.page_content
+                yield d
+            alias_of.update(aliases)
+            new_files[name] = {
+                "doc_ids": [d.metadata["doc_id"] for d in chunks],
+                "signatures": [list(sig) for sig in sigs],
+                "aliases": aliases,
+            }
+            print(f"   📘 {name}: {pages} pages, {len(chunks)} chunks, {len(aliases)} duplicates")
+
+    n_upserted = 0
+    for docs, vectors in iter_embedded_batches(_chunk_stream(), encode_fn=_encode):
+        for start in range(0, len(docs), STORE_BATCH):
+            batch = docs[start:start + STORE_BATCH]
+            vectordb._collection.upsert(
+                ids=[d.metadata["doc_id"] for d in batch],
+                embeddings=vectors[start:start + STORE_BATCH].tolist(),
+                documents=[d.page_content for d in batch],
+                metadatas=[d.metadata for d in batch],
+            )
+        for d, vec in zip(docs, vectors):
+            name = d.metadata["handbook_name"]
+            new_sums[name] = new_sums[name] + vec if name in new_sums else vec.astype(np.float64)
+        if use_vector_index:
+            new_vectors.update(zip((d.metadata["doc_id"] for d in docs), vectors.astype(np.float16)))
+        n_upserted += len(docs)
+
+    stale = sorted(
+        {i for name in changed + removed + sorted(reprocess) for i in _canonical_ids(previous[name])}
+        - set(new_texts)
+    )
+    for start in range(0, len(stale), STORE_BATCH):
+        vectordb.delete(ids=stale[start:start + STORE_BATCH])
+    print(f"✅ {n_pages} pages -> upserted {n_upserted} chunks, deleted {len(stale)} stale chunks.")
+
+    # handbooks in file-name order, each one contiguous (stable row order for derived indexes)
+    files = {}
+    for name in pdf_files:
+        entry = new_files[name] if name in new_files else {
+            key: previous[name][key] for key in ("doc_ids", "signatures", "aliases") if key in previous[name]
+        }
+        files[name] = {**current[name], **entry}
+    doc_ids = [i for name in pdf_files for i in _canonical_ids(files[name])]
+    print(f"🧬 {len(doc_ids)} canonical chunks, {len(alias_of)} duplicates stored as aliases.")
+
+    print("🔤 Updating BM25 + sentence indexes...")
+    bm25_index, sentence_index = _updated_indexes(vectordb, doc_ids, new_texts, bm25_index, sentence_index)
+    bm25_index.save(BM25_DIR + ".staging")
+    sentence_index.save(SENTENCE_DIR + ".staging")
+    if use_vector_index:
+        print("🧮 Updating local vector index...")
+        vector_index = _updated_vector_index(vectordb, doc_ids, new_vectors, vector_index)
+        vector_index.save(VECTOR_DIR + ".staging")
+
+    _publish_dir(BM25_DIR + ".staging", BM25_DIR)
+    _publish_dir(SENTENCE_DIR + ".staging", SENTENCE_DIR)
+    if use_vector_index:
+        _publish_dir(VECTOR_DIR + ".staging", VECTOR_DIR)
+    save_aliases(alias_of)
+    save_centroids(_handbook_centroids(vectordb, files, new_files, new_sums, {} if full else load_centroids()))
+    save_manifest(files, MANIFEST_PATH)
+
+    print(f"✅ BM25 index: {bm25_index.num_docs} docs, {len(bm25_index.terms)} terms")
+    print(f"✅ Sentence index: {len(sentence_index.embeddings)} sentences (float16)")
+    if use_vector_index:
+        print(f"✅ Vector index: {len(vector_index.doc_ids)} chunks ({vector_index.dtype}, "
+              f"{vector_index.n_lists} IVF lists, {vector_index.nbytes / 1e6:.1f} MB)")
+    print(f"📍 Saved at: {CHROMA_DIR}, {BM25_DIR}, {SENTENCE_DIR}" + (f", {VECTOR_DIR}" if use_vector_index else ""))
 
-    print("✅ Vector DB stored successfully!")
-    print(f"📍 Saved at: {CHROMA_DIR}")
-    print(f"📦 Collection: {COLLECTION_NAME}")
+    # invalidates answer caches built on the previous corpus
+    version = write_corpus_version()
+    print(f"🏷️ Corpus version: {version}")
+    print(f"⏱️ Ingestion took {time.perf_counter() - t0:.1f}s")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+    main(full=args.full)
@@ -4,6 +4,17 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from ingestion.clean_text import clean_handbook_text
 
 
+def chunk_doc_id(metadata: dict) -> str:
+    """
+    Stable id for a chunk: handbook + page + chunk index.
+    Used as the vector store id and as the row key of derived indexes.
+    """
+    handbook = metadata.get("handbook_name", "unknown")
+    page = metadata.get("page", "N/A")
+    chunk = metadata.get("chunk_id", "N/A")
+    return f"{handbook}::p{page}::c{chunk}"
+
+
 def chunk_documents(
     docs: List[Document],
     chunk_size: int = 1200,
@@ -33,13 +44,10 @@ def chunk_documents(
         chunks = splitter.split_text(cleaned)
 
         for idx, chunk in enumerate(chunks):
-            new_doc = Document(
-                page_content=chunk,
-                metadata={
-                    **doc.metadata,
-                    "chunk_id": idx,
-                },
-            )
+            metadata = {**doc.metadata, "chunk_id": idx}
+            metadata["doc_id"] = chunk_doc_id(metadata)
+
+            new_doc = Document(page_content=chunk, metadata=metadata)
             chunked_docs.append(new_doc)
 
     return chunked_docs
\ No newline at end of file
@@ -0,0 +1,27 @@
+import os
+import time
+import uuid
+
+
+CORPUS_VERSION_PATH = "data/vectorstore/corpus_version.txt"
+
+
+def write_corpus_version(path: str = CORPUS_VERSION_PATH) -> str:
+    """
+    Stamps the vector store with a new version id.
+    Called after every (re)build; caches keyed on the corpus compare against it.
+    """
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, path)
+    return version
+
+
+def read_corpus_version(path: str = CORPUS_VERSION_PATH) -> str:
+    if not os.path.exists(path):
+        return "unversioned"
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or "unversioned"
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+ALIASES_PATH = "data/vectorstore/aliases.json"
+
+SIMHASH_BITS = 64
+# conservative: merging two different policy clauses would lose one of them
+MAX_DISTANCE = 3
+SHINGLE_SIZE = 3
+# SimHash candidates are confirmed on the text: same numbers, shingle Jaccard >= this
+MIN_JACCARD = 0.9
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def exact_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _shingles(text: str, shingle_size: int = SHINGLE_SIZE) -> List[str]:
+    words = normalize_text(text).split()
+    if len(words) < shingle_size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+
+def _numbers(text: str) -> List[str]:
+    return re.findall(r"\d+(?:[.,:/]\d+)*", text)
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    64-bit SimHash over word shingles: near-identical texts differ in few bits.
+    """
+    shingles = _shingles(text, shingle_size)
+    if not shingles:
+        return 0
+
+    hashes = np.array([_token_hash(sh) for sh in shingles], dtype=np.uint64)
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    # per bit: +1 for every shingle with the bit set, -1 otherwise
+    weights = 2 * bits.sum(axis=0, dtype=np.int64) - len(shingles)
+
+    value = 0
+    for bit in np.nonzero(weights > 0)[0].tolist():
+        value |= 1 << bit
+    return value
+
+
+def signature(text: str) -> Tuple[str, int]:
+    # (exact hash, simhash), stored per chunk in the ingestion manifest
+    return exact_hash(text), simhash(text)
+
+
+def same_clause(a: str, b: str, min_jaccard: float = MIN_JACCARD) -> bool:
+    """
+    Token-level check of a SimHash candidate: a chunk that differs in a
+    number ("15 days" vs "20 days") or in more than a few words is not a duplicate.
+    """
+    if _numbers(a) != _numbers(b):
+        return False
+    sa, sb = set(_shingles(a)), set(_shingles(b))
+    if not sa or not sb:
+        return sa == sb
+    return len(sa & sb) / len(sa | sb) >= min_jaccard
+
+
+class ChunkDeduper:
+    """
+    Canonical chunk registry:
+    - exact duplicates: same normalized-text hash
+    - near duplicates: SimHash within max_distance bits; signatures are
+      split into max_distance + 1 bands, and a match must share at least
+      one band exactly (pigeonhole), so lookups stay O(bucket size).
+      A candidate is only accepted after same_clause() on both texts, so
+      chunks added without text (earlier runs) never take near duplicates.
+
+    match() returns the canonical chunk id a chunk duplicates, or None.
+    The first chunk added wins: feed chunks in a fixed order (file, then chunk).
+    """
+
+    def __init__(self, near: bool = True, max_distance: int = MAX_DISTANCE, min_jaccard: float = MIN_JACCARD):
+        self.near = near
+        self.max_distance = max_distance
+        self.min_jaccard = min_jaccard
+        self._by_hash: Dict[str, str] = {}
+        self._simhash: Dict[str, int] = {}
+        self._texts: Dict[str, str] = {}
+        self._n_bands = max_distance + 1
+        self._bands: List[Dict[int, List[str]]] = [{} for _ in range(self._n_bands)]
+
+    def _band_keys(self, value: int) -> List[int]:
+        width = SIMHASH_BITS // self._n_bands
+        mask = (1 << width) - 1
+        return [(value >> (i * width)) & mask for i in range(self._n_bands)]
+
+    def match(self, sig: Tuple[str, int], text: Optional[str] = None) -> Optional[str]:
+        digest, value = sig
+        canonical = self._by_hash.get(digest)
+        if canonical is not None or not self.near or text is None:
+            return canonical
+
+        seen = set()
+        for band, key in zip(self._bands, self._band_keys(value)):
+            for candidate in band.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if bin(value ^ self._simhash[candidate]).count("1") > self.max_distance:
+                    continue
+                other = self._texts.get(candidate)
+                if other is not None and same_clause(text, other, self.min_jaccard):
+                    return candidate
+        return None
+
+    def add(self, doc_id: str, sig: Tuple[str, int], text: Optional[str] = None) -> None:
+        digest, value = sig
+        self._by_hash.setdefault(digest, doc_id)
+        self._simhash[doc_id] = value
+        if text is not None and self.near:
+            self._texts[doc_id] = text
+        for band, key in zip(self._bands, self._band_keys(value)):
+            band.setdefault(key, []).append(doc_id)
+
+
+# -----------------------------
+# Aliases sidecar (read by the API for citations)
+# -----------------------------
+def alias_entry(doc_id: str) -> Dict[str, object]:
+    # doc ids are "handbook::p{page}::c{chunk}" (see chunk_doc_id)
+    handbook, page, chunk = doc_id.rsplit("::", 2)
+    return {"doc_id": doc_id, "handbook_name": handbook, "page": page[1:], "chunk_id": chunk[1:]}
+
+
+def save_aliases(alias_of: Dict[str, str], path: str = ALIASES_PATH) -> None:
+    """
+    alias_of: duplicate chunk id -> canonical chunk id.
+    Written as {canonical id: [duplicate locations]}.
+    """
+    grouped: Dict[str, List[Dict[str, object]]] = {}
+    for alias, canonical in sorted(alias_of.items()):
+        grouped.setdefault(canonical, []).append(alias_entry(alias))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(grouped, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_aliases(path: str = ALIASES_PATH) -> Dict[str, List[Dict[str, object]]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,35 @@
+import os
+from typing import Dict
+
+import numpy as np
+
+
+CENTROIDS_PATH = "data/vectorstore/handbook_centroids.npz"
+
+
+def centroid_of_sum(vector_sum: np.ndarray) -> np.ndarray:
+    # normalized mean of a handbook's chunk embeddings (= normalized sum)
+    vector_sum = np.asarray(vector_sum, dtype=np.float32)
+    return vector_sum / max(float(np.linalg.norm(vector_sum)), 1e-12)
+
+
+def save_centroids(centroids: Dict[str, np.ndarray], path: str = CENTROIDS_PATH) -> None:
+    """
+    One embedding centroid per handbook (first-stage handbook router).
+    """
+    names = sorted(centroids)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(
+        tmp,
+        names=np.array(names),
+        centroids=np.stack([centroids[n] for n in names]).astype(np.float32) if names else np.zeros((0, 0), np.float32),
+    )
+    os.replace(tmp, path)
+
+
+def load_centroids(path: str = CENTROIDS_PATH) -> Dict[str, np.ndarray]:
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return dict(zip(data["names"].tolist(), data["centroids"]))
@@ -4,31 +4,42 @@ from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 
 
-def load_handbook_pdfs(folder_path: str) -> List[Document]:
+def list_handbook_pdfs(folder_path: str) -> List[str]:
     """
-    Loads all PDFs from folder_path using PyPDFLoader.
-    Returns list of LangChain Documents (page-wise).
-    Each Document will have metadata: source, page.
+    PDF file names in folder_path, sorted.
     """
-    all_docs: List[Document] = []
-
-    pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".pdf")]
+    pdf_files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(".pdf"))
     if not pdf_files:
         raise FileNotFoundError(
             f"No PDF files found in: {folder_path}. Put your handbook PDFs there."
         )
+    return pdf_files
+
+
+def load_handbook_pdf(folder_path: str, pdf_file: str) -> List[Document]:
+    """
+    Loads one PDF (page-wise), tagged with handbook_name = file name.
+    """
+    loader = PyPDFLoader(os.path.join(folder_path, pdf_file))
+    docs = loader.load()  # page-wise documents
+
+    # add clean source name
+    for d in docs:
+        d.metadata["handbook_name"] = pdf_file
+        # keep page metadata already included by loader
+        # d.metadata["page"] exists
+    return docs
 
-    for pdf_file in pdf_files:
-        full_path = os.path.join(folder_path, pdf_file)
 
-        loader = PyPDFLoader(full_path)
-        docs = loader.load()  # page-wise documents
+def load_handbook_pdfs(folder_path: str) -> List[Document]:
+    """
+    Loads all PDFs from folder_path using PyPDFLoader.
+    Returns list of LangChain Documents (page-wise).
+    Each Document will have metadata: source, page.
+    """
+    all_docs: List[Document] = []
 
-        # add clean source name
-        for d in docs:
-            d.metadata["handbook_name"] = pdf_file
-            # keep page metadata already included by loader
-            # d.metadata["page"] exists
-        all_docs.extend(docs)
+    for pdf_file in list_handbook_pdfs(folder_path):
+        all_docs.extend(load_handbook_pdf(folder_path, pdf_file))
 
-    return all_docs
\ No newline at end of file
+    return all_docs
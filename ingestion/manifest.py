@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Tuple
+
+
+MANIFEST_PATH = "data/vectorstore/manifest.json"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, Dict]:
+    """
+    {pdf file name: {"sha256", "size", "mtime", "doc_ids"}} of the last
+    completed ingestion ({} if none). doc_ids are in index row order.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", {})
+
+
+def save_manifest(files: Dict[str, Dict], path: str = MANIFEST_PATH) -> None:
+    # written last: it is the commit point of an ingestion run
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def scan_folder(folder_path: str, pdf_files: List[str], previous: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Content hash of every PDF. Files whose size + mtime match the manifest
+    keep their recorded hash instead of being re-read.
+    """
+    current = {}
+    for name in pdf_files:
+        st = os.stat(os.path.join(folder_path, name))
+        prev = previous.get(name)
+        if prev and prev.get("size") == st.st_size and prev.get("mtime") == st.st_mtime:
+            sha = prev["sha256"]
+        else:
+            sha = file_sha256(os.path.join(folder_path, name))
+        current[name] = {"sha256": sha, "size": st.st_size, "mtime": st.st_mtime}
+    return current
+
+
+def diff_manifest(previous: Dict[str, Dict], current: Dict[str, Dict]) -> Tuple[List[str], List[str], List[str]]:
+    """
+    (added, changed, removed) file names.
+    """
+    added = sorted(n for n in current if n not in previous)
+    changed = sorted(n for n in current if n in previous and previous[n]["sha256"] != current[n]["sha256"])
+    removed = sorted(n for n in previous if n not in current)
+    return added, changed, removed
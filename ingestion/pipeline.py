@@ -0,0 +1,139 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Deque, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ingestion.load_docs import load_handbook_pdf
+from ingestion.chunk_docs import chunk_documents
+from ingestion.dedup import signature
+from agents.settings import get_setting
+
+
+ParsedPdf = Tuple[str, int, List[Document], List[Tuple[str, int]]]
+
+
+def process_pdf(folder_path: str, pdf_file: str) -> ParsedPdf:
+    """
+    Worker stage: parse -> clean -> chunk -> dedup signatures for one handbook.
+    Returns (pdf_file, pages, chunks in (page, chunk) order, signature per chunk).
+    """
+    pages = load_handbook_pdf(folder_path, pdf_file)
+    chunks = chunk_documents(pages)
+    chunks.sort(key=lambda d: (d.metadata.get("page", 0), d.metadata["chunk_id"]))
+    return pdf_file, len(pages), chunks, [signature(d.page_content) for d in chunks]
+
+
+def iter_chunked_pdfs(
+    folder_path: str,
+    pdf_files: Sequence[str],
+    workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[ParsedPdf]:
+    """
+    Parses PDFs on a process pool, yielding process_pdf() results in the
+    order of pdf_files (deterministic downstream, e.g. which copy of a
+    duplicate chunk is canonical).
+    At most max_pending files are in flight, so memory does not grow
+    with the number of handbooks.
+    """
+    workers = workers or get_setting("ingestion", "workers") or os.cpu_count() or 1
+    max_pending = max_pending or get_setting("ingestion", "max_pending_files", 2 * workers)
+
+    if workers <= 1:
+        for name in pdf_files:
+            yield process_pdf(folder_path, name)
+        return
+
+    todo = iter(pdf_files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = deque()
+        for name in todo:
+            pending.append(pool.submit(process_pdf, folder_path, name))
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            # files behind a slow one keep parsing; results are handed out in order
+            yield pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(pool.submit(process_pdf, folder_path, nxt))
+
+
+_DONE = object()
+
+
+def iter_embedded_batches(
+    chunks: Iterator[Document],
+    encode_fn: Callable[[List[str]], np.ndarray],
+    batch_size: Optional[int] = None,
+    queue_size: Optional[int] = None,
+) -> Iterator[Tuple[List[Document], np.ndarray]]:
+    """
+    Embed stage: groups the chunk stream into large batches and encodes them
+    on a background thread, so parsing and embedding overlap.
+    The bounded inbox applies back-pressure to the producer; the outbox
+    only holds what the worker finished since the last drain.
+    """
+    batch_size = batch_size or get_setting("ingestion", "embed_batch_size", 1024)
+    queue_size = queue_size or get_setting("ingestion", "queue_size", 4)
+
+    inbox: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    outbox: "queue.Queue" = queue.Queue()
+
+    def _embed_worker():
+        failed = False
+        while True:
+            batch = inbox.get()
+            if batch is _DONE:
+                break
+            if failed:
+                # keep consuming so the producer never blocks on a full inbox
+                continue
+            try:
+                outbox.put((batch, encode_fn([d.page_content for d in batch])))
+            except BaseException as e:
+                failed = True
+                outbox.put(e)
+        outbox.put(_DONE)
+
+    worker = threading.Thread(target=_embed_worker, name="ingest-embed", daemon=True)
+    worker.start()
+
+    def _drain():
+        # hand finished batches to the caller without blocking the producer
+        while True:
+            try:
+                item = outbox.get_nowait()
+            except queue.Empty:
+                return
+            yield item
+
+    batch: List[Document] = []
+    for d in chunks:
+        batch.append(d)
+        if len(batch) >= batch_size:
+            inbox.put(batch)
+            batch = []
+            for item in _drain():
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+    if batch:
+        inbox.put(batch)
+    inbox.put(_DONE)
+
+    while True:
+        item = outbox.get()
+        if item is _DONE:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+    worker.join()
@@ -0,0 +1,142 @@
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+SENTENCE_DIR = "data/sentence_index"
+
+
+def split_sentences(text: str) -> List[str]:
+    text = re.sub(r"\s+", " ", text).strip()
+    sentences = re.split(r"(?<=[.!?])\s+", text)
+    return [s.strip() for s in sentences if len(s.strip()) > 25]
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+class SentenceIndex:
+    """
+    Precomputed sentence embeddings per chunk.
+
+    On disk:
+    - embeddings.npy   float16 [S, dim], L2-normalized (memory-mapped)
+    - offsets.npy      int64 [N + 1], sentence rows of chunk i
+    - doc_ids.json     chunk ids, row order
+
+    Sentence text is not stored: split_sentences() is deterministic, so
+    the compressor re-splits the chunk and gathers the matching rows.
+    """
+
+    def __init__(self, embeddings: np.ndarray, offsets: np.ndarray, doc_ids: List[str]):
+        self.embeddings = embeddings
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.row_of = {d: i for i, d in enumerate(doc_ids)}
+
+    @classmethod
+    def build(
+        cls,
+        texts: Sequence[str],
+        doc_ids: Sequence[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+        batch_size: int = 4096,
+    ) -> "SentenceIndex":
+        """
+        encode_fn: List[str] -> float array [n, dim]
+        """
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        sentences: List[str] = []
+        for i, text in enumerate(texts):
+            sents = split_sentences(text)
+            sentences.extend(sents)
+            offsets[i + 1] = offsets[i] + len(sents)
+
+        parts = []
+        for start in range(0, len(sentences), batch_size):
+            vecs = np.asarray(encode_fn(sentences[start:start + batch_size]), dtype=np.float32)
+            parts.append(_normalize(vecs).astype(np.float16))
+
+        embeddings = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float16)
+        return cls(embeddings, offsets, list(doc_ids))
+
+    def updated(
+        self,
+        doc_ids: Sequence[str],
+        new_texts: Dict[str, str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+        batch_size: int = 4096,
+    ) -> "SentenceIndex":
+        """
+        New index with chunks in doc_ids order:
+        - chunks in new_texts are split and encoded
+        - every other chunk copies its rows from this index
+        """
+        fresh_ids = [d for d in doc_ids if d in new_texts]
+        fresh = SentenceIndex.build([new_texts[d] for d in fresh_ids], fresh_ids, encode_fn, batch_size)
+
+        counts = np.zeros(len(doc_ids), dtype=np.int64)
+        sources = []
+        for i, doc_id in enumerate(doc_ids):
+            if doc_id in new_texts:
+                src, row = fresh, fresh.row_of[doc_id]
+            else:
+                row = self.row_of.get(doc_id)
+                if row is None:
+                    raise KeyError(f"{doc_id} is neither in the index nor in new_texts")
+                src = self
+            start, end = int(src.offsets[row]), int(src.offsets[row + 1])
+            sources.append((src, start, end))
+            counts[i] = end - start
+
+        offsets = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        dim = self.embeddings.shape[1] if self.embeddings.ndim == 2 and self.embeddings.shape[1] else fresh.embeddings.shape[1]
+        embeddings = np.empty((int(offsets[-1]), dim), dtype=np.float16)
+        for i, (src, start, end) in enumerate(sources):
+            embeddings[offsets[i]:offsets[i + 1]] = src.embeddings[start:end]
+
+        return SentenceIndex(embeddings, offsets, list(doc_ids))
+
+    def save(self, index_dir: str = SENTENCE_DIR) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "embeddings.npy"), self.embeddings)
+        np.save(os.path.join(index_dir, "offsets.npy"), self.offsets)
+        with open(os.path.join(index_dir, "doc_ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.doc_ids, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir: str = SENTENCE_DIR) -> "SentenceIndex":
+        with open(os.path.join(index_dir, "doc_ids.json"), "r", encoding="utf-8") as f:
+            doc_ids = json.load(f)
+        return cls(
+            embeddings=np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r"),
+            offsets=np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r"),
+            doc_ids=doc_ids,
+        )
+
+    def lookup(self, doc_id: str, n_sentences: int) -> Optional[np.ndarray]:
+        """
+        Normalized sentence vectors of a chunk, or None if the chunk is
+        unknown or its sentence count does not match (stale index).
+        """
+        row = self.row_of.get(doc_id)
+        if row is None:
+            return None
+
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        if end - start != n_sentences:
+            return None
+        return self.embeddings[start:end]
+
+
+def load_sentence_index(index_dir: str = SENTENCE_DIR) -> Optional[SentenceIndex]:
+    if not os.path.exists(os.path.join(index_dir, "offsets.npy")):
+        return None
+    return SentenceIndex.load(index_dir)
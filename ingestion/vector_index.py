@@ -0,0 +1,319 @@
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+VECTOR_DIR = "data/vector_index"
+
+# below this many chunks a full scan is fast enough, no IVF lists
+IVF_MIN_ROWS = 10_000
+KMEANS_ITERS = 10
+# k-means is trained on a sample of this many points per list
+KMEANS_SAMPLE_PER_LIST = 64
+# rows scored per matmul during full scans (bounds the float32 temporary)
+SCAN_BLOCK = 16_384
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def default_n_lists(n_rows: int) -> int:
+    return 1 if n_rows < IVF_MIN_ROWS else int(round(np.sqrt(n_rows)))
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalized float vectors -> (stored rows, per-row scale).
+    - float16: rows as is, scale 1
+    - int8:    symmetric per-row scale, value = row * scale
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    if dtype != "int8":
+        raise ValueError(f"Unsupported vector dtype: {dtype} (int8 | float16)")
+
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    rows = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return rows, scales
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means (cosine) on a sample of the vectors -> float32 [n_lists, dim].
+    """
+    rng = np.random.default_rng(seed)
+    n_sample = min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), n_sample, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=n_lists)
+        # empty lists keep their previous centroid
+        filled = counts > 0
+        centroids[filled] = _normalize(sums[filled])
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SCAN_BLOCK):
+        block = np.asarray(vectors[start:start + SCAN_BLOCK], dtype=np.float32)
+        assign[start:start + SCAN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+class VectorIndex:
+    """
+    In-process dense index over the chunk embeddings (alternative to Chroma).
+
+    On disk:
+    - vectors.npy       int8 | float16 [N, dim], rows of L2-normalized vectors (memory-mapped)
+    - scales.npy        float32 [N], dequantization scale per row (1 for float16)
+    - centroids.npy     float32 [L, dim], IVF coarse quantizer
+    - list_offsets.npy  int64 [L + 1], slice of list_rows per IVF list
+    - list_rows.npy     int32 [N], rows grouped by IVF list
+    - doc_ids.json      row -> vector store id
+    - meta.json         dtype, dim, trained_rows
+
+    Search is either exact (scan every row) or IVF (scan the nprobe lists
+    whose centroids are closest to the query). With a single list both
+    are the same.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        scales: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_rows: np.ndarray,
+        doc_ids: List[str],
+        trained_rows: int,
+    ):
+        self.vectors = vectors
+        self.scales = scales
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.doc_ids = doc_ids
+        self.trained_rows = trained_rows
+        self.row_of = {d: i for i, d in enumerate(doc_ids)}
+
+    @property
+    def dtype(self) -> str:
+        return str(self.vectors.dtype)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes + self.scales.nbytes + self.centroids.nbytes + self.list_rows.nbytes)
+
+    # -----------------------------
+    # Build
+    # -----------------------------
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        doc_ids: Sequence[str],
+        dtype: str = "int8",
+        n_lists: Optional[int] = None,
+    ) -> "VectorIndex":
+        """
+        vectors: float [N, dim] in doc_ids order (normalized here).
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        n_lists = max(1, min(n_lists or default_n_lists(len(vectors)), len(vectors)))
+        if n_lists > 1:
+            centroids = train_centroids(vectors, n_lists)
+        else:
+            centroids = _normalize(vectors.mean(axis=0, keepdims=True)) if len(vectors) else np.zeros((1, 0), np.float32)
+        assign = assign_lists(vectors, centroids) if n_lists > 1 else np.zeros(len(vectors), dtype=np.int32)
+
+        rows, scales = quantize(vectors, dtype)
+        return cls._from_assign(rows, scales, centroids, assign, list(doc_ids), trained_rows=len(vectors))
+
+    @classmethod
+    def _from_assign(cls, rows, scales, centroids, assign, doc_ids, trained_rows) -> "VectorIndex":
+        list_rows = np.argsort(assign, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=list_offsets[1:])
+        return cls(rows, scales, centroids.astype(np.float32), list_offsets, list_rows, doc_ids, trained_rows)
+
+    def dequantized(self) -> np.ndarray:
+        return np.asarray(self.vectors, dtype=np.float32) * self.scales[:, None]
+
+    def updated(
+        self,
+        doc_ids: Sequence[str],
+        new_vectors: Dict[str, np.ndarray],
+        n_lists: Optional[int] = None,
+    ) -> "VectorIndex":
+        """
+        New index with rows in doc_ids order:
+        - chunks in new_vectors are normalized, quantized and assigned to
+          the existing IVF lists
+        - every other chunk copies its stored row, scale and list
+        The IVF lists are retrained (on dequantized rows) when a different
+        list count is asked for, or the corpus doubled / halved since training.
+        """
+        fresh_ids = [d for d in doc_ids if d in new_vectors]
+        fresh = np.asarray([new_vectors[d] for d in fresh_ids], dtype=np.float32).reshape(len(fresh_ids), -1)
+        fresh = _normalize(fresh)
+        fresh_rows, fresh_scales = quantize(fresh, self.dtype)
+        fresh_row_of = {d: i for i, d in enumerate(fresh_ids)}
+
+        old_assign = np.empty(len(self.doc_ids), dtype=np.int32)
+        for lst in range(self.n_lists):
+            old_assign[self.list_rows[self.list_offsets[lst]:self.list_offsets[lst + 1]]] = lst
+
+        dim = self.vectors.shape[1] if self.vectors.ndim == 2 and self.vectors.shape[1] else fresh.shape[1]
+        rows = np.empty((len(doc_ids), dim), dtype=self.vectors.dtype)
+        scales = np.empty(len(doc_ids), dtype=np.float32)
+        assign = np.empty(len(doc_ids), dtype=np.int32)
+        fresh_at = []
+        for i, doc_id in enumerate(doc_ids):
+            j = fresh_row_of.get(doc_id)
+            if j is not None:
+                rows[i], scales[i] = fresh_rows[j], fresh_scales[j]
+                fresh_at.append(i)
+                continue
+            row = self.row_of.get(doc_id)
+            if row is None:
+                raise KeyError(f"{doc_id} is neither in the index nor in new_vectors")
+            rows[i], scales[i], assign[i] = self.vectors[row], self.scales[row], old_assign[row]
+
+        wanted = n_lists or default_n_lists(len(doc_ids))
+        drifted = len(doc_ids) > 2 * self.trained_rows or 2 * len(doc_ids) < self.trained_rows
+        if wanted != self.n_lists and (n_lists or drifted):
+            index = VectorIndex(rows, scales, self.centroids, self.list_offsets, self.list_rows, list(doc_ids), 0)
+            return VectorIndex.build(index.dequantized(), doc_ids, self.dtype, wanted)
+
+        if fresh_at:
+            assign[fresh_at] = assign_lists(fresh, self.centroids) if self.n_lists > 1 else 0
+        return VectorIndex._from_assign(rows, scales, self.centroids, assign, list(doc_ids), self.trained_rows)
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, index_dir: str = VECTOR_DIR) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "vectors.npy"), self.vectors)
+        np.save(os.path.join(index_dir, "scales.npy"), self.scales)
+        np.save(os.path.join(index_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(index_dir, "list_offsets.npy"), self.list_offsets)
+        np.save(os.path.join(index_dir, "list_rows.npy"), self.list_rows)
+        with open(os.path.join(index_dir, "doc_ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.doc_ids, f, ensure_ascii=False)
+        with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {"dtype": self.dtype, "dim": int(self.vectors.shape[1]), "trained_rows": self.trained_rows},
+                f,
+            )
+
+    @classmethod
+    def load(cls, index_dir: str = VECTOR_DIR) -> "VectorIndex":
+        def _array(name: str) -> np.ndarray:
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, "doc_ids.json"), "r", encoding="utf-8") as f:
+            doc_ids = json.load(f)
+
+        return cls(
+            vectors=_array("vectors.npy"),
+            scales=_array("scales.npy"),
+            # small and read on every query
+            centroids=np.load(os.path.join(index_dir, "centroids.npy")),
+            list_offsets=np.load(os.path.join(index_dir, "list_offsets.npy")),
+            list_rows=_array("list_rows.npy"),
+            doc_ids=doc_ids,
+            trained_rows=meta["trained_rows"],
+        )
+
+    # -----------------------------
+    # Query
+    # -----------------------------
+    def _score_rows(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        return (block @ query) * self.scales[rows]
+
+    def _scan(self, query: np.ndarray, first: int = 0, last: Optional[int] = None) -> np.ndarray:
+        # scores of rows [first, last), SCAN_BLOCK rows per matmul
+        last = len(self.doc_ids) if last is None else last
+        scores = np.empty(last - first, dtype=np.float32)
+        for start in range(first, last, SCAN_BLOCK):
+            end = min(start + SCAN_BLOCK, last)
+            block = np.asarray(self.vectors[start:end], dtype=np.float32)
+            scores[start - first:end - first] = (block @ query) * self.scales[start:end]
+        return scores
+
+    def search(
+        self,
+        query_embedding,
+        k: int = 8,
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+        ranges: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k (doc_id, cosine score).
+        exact=True scans every row; otherwise the nprobe closest IVF lists.
+        ranges: int64 [R, 2] [start, end) row ranges (e.g. one handbook),
+        scanned exactly instead of the whole index.
+        """
+        if not self.doc_ids:
+            return []
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        if ranges is not None:
+            ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+            rows = np.concatenate([np.arange(a, b) for a, b in ranges.tolist()] or [np.empty(0, np.int64)])
+            scores = np.concatenate(
+                [self._scan(query, a, b) for a, b in ranges.tolist()] or [np.empty(0, np.float32)]
+            )
+        elif exact or self.n_lists == 1 or (nprobe or 0) >= self.n_lists:
+            rows = None
+            scores = self._scan(query)
+        else:
+            nprobe = max(1, nprobe or 1)
+            probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.concatenate(
+                [self.list_rows[self.list_offsets[lst]:self.list_offsets[lst + 1]] for lst in probe]
+            )
+            # ascending rows: sequential reads of the memory-mapped file
+            rows.sort()
+            scores = self._score_rows(rows, query)
+
+        if not len(scores):
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        order = top[np.argsort(-scores[top], kind="stable")]
+        if rows is not None:
+            return [(self.doc_ids[rows[i]], float(scores[i])) for i in order]
+        return [(self.doc_ids[i], float(scores[i])) for i in order]
+
+
+def load_vector_index(index_dir: str = VECTOR_DIR) -> Optional[VectorIndex]:
+    """
+    Loads the memory-mapped index, or None if ingestion has not built it yet.
+    """
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    return VectorIndex.load(index_dir)
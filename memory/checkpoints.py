@@ -0,0 +1,172 @@
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+from langchain_core.documents import Document
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from agents.lru_cache import LRUCache
+from agents.settings import get_setting
+
+
+# marker key of a Document stored by reference
+DOC_REF = "__doc_ref__"
+
+# chunk texts seen while serializing, so same-process loads skip the vector store
+_texts = LRUCache(max_size=20000)
+
+
+def _doc_id(d: Document) -> Optional[str]:
+    return d.metadata.get("doc_id") or d.id
+
+
+def _strip(obj: Any) -> Any:
+    # Document -> {DOC_REF: id, metadata}; the chunk text is dropped
+    if isinstance(obj, Document):
+        doc_id = _doc_id(obj)
+        if doc_id is None:
+            return obj
+        _texts.put(doc_id, obj.page_content)
+        return {DOC_REF: doc_id, "metadata": obj.metadata}
+    if isinstance(obj, dict):
+        return {k: _strip(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_strip(v) for v in obj]
+    if isinstance(obj, tuple):
+        return tuple(_strip(v) for v in obj)
+    return obj
+
+
+def _collect_refs(obj: Any, out: List[str]) -> None:
+    if isinstance(obj, dict):
+        if DOC_REF in obj:
+            out.append(obj[DOC_REF])
+            return
+        for v in obj.values():
+            _collect_refs(v, out)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            _collect_refs(v, out)
+
+
+def _fetch_texts(ids: List[str]) -> Dict[str, str]:
+    # imported lazily: the checkpointer is built before the retrieval models load
+    from agents.retrieval_agent import get_documents_by_ids
+    return {d.id: d.page_content for d in get_documents_by_ids(ids)}
+
+
+def _rehydrate(obj: Any, texts: Dict[str, str]) -> Any:
+    if isinstance(obj, dict):
+        if DOC_REF in obj:
+            doc_id = obj[DOC_REF]
+            return Document(id=doc_id, page_content=texts.get(doc_id, ""), metadata=obj["metadata"])
+        return {k: _rehydrate(v, texts) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_rehydrate(v, texts) for v in obj]
+    if isinstance(obj, tuple):
+        return tuple(_rehydrate(v, texts) for v in obj)
+    return obj
+
+
+class DocRefSerializer(JsonPlusSerializer):
+    """
+    Checkpoint serializer that stores retrieved chunks as ids:
+    - dumps: every Document becomes {DOC_REF: doc id, metadata} (scores,
+      aliases... stay in the checkpoint, the chunk text does not)
+    - loads: texts come from an in-process LRU, else one batched
+      vector store fetch for all refs of the checkpoint
+    """
+
+    def dumps_typed(self, obj: Any):
+        return super().dumps_typed(_strip(obj))
+
+    def loads_typed(self, data):
+        obj = super().loads_typed(data)
+        refs: List[str] = []
+        _collect_refs(obj, refs)
+        if not refs:
+            return obj
+
+        texts: Dict[str, str] = {}
+        missing = []
+        for doc_id in dict.fromkeys(refs):
+            text = _texts.get(doc_id)
+            if text is None:
+                missing.append(doc_id)
+            else:
+                texts[doc_id] = text
+        if missing:
+            texts.update(_fetch_texts(missing))
+        return _rehydrate(obj, texts)
+
+
+def checkpoint_serializer() -> Optional[JsonPlusSerializer]:
+    """
+    DocRefSerializer unless checkpoint.doc_refs is off (None = saver default).
+    """
+    return DocRefSerializer() if get_setting("checkpoint", "doc_refs", True) else None
+
+
+def checkpoint_durability() -> str:
+    """
+    When LangGraph writes checkpoints (invoke / stream `durability`):
+    - exit:  once per run, after the last node
+    - async: after every step, written in the background
+    - sync:  after every step, before the next one starts
+    """
+    return get_setting("checkpoint", "durability", "exit")
+
+
+def open_sqlite_saver(path: str) -> SqliteSaver:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return SqliteSaver(conn, serde=checkpoint_serializer())
+
+
+@asynccontextmanager
+async def open_async_sqlite_saver(path: str) -> AsyncIterator[AsyncSqliteSaver]:
+    async with aiosqlite.connect(path) as conn:
+        # WAL: readers (state lookups) no longer wait for checkpoint writes
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        yield AsyncSqliteSaver(conn, serde=checkpoint_serializer())
+
+
+# window per (thread_id, checkpoint_ns): subgraph namespaces keep their own newest checkpoints
+_PRUNE_SQL = [
+    "DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id < ("
+    "SELECT c.checkpoint_id FROM checkpoints AS c "
+    "WHERE c.thread_id = {table}.thread_id AND c.checkpoint_ns = {table}.checkpoint_ns "
+    "ORDER BY c.checkpoint_id DESC LIMIT 1 OFFSET ?)".format(table=table)
+    for table in ("writes", "checkpoints")
+]
+
+
+async def aprune_checkpoints(saver: AsyncSqliteSaver, thread_id: str, keep: Optional[int] = None) -> None:
+    """
+    Keeps the newest `keep` checkpoints of a thread in each checkpoint
+    namespace (checkpoint ids are time-ordered), with their pending writes.
+    """
+    keep = keep if keep is not None else get_setting("checkpoint", "keep_per_thread", 5)
+    if not keep:
+        return
+    await saver.setup()
+    async with saver.lock:
+        for sql in _PRUNE_SQL:
+            await saver.conn.execute(sql, (thread_id, keep - 1))
+        await saver.conn.commit()
+
+
+def prune_checkpoints(saver: SqliteSaver, thread_id: str, keep: Optional[int] = None) -> None:
+    keep = keep if keep is not None else get_setting("checkpoint", "keep_per_thread", 5)
+    if not keep:
+        return
+    saver.setup()
+    with saver.lock:
+        for sql in _PRUNE_SQL:
+            saver.conn.execute(sql, (thread_id, keep - 1))
+        saver.conn.commit()
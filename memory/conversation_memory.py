@@ -1,27 +1,255 @@
+import atexit
 import json
 import os
-from typing import List, Dict
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
 
-MEMORY_PATH = "memory/chat_memory.json"
+from agents.lru_cache import LRUCache
+from agents.settings import get_setting
 
+MEMORY_DB_PATH = "memory/conversations.sqlite"
+# pre-thread JSON history, imported once into DEFAULT_THREAD
+LEGACY_MEMORY_PATH = "memory/chat_memory.json"
+DEFAULT_THREAD = "default_thread"
 
-def load_memory() -> List[Dict[str, str]]:
-    if not os.path.exists(MEMORY_PATH):
-        return []
-    try:
-        with open(MEMORY_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return []
+Turn = Dict[str, str]
 
 
-def save_memory(history: List[Dict[str, str]]) -> None:
-    os.makedirs("memory", exist_ok=True)
-    with open(MEMORY_PATH, "w", encoding="utf-8") as f:
-        json.dump(history[-30:], f, indent=2, ensure_ascii=False)
+class ConversationStore:
+    """
+    Conversation history per thread_id, in SQLite (WAL).
 
+    - append: O(1) in memory; rows are written in batches by a background
+      thread (at most flush_interval_s later), one transaction per batch
+    - load: last `window` turns of a thread, from an LRU of hot threads
+      or one indexed query
+    - each thread keeps at most max_turns rows on disk
+    """
 
-def append_turn(user_query: str, assistant_answer: str) -> None:
-    history = load_memory()
-    history.append({"user": user_query, "assistant": assistant_answer})
-    save_memory(history)
\ No newline at end of file
+    def __init__(
+        self,
+        path: str = MEMORY_DB_PATH,
+        window: int = 12,
+        max_turns: int = 200,
+        hot_threads: int = 1024,
+        flush_interval_s: float = 0.5,
+        batch_size: int = 64,
+    ):
+        self.window = window
+        self.max_turns = max_turns
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id TEXT NOT NULL, "
+            "user TEXT, assistant TEXT, created_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_thread ON turns (thread_id, id)")
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+
+        # thread_id -> deque of its last `window` turns
+        self._hot = LRUCache(max_size=hot_threads)
+        self._pending: List[Tuple[str, str, str, float]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._write_loop, name="memory-writer", daemon=True)
+        self._writer.start()
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def load(self, thread_id: str = DEFAULT_THREAD) -> List[Turn]:
+        with self._lock:
+            turns = self._hot.get(thread_id)
+            if turns is not None:
+                return list(turns)
+
+        # flush() holds _db_lock from taking the batch until it is written, so
+        # the pending snapshot and the rows never both contain a turn
+        with self._db_lock:
+            with self._lock:
+                pending = [(u, a) for t, u, a, _ in self._pending if t == thread_id]
+            rows = self._conn.execute(
+                "SELECT user, assistant FROM turns WHERE thread_id = ? ORDER BY id DESC LIMIT ?",
+                (thread_id, self.window),
+            ).fetchall()
+
+        turns: Deque[Turn] = deque(maxlen=self.window)
+        for user, assistant in reversed(rows):
+            turns.append({"user": user, "assistant": assistant})
+        for user, assistant in pending:
+            turns.append({"user": user, "assistant": assistant})
+
+        with self._lock:
+            # an append may have filled the hot entry meanwhile
+            current = self._hot.get(thread_id)
+            if current is not None:
+                return list(current)
+            self._hot.put(thread_id, turns)
+        return list(turns)
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def append(self, user_query: str, assistant_answer: str, thread_id: str = DEFAULT_THREAD) -> None:
+        if self._hot.get(thread_id) is None:
+            # warm the hot tier first, so it stays the newest `window` turns
+            self.load(thread_id)
+
+        with self._lock:
+            turns = self._hot.get(thread_id)
+            # evicted again in between: the next load reads disk + pending
+            if turns is not None:
+                turns.append({"user": user_query, "assistant": assistant_answer})
+
+            self._pending.append((thread_id, user_query, assistant_answer, time.time()))
+            if len(self._pending) >= self.batch_size:
+                self._wake.notify()
+
+    def amend_last(self, user_query: str, assistant_answer: str, thread_id: str = DEFAULT_THREAD) -> None:
+        """
+        Replaces the answer of the thread's last turn if it is user_query
+        (a retried answer), else appends a new turn.
+        """
+        with self._lock:
+            turns = self._hot.get(thread_id)
+            if turns and turns[-1]["user"] == user_query:
+                turns[-1] = {"user": user_query, "assistant": assistant_answer}
+            for i in range(len(self._pending) - 1, -1, -1):
+                t, user, _, created_at = self._pending[i]
+                if t == thread_id:
+                    if user != user_query:
+                        break
+                    self._pending[i] = (t, user, assistant_answer, created_at)
+                    return
+
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT id, user FROM turns WHERE thread_id = ? ORDER BY id DESC LIMIT 1", (thread_id,)
+            ).fetchone()
+            if row is not None and row[1] == user_query:
+                with self._conn:
+                    self._conn.execute("UPDATE turns SET assistant = ? WHERE id = ?", (assistant_answer, row[0]))
+                return
+        self.append(user_query, assistant_answer, thread_id)
+
+    def flush(self) -> None:
+        with self._db_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+
+            threads = {t for t, _, _, _ in batch}
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO turns (thread_id, user, assistant, created_at) VALUES (?, ?, ?, ?)", batch
+                )
+                for thread_id in threads:
+                    self._conn.execute(
+                        "DELETE FROM turns WHERE thread_id = ? AND id <= ("
+                        "SELECT id FROM turns WHERE thread_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (thread_id, thread_id, self.max_turns),
+                    )
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._wake.wait(self.flush_interval_s)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ Conversation memory flush failed: {e}")
+            if closed:
+                return
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        self._writer.join()
+        self.flush()
+
+    def clear(self, thread_id: str) -> None:
+        # under _db_lock no batch is between pending and written (see flush),
+        # so the writer cannot re-insert this thread's rows after the delete
+        with self._db_lock:
+            with self._lock:
+                self._pending = [p for p in self._pending if p[0] != thread_id]
+                # dropped, not kept empty: cleared threads (e.g. bulk answers) don't crowd the hot tier
+                self._hot.delete(thread_id)
+            with self._conn:
+                self._conn.execute("DELETE FROM turns WHERE thread_id = ?", (thread_id,))
+
+    def import_legacy(self, path: str = LEGACY_MEMORY_PATH, thread_id: str = DEFAULT_THREAD) -> int:
+        """
+        One-time import of the old global JSON history (skipped once the store has rows).
+        """
+        if not os.path.exists(path):
+            return 0
+        with self._db_lock:
+            if self._conn.execute("SELECT 1 FROM turns LIMIT 1").fetchone():
+                return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        for turn in history:
+            self.append(turn.get("user", ""), turn.get("assistant", ""), thread_id)
+        self.flush()
+        return len(history)
+
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """
+    Process-wide store, configured by the memory section of configs/settings.yaml.
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore(
+                window=get_setting("memory", "window", 12),
+                max_turns=get_setting("memory", "max_turns_per_thread", 200),
+                hot_threads=get_setting("memory", "hot_threads", 1024),
+                flush_interval_s=get_setting("memory", "flush_interval_s", 0.5),
+                batch_size=get_setting("memory", "batch_size", 64),
+            )
+            _store.import_legacy()
+            atexit.register(_store.close)
+    return _store
+
+
+def load_memory(thread_id: str = DEFAULT_THREAD) -> List[Turn]:
+    return get_conversation_store().load(thread_id)
+
+
+def append_turn(user_query: str, assistant_answer: str, thread_id: str = DEFAULT_THREAD) -> None:
+    get_conversation_store().append(user_query, assistant_answer, thread_id)
+
+
+def amend_last_turn(user_query: str, assistant_answer: str, thread_id: str = DEFAULT_THREAD) -> None:
+    get_conversation_store().amend_last(user_query, assistant_answer, thread_id)
+
+
+def clear_thread(thread_id: str) -> None:
+    get_conversation_store().clear(thread_id)
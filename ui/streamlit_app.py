@@ -1,9 +1,32 @@
 import streamlit as st
 import requests
+import json
 import uuid
 
 API_URL = "http://127.0.0.1:8000"
 
+
+def iter_sse(response):
+    """
+    Yields (event, data) from the API's SSE stream (data is JSON).
+    """
+    event, data_lines = "message", []
+    for raw in response.iter_lines(decode_unicode=True):
+        line = (raw or "").rstrip("\r")
+        if not line:
+            if data_lines:
+                try:
+                    yield event, json.loads("\n".join(data_lines))
+                except json.JSONDecodeError:
+                    pass
+            event, data_lines = "message", []
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
 st.set_page_config(
     page_title="Enterprise Handbook RAG",
     page_icon="📘",
@@ -52,78 +75,90 @@ if query:
         st.markdown(query)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-
-            payload = {
-                "query": query,
-                "thread_id": st.session_state.thread_id
-            }
-
-            try:
-                r = requests.post(
-                    f"{API_URL}/chat",
-                    json=payload,
-                    timeout=60
-                )
-            except requests.exceptions.ConnectionError:
-                st.error("❌ Cannot connect to API. Is FastAPI running on port 8000?")
-                st.stop()
-            except requests.exceptions.Timeout:
-                st.error("⏳ API request timed out. Try again.")
-                st.stop()
-
-            # If API returns error (500, 404, etc.)
-            if r.status_code != 200:
-                st.error(f"❌ API Error: {r.status_code}")
-                st.code(r.text)
-                st.stop()
-
-            # If response is not JSON
-            try:
-                data = r.json()
-            except Exception:
-                st.error("❌ API did not return JSON.")
-                st.code(r.text)
-                st.stop()
-
-            answer = data.get("answer", "")
-            confidence = data.get("confidence", 0)
-            grounded = data.get("is_grounded", False)
-            issues = data.get("issues", [])
-            sources = data.get("sources", [])
-            logs = data.get("stream_log", [])
-
-            st.markdown(answer)
-
-            st.divider()
-
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.subheader("✅ Verification")
-                st.write(f"**Confidence:** {confidence}/100")
-                st.write(f"**Grounded:** {grounded}")
-
-                if issues:
-                    st.write("**Issues:**")
-                    for it in issues:
-                        st.write(f"- {it}")
-
-            with col2:
-                st.subheader("📌 Sources")
-                if sources:
-                    for s in sources:
-                        st.write(f"- **[{s.get('id', '?')}]** {s.get('text', '')}")
-                else:
-                    st.write("No citations extracted.")
-
-            st.divider()
-            st.subheader("🧾 Internal Agent Logs")
-            if logs:
-                for l in logs:
-                    st.write(f"- {l}")
+        payload = {
+            "query": query,
+            "thread_id": st.session_state.thread_id
+        }
+
+        status = st.status("Thinking...", expanded=False)
+        answer_box = st.empty()
+        streamed = ""
+        data = None
+
+        try:
+            r = requests.post(
+                f"{API_URL}/chat/stream",
+                json=payload,
+                stream=True,
+                timeout=120
+            )
+        except requests.exceptions.ConnectionError:
+            st.error("❌ Cannot connect to API. Is FastAPI running on port 8000?")
+            st.stop()
+        except requests.exceptions.Timeout:
+            st.error("⏳ API request timed out. Try again.")
+            st.stop()
+
+        # If API returns error (500, 404, etc.)
+        if r.status_code != 200:
+            st.error(f"❌ API Error: {r.status_code}")
+            st.code(r.text)
+            st.stop()
+
+        for event, event_data in iter_sse(r):
+            if event == "step":
+                status.write(event_data.get("message", ""))
+            elif event == "token":
+                streamed += event_data.get("text", "")
+                answer_box.markdown(streamed + "▌")
+            elif event == "done":
+                data = event_data
+
+        if data is None:
+            st.error("❌ Stream ended before the answer was complete.")
+            st.stop()
+
+        status.update(label="Done", state="complete")
+
+        answer = data.get("answer", "") or data.get("action_output", "") or streamed
+        confidence = data.get("confidence", 0)
+        grounded = data.get("is_grounded", False)
+        issues = data.get("issues", [])
+        sources = data.get("sources", [])
+        logs = data.get("stream_log", [])
+
+        # final text (a retry may have replaced the streamed draft)
+        answer_box.markdown(answer)
+
+        st.divider()
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.subheader("✅ Verification")
+            st.write(f"**Confidence:** {confidence}/100")
+            st.write(f"**Grounded:** {grounded}")
+
+            if issues:
+                st.write("**Issues:**")
+                for it in issues:
+                    st.write(f"- {it}")
+
+        with col2:
+            st.subheader("📌 Sources")
+            if sources:
+                for s in sources:
+                    st.write(f"- **[{s.get('id', '?')}]** {s.get('text', '')}")
             else:
-                st.write("No logs found.")
+                st.write("No citations extracted.")
+
+        st.divider()
+        st.subheader("🧾 Internal Agent Logs")
+        if logs:
+            for l in logs:
+                st.write(f"- {l}")
+        else:
+            st.write("No logs found.")
 
     # store assistant message
     st.session_state.chat.append({"role": "assistant", "content": answer})
\ No newline at end of file